@@ -19,6 +19,8 @@ from primo.linking.components cimport Component
 from primo.linking.components cimport MakeComponent
 from primo.linking.intents cimport ComponentIntent
 from primo.linking.attribute_matching cimport AttributeMap
+from primo.linking.interning cimport Intern
+from primo.linking.interning cimport InternTuple
 
 from primo.linking import ic3_data_pb2
 
@@ -26,6 +28,19 @@ from primo.linking import ic3_data_pb2
 cdef set SAMPLES = set()
 
 
+def GetState():
+  """Returns the global application data, for saving corpus snapshots."""
+
+  return SAMPLES
+
+
+def SetState(set state):
+  """Restores global application data saved with GetState."""
+
+  SAMPLES.clear()
+  SAMPLES.update(state)
+
+
 def MakeApplication(application_pb, validate):
   """Generates an Application object from a protobuf.
 
@@ -35,15 +50,16 @@ def MakeApplication(application_pb, validate):
   Returns: A linking.Application object.
   """
 
-  cdef unicode name = application_pb.name
+  cdef unicode name = Intern(application_pb.name)
   # In protobufs, fields of type RepeatedScalarFieldContainer (such as
   # used_permissions) contain a weak reference to
   # google.protobuf.internal.python_message._Listener. To avoid pickling
   # issues, we copy the contents.
-  cdef tuple used_permissions = (tuple(sorted(application_pb.used_permissions))
-                                 if application_pb.used_permissions else None)
+  cdef tuple used_permissions = (
+      InternTuple(sorted(application_pb.used_permissions))
+      if application_pb.used_permissions else None)
   cdef long version = application_pb.version
-  cdef unicode sample = (application_pb.sample
+  cdef unicode sample = (Intern(application_pb.sample)
                          if application_pb.HasField('sample') else None)
 
   SAMPLES.add(sample)
@@ -185,6 +201,18 @@ cdef class Application(object):
         count += component.intent_filter_count
       return count
 
+  def __reduce__(self):
+    # References back to this application are in the state, so that pickling
+    # handles reference cycles.
+    return (Application,
+            (self.name, self.used_permissions, self.version, self.sample),
+            (self.components, self.intents, self.component_maps,
+             self.exported_component_maps))
+
+  def __setstate__(self, tuple state):
+    (self.components, self.intents, self.component_maps,
+     self.exported_component_maps) = state
+
   def __hash__(self):
     return self._hash
 
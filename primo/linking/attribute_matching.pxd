@@ -15,17 +15,43 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+cimport numpy as np
+
 cdef class AttributeMap(object):
   cdef dict _regexes
   cdef dict _constants
   cdef set _all_end_points
   cdef set _end_points_with_regexes
   cdef dict _cache
+  # Wildcard lookup indexes, built lazily. They are stale when
+  # _sorted_constants is None.
+  cdef list _sorted_constants
+  cdef list _sorted_regexes
+  cdef dict _regex_prefixes
+  cdef int _max_regex_prefix
   cdef void AddAttribute(self, unicode attribute, object end_point)
+  cdef void RemoveEndPoint(self, object end_point, object attributes)
+  cdef void CopyFrom(self, AttributeMap other)
   cdef set GetEndPointsForAttributeSet(
       self, object attribute_set, set search_space=?, bint match_all=?)
   cdef set GetEndPointsForAttribute(self, unicode attribute, set search_space=?)
+  cdef void _BuildWildcardIndex(self)
+  cdef set _GetRegexCandidates(self, unicode attribute)
   cdef set GetEndPointsWithoutEmptySet(self, set search_space)
   cdef set GetEndPointsForEmptySet(self, set search_space)
 
+cdef class BitmapAttributeMap(AttributeMap):
+  cdef dict _bitmap_cache
+  cdef object GetBitmapForAttributeSet(
+      self, object attribute_set, object search_space=?, bint match_all=?)
+  cdef object GetBitmapForAttribute(self, unicode attribute,
+                                    object search_space=?)
+  cdef object GetBitmapWithoutEmptySet(self, object search_space)
+  cdef object GetBitmapForEmptySet(self, object search_space)
+
+cdef object MakeBitmap(object ids)
+cdef np.ndarray BitmapToIds(object bitmap)
+cdef long BitCount(object bitmap)
 cdef bint NonEmptyIntersection(unicode regex1, unicode regex2)
+cdef unicode LiteralPrefix(unicode regex)
+cdef list GetKeysWithPrefix(list sorted_keys, unicode prefix)
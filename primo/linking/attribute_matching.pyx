@@ -15,8 +15,29 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 """Utilities for matching attributes with end points."""
+import binascii
+import bisect
 import re
 
+import numpy as np
+
+from primo.linking.metrics cimport ATTRIBUTE_BITMAP_CACHE
+from primo.linking.metrics cimport ATTRIBUTE_CACHE
+from primo.linking.metrics cimport CountCache
+
+
+# Maximum number of patterns kept by MatchesPattern. The cache is cleared when
+# it is full.
+DEF PATTERN_CACHE_SIZE = 16384
+
+# Map between (.*) patterns and their matchers.
+cdef dict _PATTERN_CACHE = {}
+# Pattern cache hits and misses.
+cdef list _PATTERN_CACHE_COUNTS = [0, 0]
+# If not None, the lookup caches and keys of the lookups cached since
+# TrackNewLookups was called.
+cdef list _NEW_LOOKUPS = None
+
 
 cdef class AttributeMap(object):
   """Class that maps attributes to end points that contain them."""
@@ -27,10 +48,37 @@ cdef class AttributeMap(object):
     self._all_end_points = set()
     self._end_points_with_regexes = set()
     self._cache = {}
+    self._sorted_constants = None
 
   def __repr__(self):
     return str(self._regexes) + ' - ' + str(self._constants)
 
+  def __reduce__(self):
+    # The lookup cache is not saved.
+    return (type(self), (), (self._regexes, self._constants,
+                               self._all_end_points,
+                               self._end_points_with_regexes))
+
+  def __setstate__(self, tuple state):
+    (self._regexes, self._constants, self._all_end_points,
+     self._end_points_with_regexes) = state
+    self._cache = {}
+    self._sorted_constants = None
+
+  cdef void CopyFrom(self, AttributeMap other):
+    """Replaces the contents of this map with those of another map.
+
+    Args:
+      other: An AttributeMap object.
+    """
+
+    self._regexes = other._regexes
+    self._constants = other._constants
+    self._all_end_points = other._all_end_points
+    self._end_points_with_regexes = other._end_points_with_regexes
+    self._cache = {}
+    self._sorted_constants = None
+
   cdef void AddAttribute(self, unicode attribute, object end_point):
     """Adds an attribute and the end point that contains it.
 
@@ -53,8 +101,47 @@ cdef class AttributeMap(object):
     if not end_points:
       end_points = set()
       attribute_map[attribute] = end_points
+      self._sorted_constants = None
     end_points.add(end_point)
     self._all_end_points.add(end_point)
+    cdef dict cache = self._cache
+    if cache:
+      # Cached sets may be those of the attribute maps, so they are replaced
+      # instead of being updated.
+      for key in cache.keys():
+        if _LookupIncludes(key, attribute):
+          cache[key] = cache[key] | set([end_point])
+
+  cdef void RemoveEndPoint(self, object end_point, object attributes):
+    """Removes an end point that was added with some attributes.
+
+    Args:
+      end_point: The end point to be removed.
+      attributes: An iterable of all the attributes the end point was added
+      with.
+    """
+
+    cdef dict attribute_map
+    cdef set end_points
+    for attribute in attributes:
+      if hasattr(attribute, '__iter__') and len(attribute) == 0:
+        attribute = None
+      if attribute is not None and '(.*)' in attribute:
+        attribute_map = self._regexes
+      else:
+        attribute_map = self._constants
+      end_points = attribute_map.get(attribute)
+      if end_points is not None:
+        end_points.discard(end_point)
+        if not end_points:
+          del attribute_map[attribute]
+          self._sorted_constants = None
+    self._all_end_points.discard(end_point)
+    self._end_points_with_regexes.discard(end_point)
+    # Cached sets that are those of the attribute maps no longer hold the end
+    # point, so they can be updated.
+    for end_points in self._cache.itervalues():
+      end_points.discard(end_point)
 
   cdef set GetEndPointsForAttributeSet(
       self, object attribute_set, set search_space=None, bint match_all=True):
@@ -105,27 +192,81 @@ cdef class AttributeMap(object):
               else self._all_end_points)
 
     cdef set end_points
+    cdef unicode candidate
     try:
       end_points = self._cache[attribute]
+      CountCache(ATTRIBUTE_CACHE, True)
     except KeyError:
+      CountCache(ATTRIBUTE_CACHE, False)
       end_points = self._constants.get(attribute, set())
+      if attribute is not None and self._sorted_constants is None:
+        self._BuildWildcardIndex()
+      # Only constants that start with the literal prefix of the attribute can
+      # match it.
+      if attribute is not None and '(.*)' in attribute:
+        for candidate in GetKeysWithPrefix(self._sorted_constants,
+                                           LiteralPrefix(attribute)):
+          if NonEmptyIntersection(candidate, attribute):
+            end_points = end_points | self._constants[candidate]
       # Bypass regular expression matching if no end point in the search space
       # is associated with a regex.
-      if attribute is not None and '(.*)' in attribute:
-        for candidate, end_points_for_attribute in self._constants.iteritems():
-          if candidate is not None and NonEmptyIntersection(candidate, attribute):
-            end_points = end_points | end_points_for_attribute
-      if self._end_points_with_regexes:
-        for candidate, end_points_for_attribute in self._regexes.iteritems():
-          if attribute is not None and NonEmptyIntersection(candidate, attribute):
-            end_points = end_points | end_points_for_attribute
+      if self._end_points_with_regexes and attribute is not None:
+        for candidate in self._GetRegexCandidates(attribute):
+          if NonEmptyIntersection(candidate, attribute):
+            end_points = end_points | self._regexes[candidate]
       self._cache[attribute] = end_points
+      if _NEW_LOOKUPS is not None:
+        _NEW_LOOKUPS.append((self._cache, attribute))
 
     # Only retain the ones that are in the search space.
     if search_space is not None: end_points = end_points & search_space
 
     return end_points
 
+  cdef void _BuildWildcardIndex(self):
+    """Builds the indexes that prune candidates for wildcard lookups.
+
+    Regular expressions are matched from the start of strings, so a constant
+    and a regex can only match if one starts with the literal prefix of the
+    other. Sorted keys answer "keys starting with a prefix" with a binary
+    search, and regexes are grouped by literal prefix.
+    """
+
+    self._sorted_constants = sorted([constant for constant in self._constants
+                                     if constant is not None])
+    self._sorted_regexes = sorted(self._regexes)
+    self._regex_prefixes = {}
+    self._max_regex_prefix = 0
+    cdef unicode prefix
+    for regex in self._sorted_regexes:
+      prefix = LiteralPrefix(regex)
+      self._regex_prefixes.setdefault(prefix, []).append(regex)
+      self._max_regex_prefix = max(self._max_regex_prefix, len(prefix))
+
+  cdef set _GetRegexCandidates(self, unicode attribute):
+    """Returns the regexes that may have a non-empty intersection with an
+    attribute.
+
+    Args:
+      attribute: A field value.
+
+    Returns: A superset of the matching regexes.
+    """
+
+    cdef set candidates = set()
+    cdef int length
+    cdef list regexes
+    # Regexes whose literal prefix is a prefix of the attribute.
+    for length in range(min(len(attribute), self._max_regex_prefix) + 1):
+      regexes = self._regex_prefixes.get(attribute[:length])
+      if regexes:
+        candidates.update(regexes)
+    # Regexes that start with the literal prefix of the attribute.
+    if '(.*)' in attribute:
+      candidates.update(GetKeysWithPrefix(self._sorted_regexes,
+                                          LiteralPrefix(attribute)))
+    return candidates
+
   cdef set GetEndPointsWithoutEmptySet(self, set search_space):
     """Selects the end points that have a non-empty set of attributes.
 
@@ -157,6 +298,179 @@ cdef class AttributeMap(object):
     return '\n'.join(parts)
 
 
+cdef class BitmapAttributeMap(AttributeMap):
+  """AttributeMap whose end points are integer ids, with bitmap lookups.
+
+  A bitmap is a Python integer where bit i is set if end point i is present.
+  Bitwise operations on integers run over machine words, so set algebra on
+  bitmaps does not hash any end point. Lookup results are built from the id
+  sets of the parent class and cached.
+  """
+
+  def __cinit__(self):
+    self._bitmap_cache = {}
+
+  cdef void CopyFrom(self, AttributeMap other):
+    AttributeMap.CopyFrom(self, other)
+    self._bitmap_cache = {}
+
+  cdef void AddAttribute(self, unicode attribute, object end_point):
+    AttributeMap.AddAttribute(self, attribute, end_point)
+    cdef dict cache = self._bitmap_cache
+    if cache:
+      bit = 1 << end_point
+      for key in cache.keys():
+        if _LookupIncludes(key, attribute):
+          cache[key] |= bit
+
+  cdef void RemoveEndPoint(self, object end_point, object attributes):
+    AttributeMap.RemoveEndPoint(self, end_point, attributes)
+    cdef dict cache = self._bitmap_cache
+    bit = 1 << end_point
+    for key, end_points in cache.items():
+      if end_points & bit:
+        cache[key] = end_points ^ bit
+
+  cdef object GetBitmapForAttributeSet(
+      self, object attribute_set, object search_space=None,
+      bint match_all=True):
+    """Returns the bitmap of end points matching attributes from a set.
+
+    Args:
+      attribute_set: An iterable of attributes.
+      search_space: The bitmap of the search space, or None for all end points.
+      match_all: If set to True, then only end points matching all attributes
+      are returned. Otherwise, returned end points will match any attribute.
+
+    Returns: The bitmap of all matching end points.
+    """
+
+    if not attribute_set:
+      return search_space
+
+    result = None
+    for attribute in attribute_set:
+      end_points = self.GetBitmapForAttribute(attribute, None)
+      if result is None:
+        result = end_points
+      elif match_all:
+        result &= end_points
+      else:
+        result |= end_points
+
+    if search_space is not None:
+      result &= search_space
+    return result
+
+  cdef object GetBitmapForAttribute(self, unicode attribute,
+                                    object search_space=None):
+    """Returns the bitmap of end points that have a certain attribute.
+
+    Args:
+      attribute: A field value.
+      search_space: The bitmap of the search space, or None for all end points.
+
+    Returns: The bitmap of all matching end points.
+    """
+
+    try:
+      end_points = self._bitmap_cache[attribute]
+      CountCache(ATTRIBUTE_BITMAP_CACHE, True)
+    except KeyError:
+      CountCache(ATTRIBUTE_BITMAP_CACHE, False)
+      end_points = MakeBitmap(self.GetEndPointsForAttribute(attribute, None))
+      self._bitmap_cache[attribute] = end_points
+      if _NEW_LOOKUPS is not None:
+        _NEW_LOOKUPS.append((self._bitmap_cache, attribute))
+
+    if search_space is not None:
+      return end_points & search_space
+    return end_points
+
+  cdef object GetBitmapWithoutEmptySet(self, object search_space):
+    """Selects the end points that have a non-empty set of attributes.
+
+    Args:
+      search_space: The bitmap of the search space.
+
+    Returns: The bitmap of all end points that have a non-empty set of
+    attributes.
+    """
+
+    cdef object empty_set
+    try:
+      empty_set = self._bitmap_cache[None]
+    except KeyError:
+      empty_set = MakeBitmap(self._constants.get(None, ()))
+      self._bitmap_cache[None] = empty_set
+    return search_space & ~empty_set
+
+  cdef object GetBitmapForEmptySet(self, object search_space):
+    """Selects the end points with an empty set of attributes.
+
+    Args:
+      search_space: The bitmap of the search space.
+
+    Returns: The bitmap of all end points that have an empty set of attributes.
+    """
+
+    return self.GetBitmapForAttribute(None, search_space)
+
+
+cdef object MakeBitmap(object ids):
+  """Builds a bitmap from end point ids.
+
+  Args:
+    ids: An iterable of non-negative integers.
+
+  Returns: A Python integer with the bits of the ids set.
+  """
+
+  cdef np.ndarray id_array = np.fromiter(ids, dtype=np.int64)
+  if not len(id_array):
+    return 0
+  # Bits are stored from most to least significant, padded to whole bytes.
+  cdef long size = id_array.max() + 1
+  cdef long padded_size = (size + 7) // 8 * 8
+  bits = np.zeros(padded_size, dtype=np.uint8)
+  bits[padded_size - 1 - id_array] = 1
+  return long(binascii.hexlify(np.packbits(bits).tostring()), 16)
+
+
+cdef np.ndarray BitmapToIds(object bitmap):
+  """Returns the sorted array of ids whose bits are set in a bitmap."""
+
+  if not bitmap:
+    return np.empty(0, dtype=np.int64)
+  cdef str digits = '%x' % bitmap
+  if len(digits) % 2:
+    digits = '0' + digits
+  bits = np.unpackbits(np.frombuffer(binascii.unhexlify(digits),
+                                     dtype=np.uint8))
+  return np.flatnonzero(bits[::-1])
+
+
+cdef long BitCount(object bitmap):
+  """Returns the number of bits set in a bitmap."""
+
+  return bin(bitmap).count('1')
+
+
+cdef bint _LookupIncludes(unicode key, unicode attribute):
+  """Determines if the lookup of a key returns the end points that have an
+  attribute.
+
+  This is used for updating cached lookups when end points are added.
+  """
+
+  if key == u'(.*)':
+    # This returns all end points, including those without the attribute.
+    return True
+  if key is None or attribute is None:
+    return key is attribute
+  return NonEmptyIntersection(attribute, key)
+
+
 cdef bint NonEmptyIntersection(unicode regex1, unicode regex2):
   """Determines if the languages described by two regular expressions have a
   non empty intersection.
@@ -180,7 +494,7 @@ cdef bint NonEmptyIntersection(unicode regex1, unicode regex2):
     return True
   elif '(.*)' in regex1:
     # At least one string is a regex.
-    if re.match(EscapeRegex(regex1), regex2):
+    if MatchesPattern(regex1, regex2):
       return True
 
     if '(.*)' in regex2:
@@ -188,17 +502,143 @@ cdef bint NonEmptyIntersection(unicode regex1, unicode regex2):
       # two regular expressions.
       # For example, if regex1 = 'ab.*d' and regex2 = 'a.*d', then this will return
       # True.
-      return re.match(EscapeRegex(regex2), regex1)
+      return MatchesPattern(regex2, regex1)
     return False
   elif '(.*)' in regex2:
     # If we come here, then only regex2 is a regex.
-    return re.match(EscapeRegex(regex2), regex1)
+    return MatchesPattern(regex2, regex1)
   else:
     # Neither is a regex.
     return regex1 == regex2
 
 
-cdef unicode EscapeRegex(unicode astr):
+cpdef bint MatchesPattern(unicode pattern, unicode string):
+  """Determines if the beginning of a string matches a (.*) pattern.
+
+  This is equivalent to re.match(EscapeRegex(pattern), string). Patterns with a
+  single (.*) are matched without regular expressions, and other patterns are
+  compiled once.
+
+  Args:
+    pattern: A string where (.*) stands for any substring.
+    string: A string.
+
+  Returns: True if the string matches.
+  """
+
+  try:
+    matcher = _PATTERN_CACHE[pattern]
+    _PATTERN_CACHE_COUNTS[0] += 1
+  except KeyError:
+    _PATTERN_CACHE_COUNTS[1] += 1
+    matcher = _MakeMatcher(pattern)
+    if len(_PATTERN_CACHE) >= PATTERN_CACHE_SIZE:
+      _PATTERN_CACHE.clear()
+    _PATTERN_CACHE[pattern] = matcher
+
+  if type(matcher) is not tuple:
+    return matcher.match(string) is not None
+
+  cdef unicode prefix
+  cdef unicode suffix
+  prefix, suffix = matcher
+  if not string.startswith(prefix):
+    return False
+  if not suffix:
+    return True
+  cdef Py_ssize_t start = len(prefix)
+  cdef Py_ssize_t index = string.find(suffix, start)
+  # The regular expression . does not match newlines.
+  return index >= 0 and u'\n' not in string[start:index]
+
+
+cdef object _MakeMatcher(unicode pattern):
+  """Makes a matcher for MatchesPattern.
+
+  Returns: A (prefix, suffix) tuple for patterns of the form prefix(.*)suffix
+  where either part may be empty, or a compiled regular expression.
+  """
+
+  cdef list parts = pattern.split(u'(.*)')
+  if len(parts) == 2:
+    return tuple(parts)
+  return re.compile(EscapeRegex(pattern))
+
+
+def GetPatternCacheCounts():
+  """Returns the numbers of pattern cache hits and misses."""
+
+  return tuple(_PATTERN_CACHE_COUNTS)
+
+
+def TakePatternCacheCounts():
+  """Returns the numbers of pattern cache hits and misses, and resets them."""
+
+  cdef tuple counts = tuple(_PATTERN_CACHE_COUNTS)
+  _PATTERN_CACHE_COUNTS[:] = [0, 0]
+  return counts
+
+
+def AddPatternCacheCounts(tuple counts):
+  """Adds counts returned by TakePatternCacheCounts, for instance in another
+  process."""
+
+  _PATTERN_CACHE_COUNTS[0] += counts[0]
+  _PATTERN_CACHE_COUNTS[1] += counts[1]
+
+
+def TrackNewLookups():
+  """Starts recording the lookups that are cached by attribute maps.
+
+  This lets lookups for short-lived end points, such as those of the
+  applications of link queries against a fixed corpus, be cached without
+  growing the caches.
+  """
+
+  global _NEW_LOOKUPS
+  _NEW_LOOKUPS = []
+
+
+def RemoveNewLookups():
+  """Removes the lookups cached since TrackNewLookups was called."""
+
+  global _NEW_LOOKUPS
+  if _NEW_LOOKUPS is None:
+    return
+  for cache, key in _NEW_LOOKUPS:
+    cache.pop(key, None)
+  _NEW_LOOKUPS = None
+
+
+cdef unicode LiteralPrefix(unicode regex):
+  """Returns the part of a regular expression before the first (.*)."""
+
+  cdef int index = regex.find(u'(.*)')
+  return regex[:index] if index >= 0 else regex
+
+
+cdef list GetKeysWithPrefix(list sorted_keys, unicode prefix):
+  """Returns the keys that start with a prefix.
+
+  Args:
+    sorted_keys: A sorted list of strings.
+    prefix: A string.
+
+  Returns: The keys that start with the prefix, in order.
+  """
+
+  if not prefix:
+    return sorted_keys
+  cdef list result = []
+  cdef Py_ssize_t index = bisect.bisect_left(sorted_keys, prefix)
+  cdef Py_ssize_t size = len(sorted_keys)
+  while index < size and sorted_keys[index].startswith(prefix):
+    result.append(sorted_keys[index])
+    index += 1
+  return result
+
+
+cpdef unicode EscapeRegex(unicode astr):
   """Turns a string into a proper regular expression.
 
   This involves escaping characters such as . and also not escaping parts of
@@ -210,4 +650,4 @@ cdef unicode EscapeRegex(unicode astr):
   Returns: The cleansed regular expression.
   """
 
-  return re.escape(astr.replace('(.*)', 'ddddddd')).replace('ddddddd', '.*')
+  return u'.*'.join([re.escape(part) for part in astr.split(u'(.*)')])
@@ -0,0 +1,66 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2015 The Pennsylvania State University and the University of Wisconsin
+# Systems and Internet Infrastructure Security Laboratory
+#
+# Author: Damien Octeau
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for attribute matching module."""
+
+import os.path
+import re
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..'))
+
+from primo.linking import attribute_matching
+
+
+PATTERNS = [u'abc(.*)', u'(.*)xyz', u'a(.*)z', u'a.b(.*)', u'd(.*)',
+            u'(.*)d', u'/download(.*)', u'(.*)/download', u'a(.*)b(.*)c',
+            u'd(.*)d(.*)d', u'(.*)']
+STRINGS = [u'', u'abc', u'abcdef', u'xyz', u'wxyz', u'az', u'abz', u'a\nz',
+           u'a.bc', u'aXbc', u'd', u'xd', u'dx', u'/download', u'/downloaXd',
+           u'/download/file', u'x/download', u'aXbYc', u'a\nbc', u'ddd',
+           u'dXdYd']
+
+
+class AttributeMatchingTest(unittest.TestCase):
+  def testMatchesPatternAgreesWithRegex(self):
+    for pattern in PATTERNS:
+      regex = re.compile(attribute_matching.EscapeRegex(pattern))
+      for string in STRINGS:
+        self.assertEqual(
+            attribute_matching.MatchesPattern(pattern, string),
+            regex.match(string) is not None, '%r %r' % (pattern, string))
+
+  def testEscapeRegexKeepsLiteralD(self):
+    self.assertEqual(attribute_matching.EscapeRegex(u'd(.*)'), u'd.*')
+    self.assertFalse(attribute_matching.MatchesPattern(u'd(.*)', u'xd'))
+    self.assertFalse(attribute_matching.MatchesPattern(u'/download(.*)',
+                                                       u'/downloaXd'))
+    self.assertTrue(attribute_matching.MatchesPattern(u'/download(.*)',
+                                                      u'/download/file'))
+
+  def testMatchesPatternWithNewline(self):
+    self.assertFalse(attribute_matching.MatchesPattern(u'a(.*)z', u'a\nz'))
+    self.assertTrue(attribute_matching.MatchesPattern(u'a(.*)', u'a\nz'))
+    self.assertFalse(attribute_matching.MatchesPattern(u'a(.*)b(.*)c',
+                                                       u'a\nbc'))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,204 @@
+# Copyright (C) 2015 The Pennsylvania State University and the University of Wisconsin
+# Systems and Internet Infrastructure Security Laboratory
+#
+# Author: Damien Octeau
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""End-to-end benchmarks of link resolution on synthetic corpora.
+
+Each scale point is a synthetic corpus with a given number of applications.
+Its phases are timed separately: ingestion, index building, link resolution
+and output writing. Link resolution is further divided with the stage metrics
+of the metrics module into explicit resolution, implicit resolution and
+probability computation. These stage times do not include the overhead of
+iterating over Intents, which is only part of the total resolution time.
+
+Corpus data are kept in module globals, so each scale point is run in a new
+process. Results are appended to a file with one JSON record per line, so that
+runs can be compared over time.
+"""
+
+from primo.linking.find_implicit_links cimport ImplicitLinkFinder
+from primo.linking.intent_data cimport GetImpreciseComponentIntents
+from primo.linking.intent_data cimport GetPreciseComponentIntents
+from primo.linking.target_data cimport PrepareForQueries
+
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import shutil
+import tempfile
+import time
+import traceback
+
+from primo.linking import fetch_data
+from primo.linking import find_links
+from primo.linking import metrics
+from primo.linking import synthetic
+from primo.linking import write_results
+
+
+LOGGER = logging.getLogger(__name__)
+
+PHASES = ['ingestion', 'index_building', 'resolution', 'explicit_resolution',
+          'implicit_resolution', 'probability', 'output']
+
+
+def RunBenchmarks(parameters, scale_points, results, repetitions=1, seed=0,
+                  workers=1, link_format=write_results.BLOSCPACK,
+                  corpus_directory=None):
+  """Runs benchmarks over scale points and appends their results to a file.
+
+  Args:
+    parameters: A synthetic.CorpusParameters object. Its application count is
+    replaced by each scale point.
+    scale_points: A list of application counts.
+    results: The path to the results file.
+    repetitions: The number of runs of each scale point.
+    seed: The seed of the corpus generator.
+    workers: The number of link resolution processes.
+    link_format: The format of the written links, from
+    write_results.LINK_FORMATS.
+    corpus_directory: If not None, the directory where corpora are kept.
+    Otherwise, corpora are written to a temporary directory.
+
+  Returns: The list of result records.
+  """
+
+  temporary_directory = tempfile.mkdtemp(prefix='primo_benchmark')
+  records = []
+  try:
+    for app_count in scale_points:
+      parameters.app_count = app_count
+      directory = os.path.join(corpus_directory or temporary_directory,
+                               'apps%d_seed%d' % (app_count, seed))
+      protobufs = synthetic.GenerateCorpus(directory, parameters, seed)
+      for repetition in range(repetitions):
+        LOGGER.info('Running scale point %d, repetition %d.', app_count,
+                    repetition)
+        record = _RunInProcess(protobufs, temporary_directory, workers,
+                               link_format)
+        record.update({'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'host': platform.node(),
+                       'scale_point': app_count,
+                       'repetition': repetition,
+                       'seed': seed,
+                       'workers': workers,
+                       'link_format': link_format,
+                       'parameters': dict(vars(parameters))})
+        with open(results, 'a') as results_file:
+          results_file.write(json.dumps(record, sort_keys=True) + '\n')
+        LOGGER.info('Scale point %d: %s.', app_count, ', '.join(
+            ['%s %.3fs' % (phase, record['seconds'][phase])
+             for phase in PHASES]))
+        records.append(record)
+  finally:
+    shutil.rmtree(temporary_directory)
+  return records
+
+
+def _RunInProcess(protobufs, output_directory, workers, link_format):
+  """Runs RunScalePoint in a new process and returns its result.
+
+  Pool processes cannot fork link resolution workers, so a plain process sends
+  its result back through a queue.
+  """
+
+  queue = multiprocessing.Queue()
+  process = multiprocessing.Process(
+      target=_PutScalePoint,
+      args=(queue, protobufs, output_directory, workers, link_format))
+  process.start()
+  succeeded, result = queue.get()
+  process.join()
+  if not succeeded:
+    raise RuntimeError('Benchmark process failed:\n%s' % result)
+  return result
+
+
+def _PutScalePoint(queue, protobufs, output_directory, workers, link_format):
+  """Puts the result of RunScalePoint or the failure traceback in a queue."""
+
+  try:
+    queue.put((True, RunScalePoint(protobufs, output_directory, workers,
+                                   link_format)))
+  except Exception:
+    queue.put((False, traceback.format_exc()))
+
+
+def RunScalePoint(list protobufs, str output_directory, int workers,
+                  str link_format):
+  """Loads a corpus, resolves its links and writes them, timing each phase.
+
+  This should run in a process where no corpus has been loaded.
+
+  Args:
+    protobufs: The paths to the protobufs of the corpus.
+    output_directory: The directory where links are written. They are removed
+    afterwards.
+    workers: The number of link resolution processes.
+    link_format: The format of the written links.
+
+  Returns: A result record with the sizes of the corpus, the number of links
+  and the duration in seconds of each phase.
+  """
+
+  cdef dict seconds = {}
+  start = time.time()
+  applications, components, intents, intent_filters = fetch_data.FetchData(
+      protobufs, None, False)
+  seconds['ingestion'] = time.time() - start
+
+  start = time.time()
+  PrepareForQueries(applications)
+  seconds['index_building'] = time.time() - start
+
+  metrics.Reset()
+  metrics.Enable()
+  start = time.time()
+  intent_links, link_count, _, intent_count, _, _, _ = \
+      find_links.FindLinksForIntents(
+          GetPreciseComponentIntents(), GetImpreciseComponentIntents(), False,
+          components, intent_filters, True, False, None, ImplicitLinkFinder(),
+          True, workers)
+  seconds['resolution'] = time.time() - start
+  metrics.Enable(False)
+  report = metrics.GetReport()
+  for phase, prefix in (('explicit_resolution', 'explicit'),
+                        ('implicit_resolution', 'implicit')):
+    seconds[phase] = sum([values['seconds'] for name, values
+                          in report['stages'].iteritems()
+                          if name.startswith(prefix)
+                          and not name.endswith('probability')])
+  seconds['probability'] = sum([values['seconds'] for name, values
+                                in report['stages'].iteritems()
+                                if name.endswith('probability')])
+
+  destination = os.path.join(output_directory, 'links_%d' % os.getpid())
+  start = time.time()
+  write_results.WriteResults(intent_links, destination, link_format)
+  seconds['output'] = time.time() - start
+  if os.path.isdir(destination):
+    shutil.rmtree(destination)
+  else:
+    os.remove(destination)
+
+  return {'applications': len(applications),
+          'components': len(components),
+          'intent_filters': len(intent_filters),
+          'intents': intent_count,
+          'links': link_count,
+          'seconds': seconds,
+          'caches': report['caches']}
@@ -17,6 +17,8 @@
 """A class and factory for Android application components."""
 
 from primo.linking.applications cimport Application
+from primo.linking.interning cimport Intern
+from primo.linking.interning cimport InternTuple
 from primo.linking.target_data cimport AddComponent
 from primo.linking.intent_filters cimport IntentFilter
 from primo.linking.intent_filters cimport MakeIntentFilter
@@ -39,11 +41,11 @@ cdef Component MakeComponent(object component_pb, Application application,
   Returns: A linking.Component object.
   """
 
-  cdef unicode name = component_pb.name
+  cdef unicode name = Intern(component_pb.name)
   cdef int kind = component_pb.kind
-  cdef unicode permission = (component_pb.permission
+  cdef unicode permission = (Intern(component_pb.permission)
                              if component_pb.HasField('permission') else None)
-  cdef tuple extras = tuple(sorted(component_pb.extras))
+  cdef tuple extras = InternTuple(sorted(component_pb.extras))
   cdef bint exported = component_pb.exported
   cdef int exit_point_count = len(component_pb.exit_points)
   cdef set intents = set()
@@ -79,6 +81,20 @@ cdef int GetSkippedFilterCount():
   return _skipped_imprecise_filters
 
 
+def GetState():
+  """Returns the global component data, for saving corpus snapshots."""
+
+  return (_id, _skipped_imprecise_filters)
+
+
+def SetState(tuple state):
+  """Restores global component data saved with GetState."""
+
+  global _id
+  global _skipped_imprecise_filters
+  _id, _skipped_imprecise_filters = state
+
+
 cdef class Component(object):
   """A class that represents an application component."""
 
@@ -124,6 +140,18 @@ cdef class Component(object):
   def application_id(self):
     return self.application.name
 
+  def __reduce__(self):
+    # Intent Filters refer back to this component, so they are in the state.
+    return (Component,
+            (self.name, self.kind, self.permission, self.extras, self.exported,
+             self.exit_point_count, self.application, None, self.id),
+            (self.filters, self.intents, self._filters_attributes_string,
+             self._intents_attributes_string))
+
+  def __setstate__(self, tuple state):
+    (self.filters, self.intents, self._filters_attributes_string,
+     self._intents_attributes_string) = state
+
   def __hash__(self):
     return self._hash
 
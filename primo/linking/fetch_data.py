@@ -18,6 +18,7 @@
 
 from google.protobuf import text_format
 import logging
+import multiprocessing
 import os
 
 from primo.linking import applications
@@ -32,13 +33,15 @@ intent_count = 0
 intent_filter_count = 0
 
 
-def FetchData(protobufs, protodirs, validate):
+def FetchData(protobufs, protodirs, validate, ingest_workers=None):
   """Fetches data from disk.
 
   Args:
     protobufs: A list of paths to protobufs.
     protodirs: A list of paths to directories containing protobufs.
     validate: True if validation is being performed.
+    ingest_workers: If greater than 1, the number of worker processes used for
+    reading and parsing protobufs.
 
   Returns: A tuple with the set of applications, the set of components, the list
   of Intents and the set of Intent Filters.
@@ -49,16 +52,9 @@ def FetchData(protobufs, protodirs, validate):
   intents = []
   intent_filters = set()
 
-  if protobufs:
-    for file_path in protobufs:
-      ProcessFile(file_path, apps, components, intents, intent_filters,
-                  validate)
-
-  if protodirs:
-    for directory in protodirs:
-      for file_path in os.listdir(directory):
-        ProcessFile(os.path.join(directory, file_path), apps, components,
-                    intents, intent_filters, validate)
+  for application in LoadApplications(protobufs, protodirs, ingest_workers):
+    AddApplication(application, apps, components, intents, intent_filters,
+                   validate)
 
   print 'Applications: %s' % len(apps)
   print 'Exit points: %s' % exit_point_count
@@ -67,6 +63,48 @@ def FetchData(protobufs, protodirs, validate):
   return apps, components, intents, intent_filters
 
 
+def LoadApplications(protobufs, protodirs, ingest_workers=None):
+  """Reads and parses protobufs.
+
+  Args:
+    protobufs: A list of paths to protobufs.
+    protodirs: A list of paths to directories containing protobufs.
+    ingest_workers: If greater than 1, the number of worker processes used for
+    reading and parsing protobufs.
+
+  Yields: Application protobuf objects or MessageRecords of them, in file order.
+  """
+
+  file_paths = []
+  if protobufs:
+    file_paths += protobufs
+
+  if protodirs:
+    for directory in protodirs:
+      for file_path in os.listdir(directory):
+        file_paths.append(os.path.join(directory, file_path))
+
+  if ingest_workers and ingest_workers > 1 and len(file_paths) > 1:
+    # Workers only read and parse protobufs. Wrapping applications updates
+    # global target and Intent data, so it is done by the caller, in the
+    # original file order. This keeps component, Intent Filter and Intent ids
+    # identical to those of a sequential run.
+    LOGGER.info('Loading %s protobufs with %s workers.', len(file_paths),
+                ingest_workers)
+    pool = multiprocessing.Pool(ingest_workers)
+    try:
+      chunk_size = max(1, len(file_paths) // (4 * ingest_workers))
+      for application in pool.imap(LoadApplicationRecord, file_paths,
+                                   chunk_size):
+        yield application
+    finally:
+      pool.close()
+      pool.join()
+  else:
+    for file_path in file_paths:
+      yield LoadApplication(file_path)
+
+
 def ProcessFile(file_path, apps, components, intents, intent_filters, validate):
   """Loads a single protobuf.
 
@@ -79,6 +117,19 @@ def ProcessFile(file_path, apps, components, intents, intent_filters, validate):
     validate: True if validation is being performed.
   """
 
+  AddApplication(LoadApplication(file_path), apps, components, intents,
+                 intent_filters, validate)
+
+
+def LoadApplication(file_path):
+  """Reads and parses a single protobuf.
+
+  Args:
+    file_path: The path to a protobuf.
+
+  Returns: An Application protobuf object.
+  """
+
   LOGGER.debug('Loading %s.', file_path)
   if os.path.islink(file_path):
     linked_path = os.readlink(file_path)
@@ -93,6 +144,35 @@ def ProcessFile(file_path, apps, components, intents, intent_filters, validate):
     text_format.Merge(file_contents_string, application)
   else:
     application.ParseFromString(file_contents_string)
+  return application
+
+
+def LoadApplicationRecord(file_path):
+  """Reads and parses a single protobuf into a picklable record.
+
+  This is the unit of work of ingestion workers.
+
+  Args:
+    file_path: The path to a protobuf.
+
+  Returns: A MessageRecord for the Application protobuf.
+  """
+
+  return MessageRecord(LoadApplication(file_path))
+
+
+def AddApplication(application, apps, components, intents, intent_filters,
+                   validate):
+  """Wraps a parsed application and adds it to the global data.
+
+  Args:
+    application: An Application protobuf object or a MessageRecord of one.
+    apps: The set of applications.
+    components: The set of components.
+    intents: The list of Intents.
+    intent_filters: The set of Intent Filters.
+    validate: True if validation is being performed.
+  """
 
   application_wrapper = applications.MakeApplication(application, validate)
   global exit_point_count
@@ -108,3 +188,39 @@ def ProcessFile(file_path, apps, components, intents, intent_filters, validate):
     components.add(component)
     for intent_filter in component.filters:
       intent_filters.add(intent_filter)
+
+
+class MessageRecord(object):
+  """A picklable snapshot of a protobuf message.
+
+  Protobuf messages are pickled by serializing them, so sending them between
+  processes would parse every message twice. A record holds plain Python
+  values instead and exposes the subset of the message interface used by the
+  application, component and Intent factories: field access (with protobuf
+  default values for unset fields) and HasField.
+  """
+
+  def __init__(self, message):
+    present = set()
+    for field in message.DESCRIPTOR.fields:
+      name = field.name
+      value = getattr(message, name)
+      if field.label == field.LABEL_REPEATED:
+        if field.type == field.TYPE_MESSAGE:
+          value = [MessageRecord(element) for element in value]
+        else:
+          value = list(value)
+        if value:
+          present.add(name)
+      else:
+        if message.HasField(name):
+          present.add(name)
+        if field.type == field.TYPE_MESSAGE:
+          value = MessageRecord(value)
+      self.__dict__[name] = value
+    self._present = frozenset(present)
+
+  def HasField(self, name):
+    """Determines if a non-repeated field was set in the original message."""
+
+    return name in self._present
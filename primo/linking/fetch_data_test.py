@@ -0,0 +1,76 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2015 The Pennsylvania State University and the University of Wisconsin
+# Systems and Internet Infrastructure Security Laboratory
+#
+# Author: Damien Octeau
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for data fetching module."""
+
+import cPickle
+import os.path
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..'))
+
+from primo.linking import fetch_data
+from primo.linking import ic3_data_pb2
+
+
+class MessageRecordTest(unittest.TestCase):
+  def setUp(self):
+    self.application = ic3_data_pb2.Application()
+    self.application.name = u'app1'
+    self.application.version = 3
+    self.application.used_permissions.extend([u'perm2', u'perm1'])
+    component = self.application.components.add()
+    component.name = u'component1'
+    component.kind = ic3_data_pb2.Application.Component.SERVICE
+    intent_filter = component.intent_filters.add()
+    attribute = intent_filter.attributes.add()
+    attribute.kind = ic3_data_pb2.ACTION
+    attribute.value.extend([u'action1', u'action2'])
+
+  def testFieldValues(self):
+    record = fetch_data.MessageRecord(self.application)
+    self.assertEqual(record.name, u'app1')
+    self.assertEqual(record.version, 3)
+    self.assertEqual(record.used_permissions, [u'perm2', u'perm1'])
+    component = record.components[0]
+    self.assertEqual(component.kind,
+                     ic3_data_pb2.Application.Component.SERVICE)
+    self.assertFalse(component.exported)
+    self.assertEqual(component.exit_points, [])
+    attribute = component.intent_filters[0].attributes[0]
+    self.assertEqual(attribute.kind, ic3_data_pb2.ACTION)
+    self.assertEqual(attribute.value, [u'action1', u'action2'])
+
+  def testHasField(self):
+    record = fetch_data.MessageRecord(self.application)
+    self.assertTrue(record.HasField('name'))
+    self.assertFalse(record.HasField('sample'))
+    self.assertFalse(record.components[0].HasField('permission'))
+
+  def testPickle(self):
+    record = cPickle.loads(cPickle.dumps(
+        fetch_data.MessageRecord(self.application), cPickle.HIGHEST_PROTOCOL))
+    self.assertEqual(record.components[0].name, u'component1')
+    self.assertTrue(record.HasField('version'))
+
+
+if __name__ == '__main__':
+  unittest.main()
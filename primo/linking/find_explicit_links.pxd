@@ -27,14 +27,24 @@ cdef class ExplicitLinkFinder(object):
   cdef float _probability_intra_app
   cdef float _probability_inter_app
   cdef tuple _CACHE
+  # Indicates whether precise links are no longer counted.
+  cdef bint _frozen
 
   cdef void IncrementIntraApp(self)
   cdef void IncrementInterApp(self)
+  cdef tuple GetCounts(self)
+  cdef void AddCounts(self, int intra_app, int inter_app)
+  cdef ExplicitLinkFinder Overlay(self)
   cdef float GetInterAppProbability(self)
   cdef float GetIntraAppProbability(self)
+  cdef set FindExplicitTargetsForIntent(self, Intent current_intent,
+                                        set components,
+                                        dict shared_cuts=?)
+  cdef set FindSharedCut(self, Intent current_intent, set components)
   cdef tuple FindExplicitLinksForIntent(
       self, Intent current_intent, set components, bint compute_link_attribute,
-      bint validate)
+      bint validate, dict shared_cuts=?)
+  cdef void CountPreciseLink(self, Intent intent, Component target)
   cdef set ExplicitKindTest(self, Intent intent, set initial_cut)
   cdef set ExplicitVisibilityTest(self, Intent intent, set initial_cut)
   cdef DTYPE_t GetProbabilityForExplicitIntent(self, Intent intent,
@@ -33,6 +33,17 @@ from primo.linking.target_data cimport GetComponentsWithName
 from primo.linking.target_data cimport GetExportedComponentCount
 from primo.linking.target_data cimport GetExportedComponents
 from primo.linking.intents cimport Intent
+from primo.linking.metrics cimport CountCache
+from primo.linking.metrics cimport EXPLICIT_APPLICATIONS_CACHE
+from primo.linking.metrics cimport EXPLICIT_CLASS
+from primo.linking.metrics cimport EXPLICIT_KIND
+from primo.linking.metrics cimport EXPLICIT_PACKAGE
+from primo.linking.metrics cimport EXPLICIT_PROBABILITY
+from primo.linking.metrics cimport EXPLICIT_VISIBILITY
+from primo.linking.metrics cimport MetricsEnabled
+from primo.linking.metrics cimport RecordStage
+from primo.linking.metrics cimport SHARED_CUT_CACHE
+from primo.linking.metrics cimport StageStart
 
 
 DTYPE = np.int8
@@ -50,6 +61,7 @@ cdef class ExplicitLinkFinder(object):
     self._probability_intra_app = -1
     self._probability_inter_app = -1
     self._CACHE = ({}, {}, {})
+    self._frozen = False
 
   cdef void IncrementIntraApp(self):
     if self._probability_intra_app > 0:
@@ -65,6 +77,36 @@ cdef class ExplicitLinkFinder(object):
       raise Exception
     self._inter_app += 1
 
+  cdef tuple GetCounts(self):
+    """Returns the numbers of intra-app and inter-app explicit links."""
+
+    return self._intra_app, self._inter_app
+
+  cdef void AddCounts(self, int intra_app, int inter_app):
+    """Adds intra-app and inter-app explicit link counts, for instance from
+    another process."""
+
+    if self._probability_intra_app > 0 or self._probability_inter_app > 0:
+      LOGGER.error('Should not add explicit link counts after computing '
+                   'probabilities.')
+      raise Exception
+    self._intra_app += intra_app
+    self._inter_app += inter_app
+
+  cdef ExplicitLinkFinder Overlay(self):
+    """Returns a finder with the same link counts, which does not count
+    precise links.
+
+    The overlay is used for resolving Intents against targets that are only
+    added temporarily, without changing the counts of the corpus. Its cache is
+    empty, since it depends on the set of applications.
+    """
+
+    cdef ExplicitLinkFinder overlay = ExplicitLinkFinder()
+    overlay.AddCounts(self._intra_app, self._inter_app)
+    overlay._frozen = True
+    return overlay
+
   cdef float GetInterAppProbability(self):
     """Returns the probability of having inter-app explicit links.
 
@@ -91,39 +133,92 @@ cdef class ExplicitLinkFinder(object):
                                      (self._intra_app + self._inter_app))
     return self._probability_intra_app
 
-  @cython.boundscheck(False)
-  cdef tuple FindExplicitLinksForIntent(
-      self, Intent current_intent, set components, bint compute_link_attribute,
-      bint validate):
+  cdef set FindExplicitTargetsForIntent(self, Intent current_intent,
+                                        set components,
+                                        dict shared_cuts=None):
+    """Selects the components that an explicit Intent can target.
+
+    Args:
+      current_intent: An explicit Intent.
+      components: The set of potential target components.
+      shared_cuts: If not None, a cache of the results of FindSharedCut for
+      equal Intents, which is only valid for a single set of potential targets.
+
+    Returns: The set of target components, or None if there is none.
+    """
+
     IF DEBUG:
       LOGGER.debug("initially %s", len(components))
 
+    if shared_cuts is None:
+      components = self.FindSharedCut(current_intent, components)
+    else:
+      try:
+        components = shared_cuts[current_intent]
+        CountCache(SHARED_CUT_CACHE, True)
+      except KeyError:
+        CountCache(SHARED_CUT_CACHE, False)
+        components = self.FindSharedCut(current_intent, components)
+        shared_cuts[current_intent] = components
+    if not components:
+      return None
+
+    cdef long input_size = len(components)
+    cdef double start = StageStart()
+    components = self.ExplicitVisibilityTest(current_intent, components)
+    RecordStage(EXPLICIT_VISIBILITY, start, input_size, len(components))
+    IF DEBUG:
+      LOGGER.debug("after visibility %s", len(components))
+    if not components:
+      return None
+
+    return components
+
+  cdef set FindSharedCut(self, Intent current_intent, set components):
+    """Performs the tests that do not depend on the sending application.
+
+    Returns: The set of components that pass the tests.
+    """
+
+    cdef long input_size
+    cdef double start
     cdef unicode dclass = current_intent.dclass
     if dclass != '(.*)':
+      input_size = len(components)
+      start = StageStart()
       components = GetComponentsWithName(dclass, components)
+      RecordStage(EXPLICIT_CLASS, start, input_size, len(components))
       IF DEBUG:
         LOGGER.debug("after class %s", len(components))
     if len(components) == 0:
-      return None
+      return components
 
     cdef unicode dpackage = current_intent.dpackage
     if dpackage is not None and dpackage != '(.*)':
+      input_size = len(components)
+      start = StageStart()
       components = GetComponentsOfApp(dpackage, components)
+      RecordStage(EXPLICIT_PACKAGE, start, input_size, len(components))
       IF DEBUG:
         LOGGER.debug("after package %s", len(components))
     if len(components) == 0:
-      return None
-
-    components = self.ExplicitVisibilityTest(current_intent, components)
-    IF DEBUG:
-      LOGGER.debug("after visibility %s", len(components))
-    if not components:
-      return None
+      return components
 
+    input_size = len(components)
+    start = StageStart()
     components = self.ExplicitKindTest(current_intent, components)
+    RecordStage(EXPLICIT_KIND, start, input_size, len(components))
     IF DEBUG:
       LOGGER.debug("after kind %s", len(components))
-    if len(components) == 0:
+    return components
+
+  @cython.boundscheck(False)
+  cdef tuple FindExplicitLinksForIntent(
+      self, Intent current_intent, set components, bint compute_link_attribute,
+      bint validate, dict shared_cuts=None):
+    components = self.FindExplicitTargetsForIntent(current_intent, components,
+                                                   shared_cuts)
+    if components is None:
       return None
 
     cdef list targets
@@ -142,8 +237,10 @@ cdef class ExplicitLinkFinder(object):
 
     attribute_computation_time = 0
 
+    cdef double stage_start
     if compute_link_attribute:
       start = time.time()
+      stage_start = StageStart()
       attributes = np.empty(components_size, dtype=DTYPE)
       for component in targets:
         current_link_attribute = self.GetProbabilityForExplicitIntent(
@@ -151,14 +248,24 @@ cdef class ExplicitLinkFinder(object):
         attributes[index] = current_link_attribute
         index += 1
       attribute_computation_time = time.time() - start
+      if MetricsEnabled():
+        RecordStage(EXPLICIT_PROBABILITY, stage_start, components_size,
+                    np.count_nonzero(attributes))
     if current_intent.IsPrecise():
-      if current_intent.application.name == component.application.name:
-        self.IncrementIntraApp()
-      else:
-        self.IncrementInterApp()
+      self.CountPreciseLink(current_intent, component)
 
     return targets, attributes, attribute_computation_time
 
+  cdef void CountPreciseLink(self, Intent intent, Component target):
+    """Counts a precise explicit link as intra-app or inter-app."""
+
+    if self._frozen:
+      return
+    if intent.application.name == target.application.name:
+      self.IncrementIntraApp()
+    else:
+      self.IncrementInterApp()
+
 
   cdef set ExplicitKindTest(self, Intent intent, set initial_cut):
     return GetComponentsWithKind(intent.exit_kind, initial_cut)
@@ -193,7 +300,9 @@ cdef class ExplicitLinkFinder(object):
         key = (dpackage, dclass)
         try:
           apps_with_exported_components = self._CACHE[exit_kind][key]
+          CountCache(EXPLICIT_APPLICATIONS_CACHE, True)
         except KeyError:
+          CountCache(EXPLICIT_APPLICATIONS_CACHE, False)
           matching_apps = GetAppsMatching(dpackage, dclass)
           apps_with_exported_components = GetExportedComponentCount(exit_kind,
                                                                     matching_apps)
@@ -16,6 +16,7 @@
 # limitations under the License.
 
 cimport numpy as np
+from primo.linking.intent_data cimport IntentColumns
 from primo.linking.intent_filters cimport IntentFilter
 from primo.linking.intents cimport ComponentIntent
 from primo.linking.intents cimport Intent
@@ -26,28 +27,70 @@ cdef class ImplicitLinkFinder(object):
   cdef dict _intent_cache
   # Yields the Intents that match a given Intent Filter.
   cdef dict _filter_to_intent_matches
+  # Cache of the group-by tables of the Intents that match a given Intent
+  # Filter, for each combination of fields.
+  cdef dict _match_counts
+  # The columns of the precise Intents used by the caches.
+  cdef IntentColumns _columns
   # Cache of probability values for Intent-to-Filter links.
   cdef dict _cache
+  # The ProbabilityMemo used across runs, or None.
+  cdef object _memo
+  # The Intent Filter parts of memo keys, by short descriptor.
+  cdef dict _memo_filter_keys
+  # The last set of potential targets and its bitmap.
+  cdef set _search_space
+  cdef object _search_space_bitmap
+  # Indicates whether tests are ordered by estimated selectivity.
+  cdef bint _plan_tests
+  # Counts the uses of each test plan.
+  cdef dict _plan_counts
+  # For each test, the number of runs and the total cut sizes before and after.
+  cdef list _stage_counts
 
+  cdef void SetPlanTests(self, bint plan_tests)
+  cdef void SetMemo(self, object memo)
+  cdef long FlushMemo(self)
+  cdef ImplicitLinkFinder Overlay(self)
+
+  cdef object GetSearchSpace(self, set intent_filters)
+  cdef list FindImplicitTargetsForIntent(
+      self, ComponentIntent component_intent, set intent_filters,
+      bint precise_intent=?, dict shared_cuts=?)
+  cdef object FindSharedCut(self, Intent current_intent, set intent_filters,
+                            bint precise_intent)
+  cdef tuple PlanTests(self, Intent current_intent, bint precise_intent)
+  cdef double EstimateSelectivity(self, int stage, Intent current_intent)
+  cdef object PerformStage(self, int stage, Intent current_intent,
+                           object initial_cut)
+  cdef tuple TakePlanCounts(self)
+  cdef void AddPlanCounts(self, tuple counts)
+  cdef void LogPlans(self)
+  cdef list FindTargetsInCut(self, Intent current_intent, object cut)
   cdef tuple FindImplicitLinksForIntent(
       self, ComponentIntent component_intent, set intent_filters,
-      bint compute_link_attribute, bint precise_intent=?, bint validate=?)
-  cdef set VisibilityTest(self, Intent current_intent, set initial_cut)
-  cdef set DataTest(self, Intent current_intent, set initial_cut)
-  cdef set UriDataTest(self, Intent current_intent, set initial_cut)
-  cdef set MimeTypeTest(self, Intent current_intent, set initial_cut)
-  cdef set CategoryTest(self, Intent current_intent, set initial_cut)
-  cdef set ActionTest(self, Intent current_intent, set initial_cut)
-  cdef set IntentPermissionTest(self, current_intent, initial_cut)
-  cdef set KindTest(self, Intent current_intent, initial_cut)
+      bint compute_link_attribute, bint precise_intent=?, bint validate=?,
+      dict shared_cuts=?)
+  cdef object VisibilityTest(self, Intent current_intent, object initial_cut)
+  cdef object DataTest(self, Intent current_intent, object initial_cut)
+  cdef object UriDataTest(self, Intent current_intent, object initial_cut)
+  cdef object MimeTypeTest(self, Intent current_intent, object initial_cut)
+  cdef object CategoryTest(self, Intent current_intent, object initial_cut)
+  cdef object ActionTest(self, Intent current_intent, object initial_cut)
+  cdef object IntentPermissionTest(self, current_intent, initial_cut)
+  cdef object KindTest(self, Intent current_intent, initial_cut)
   cdef void AddPreciseIntentMatch(self, tuple intent_filter_descriptor, intent)
-  cdef set PackageTest(self, Intent current_intent, set initial_cut)
+  cdef object PackageTest(self, Intent current_intent, object initial_cut)
   cdef bint ComponentPermissionTest(self, Intent current_intent,
                                     IntentFilter filt)
-  cdef set GetIntentMatchesForFilter(self, IntentFilter intent_filter)
+  cdef IntentColumns GetColumns(self)
+  cdef dict GetIntentMatchCounts(self, IntentFilter intent_filter,
+                                 tuple fields)
+  cdef bytes MemoKey(self, Intent intent, IntentFilter intent_filter)
   cdef DTYPE_t GetProbabilityForImplicitIntent(
       self, Intent intent, IntentFilter intent_filter, bint validate) except -1
-  cdef set GetIntentsForPreciseFields(self, tuple precise_attributes)
-  cdef int GetMatchingIntents(self, IntentFilter intent_filter, intents,
-                              imprecise_fields)
-  cdef set ReverseUriDataTest(self, IntentFilter intent_filter, set intents)
+  cdef long CountIntentsWithPreciseFields(self, tuple precise_attributes)
+  cdef long GetMatchingIntents(self, IntentFilter intent_filter, object intents,
+                               imprecise_fields)
+  cdef object ReverseUriDataTest(self, IntentFilter intent_filter,
+                                 object intents)
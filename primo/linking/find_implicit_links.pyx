@@ -18,17 +18,41 @@
 
 DEF DEBUG = False
 
+# Tests that select Intent Filters from a bitmap. The first four are the tests
+# used for recording precise Intent matches.
+DEF ACTION_STAGE = 0
+DEF CATEGORY_STAGE = 1
+DEF KIND_STAGE = 2
+DEF DATA_STAGE = 3
+DEF INTENT_PERMISSION_STAGE = 4
+DEF PACKAGE_STAGE = 5
+DEF MATCHING_STAGE_COUNT = 4
+DEF STAGE_COUNT = 6
+DEF PLANS_LOGGED = 10
+
 cimport cython
 cimport numpy as np
 
+from primo.linking.target_data import ACTION
 from primo.linking.target_data import BASE_TYPE
-from primo.linking.util import Powerset
+from primo.linking.target_data import CATEGORY
+from primo.linking.target_data import KIND
+from primo.linking.target_data import PACKAGE
+from primo.linking.target_data import SCHEME
+from primo.linking.target_data import TYPE
+from primo.linking.target_data import USED_PERMISSIONS
 import logging
 import numpy as np
 import time
 
-from primo.linking.intent_data cimport GetAttributeMaps
-from primo.linking.intent_data cimport GetPreciseIntents
+from primo.linking import probability_memo
+
+from primo.linking.attribute_matching cimport BitCount
+from primo.linking.intent_data cimport GetIntentColumns
+from primo.linking.intent_data cimport IntentColumns
+from primo.linking.target_data cimport GetFilterBitmap
+from primo.linking.target_data cimport GetFilterFraction
+from primo.linking.target_data cimport GetFiltersFromBitmap
 from primo.linking.target_data cimport GetExportedFilters
 from primo.linking.target_data cimport GetFiltersOfApp
 from primo.linking.target_data cimport GetFiltersWithUsedPermission
@@ -49,6 +73,19 @@ from primo.linking.intent_filters cimport IntentFilter
 from primo.linking.intents cimport ComponentIntent
 from primo.linking.intents cimport Intent
 from primo.linking.attribute_matching cimport NonEmptyIntersection
+from primo.linking.metrics cimport CountCache
+from primo.linking.metrics cimport FILTER_MATCHES_CACHE
+from primo.linking.metrics cimport IMPLICIT_ACTION
+from primo.linking.metrics cimport IMPLICIT_COMPONENT_PERMISSION
+from primo.linking.metrics cimport IMPLICIT_PROBABILITY
+from primo.linking.metrics cimport IMPLICIT_VISIBILITY
+from primo.linking.metrics cimport INTENT_FIELDS_CACHE
+from primo.linking.metrics cimport MetricsEnabled
+from primo.linking.metrics cimport PROBABILITY_CACHE
+from primo.linking.metrics cimport PROBABILITY_MEMO_CACHE
+from primo.linking.metrics cimport RecordStage
+from primo.linking.metrics cimport SHARED_CUT_CACHE
+from primo.linking.metrics cimport StageStart
 
 include 'primo/linking/constants.pxi'
 
@@ -58,18 +95,99 @@ DTYPE = np.int8
 
 LOGGER = logging.getLogger(__name__)
 
+cdef tuple _STAGE_NAMES = ('action', 'category', 'kind', 'data',
+                           'intent permission', 'package')
+
 
 cdef class ImplicitLinkFinder(object):
   def __cinit__(self):
     self._intent_cache = {}
     self._filter_to_intent_matches = {}
+    self._match_counts = {}
+    self._columns = None
     self._cache = {}
+    self._memo = None
+    self._memo_filter_keys = {}
+    self._search_space = None
+    self._search_space_bitmap = 0
+    self._plan_tests = True
+    self._plan_counts = {}
+    self._stage_counts = [[0, 0, 0] for _ in range(STAGE_COUNT)]
+
+  cdef void SetPlanTests(self, bint plan_tests):
+    """Sets whether tests are ordered by estimated selectivity.
+
+    If not, tests are always performed in the order of the stage constants.
+    """
 
-  @cython.boundscheck(False)
-  cdef tuple FindImplicitLinksForIntent(
+    self._plan_tests = plan_tests
+
+  cdef void SetMemo(self, object memo):
+    """Sets the ProbabilityMemo used for imprecise Intents, or None.
+
+    The memo is only used while training data stays the same as when it is set.
+    """
+
+    self._memo = memo
+    self._memo_filter_keys.clear()
+    if memo is not None:
+      self.GetColumns()
+
+  cdef long FlushMemo(self):
+    """Writes new memoized probabilities and returns their number."""
+
+    return self._memo.Flush() if self._memo is not None else 0
+
+  cdef ImplicitLinkFinder Overlay(self):
+    """Returns a finder that starts with the precise Intent matches of this
+    one, for resolving Intents against temporarily added Intent Filters.
+
+    Matches recorded by the overlay for new Intent Filter descriptors are not
+    seen by this finder. The precise Intents that match a known descriptor are
+    already recorded, so recording them again leaves the shared match sets and
+    the shared group-by tables unchanged. Training data should not change while
+    the overlay is used.
+    """
+
+    cdef ImplicitLinkFinder overlay = ImplicitLinkFinder()
+    overlay._filter_to_intent_matches = dict(self._filter_to_intent_matches)
+    overlay._match_counts = dict(self._match_counts)
+    overlay._columns = self.GetColumns()
+    overlay._intent_cache = self._intent_cache
+    overlay._plan_tests = self._plan_tests
+    return overlay
+
+  cdef object GetSearchSpace(self, set intent_filters):
+    """Returns the bitmap of a set of potential target Intent Filters.
+
+    The bitmap of the last set is kept, since the same set is usually used for
+    all Intents. Sets of potential targets should not be modified while links
+    are being computed.
+    """
+
+    if intent_filters is not self._search_space:
+      self._search_space = intent_filters
+      self._search_space_bitmap = GetFilterBitmap(intent_filters)
+    return self._search_space_bitmap
+
+  cdef list FindImplicitTargetsForIntent(
       self, ComponentIntent component_intent, set intent_filters,
-      bint compute_link_attribute, bint precise_intent=True,
-      bint validate=False):
+      bint precise_intent=True, dict shared_cuts=None):
+    """Selects the Intent Filters that an implicit Intent can target.
+
+    Precise Intents are also recorded as matches for the Intent Filters that
+    pass the data test, for later probability computations.
+
+    Args:
+      component_intent: An implicit Intent.
+      intent_filters: The set of potential target Intent Filters.
+      precise_intent: Indicates if the argument Intent is precise.
+      shared_cuts: If not None, a cache of the results of FindSharedCut for
+      equal Intents, which is only valid for a single set of potential targets.
+
+    Returns: The list of target Intent Filters, or None if there is none.
+    """
+
     cdef Intent current_intent = component_intent.intent
 
     IF DEBUG:
@@ -77,70 +195,254 @@ cdef class ImplicitLinkFinder(object):
       LOGGER.debug('%s', current_intent)
       LOGGER.debug('-----End Intent-----')
 
-    # Only select filters that have an action.
-    intent_filters = self.ActionTest(current_intent, intent_filters)
-    if not intent_filters:
+    if shared_cuts is None:
+      cut = self.FindSharedCut(current_intent, intent_filters, precise_intent)
+    else:
+      try:
+        cut = shared_cuts[current_intent]
+        CountCache(SHARED_CUT_CACHE, True)
+      except KeyError:
+        CountCache(SHARED_CUT_CACHE, False)
+        cut = self.FindSharedCut(current_intent, intent_filters,
+                                 precise_intent)
+        shared_cuts[current_intent] = cut
+    if not cut:
       return None
-    IF DEBUG:
-      LOGGER.debug("after action %s", len(intent_filters))
 
-    intent_filters = self.CategoryTest(current_intent, intent_filters)
-    if not intent_filters:
-      return None
-    IF DEBUG:
-      LOGGER.debug("after category %s", len(intent_filters))
+    return self.FindTargetsInCut(current_intent, cut)
 
-    intent_filters = self.KindTest(current_intent, intent_filters)
-    if not intent_filters:
-      return None
-    IF DEBUG:
-      LOGGER.debug("after kind test %s", len(intent_filters))
+  cdef object FindSharedCut(self, Intent current_intent, set intent_filters,
+                            bint precise_intent):
+    """Performs the tests that do not depend on the sending application.
 
-    intent_filters = self.DataTest(current_intent, intent_filters)
-    if not intent_filters:
-      return None
-    IF DEBUG:
-      LOGGER.debug("after data: %s", len(intent_filters))
+    Their result is the same for all equal Intents, since all the fields they
+    use are part of Intent descriptors.
+
+    Returns: The bitmap of the Intent Filters that pass the tests.
+    """
+
+    # Tests are performed on bitmaps of Intent Filters, which are only turned
+    # into Intent Filter objects when needed. They all intersect the cut with
+    # a set of Intent Filters, so their order does not change the result.
+    cut = self.GetSearchSpace(intent_filters)
+
+    cdef tuple plan = self.PlanTests(current_intent, precise_intent)
+    try:
+      self._plan_counts[plan] += 1
+    except KeyError:
+      self._plan_counts[plan] = 1
 
     cdef IntentFilter filt
+    cdef int index
+    cdef int stage
+    cdef list stage_counts
+    # Counting the Intent Filters of a bitmap costs more than a test, so cut
+    # sizes are only measured when metrics are enabled.
+    cdef bint measure = MetricsEnabled()
+    cdef long cut_size = BitCount(cut) if measure else 0
+    cdef long input_size
+    cdef double start
+    for index, stage in enumerate(plan):
+      if precise_intent and index == MATCHING_STAGE_COUNT:
+        for filt in GetFiltersFromBitmap(cut):
+          self.AddPreciseIntentMatch(filt.short_descriptor, current_intent)
+      stage_counts = self._stage_counts[stage]
+      stage_counts[0] += 1
+      stage_counts[1] += cut_size
+      input_size = cut_size
+      start = StageStart()
+      cut = self.PerformStage(stage, current_intent, cut)
+      cut_size = BitCount(cut) if measure and cut else 0
+      stage_counts[2] += cut_size
+      # Metric stages of these tests are in the order of the stage constants.
+      RecordStage(IMPLICIT_ACTION + stage, start, input_size, cut_size)
+      IF DEBUG:
+        LOGGER.debug('after %s test %s', _STAGE_NAMES[stage], cut_size)
+      if not cut:
+        return 0
+
+    return cut
+
+  cdef tuple PlanTests(self, Intent current_intent, bint precise_intent):
+    """Orders the tests of FindSharedCut, most selective first.
+
+    Tests are ordered by the fraction of Intent Filters that they are estimated
+    to select. For precise Intents, the tests used for recording precise Intent
+    matches come first.
+
+    Returns: A tuple of stage constants.
+    """
+
+    if not self._plan_tests:
+      return tuple(range(STAGE_COUNT))
+
+    cdef list estimates = [(self.EstimateSelectivity(stage, current_intent),
+                            stage) for stage in range(STAGE_COUNT)]
     if precise_intent:
-      for filt in intent_filters:
-        self.AddPreciseIntentMatch(filt.short_descriptor, current_intent)
+      return tuple([stage for _, stage
+                    in sorted(estimates[:MATCHING_STAGE_COUNT])] +
+                   [stage for _, stage
+                    in sorted(estimates[MATCHING_STAGE_COUNT:])])
+    return tuple([stage for _, stage in sorted(estimates)])
 
-    intent_filters = self.IntentPermissionTest(current_intent, intent_filters)
-    if not intent_filters:
-      return None
-    IF DEBUG:
-      LOGGER.debug("after intent permission %s", len(intent_filters))
+  cdef double EstimateSelectivity(self, int stage, Intent current_intent):
+    """Estimates the fraction of Intent Filters that pass a test.
 
-    intent_filters = self.VisibilityTest(current_intent, intent_filters)
-    if not intent_filters:
-      return None
-    IF DEBUG:
-      LOGGER.debug("after visibility test %s", len(intent_filters))
+    Tests with wildcard Intent values are assumed to select all Intent Filters.
+    """
+
+    cdef object value
+    if stage == ACTION_STAGE:
+      value = current_intent.action
+      if value and '(.*)' not in value:
+        return GetFilterFraction(ACTION, value)
+      return 1.0 - GetFilterFraction(ACTION, None)
+    elif stage == CATEGORY_STAGE:
+      # Intent Filters need all categories, so the rarest one is an upper
+      # bound.
+      value = current_intent.categories
+      if value and not any(['(.*)' in category for category in value]):
+        return min([GetFilterFraction(CATEGORY, category)
+                    for category in value])
+    elif stage == KIND_STAGE:
+      return GetFilterFraction(KIND, current_intent.exit_kind)
+    elif stage == DATA_STAGE:
+      value = current_intent.dtype
+      if value:
+        if '(.*)' not in value:
+          return GetFilterFraction(TYPE, value)
+      elif not current_intent.HasData():
+        return GetFilterFraction(SCHEME, None)
+      elif current_intent.scheme and '(.*)' not in current_intent.scheme:
+        return GetFilterFraction(SCHEME, current_intent.scheme)
+    elif stage == INTENT_PERMISSION_STAGE:
+      value = current_intent.permission
+      if value and '(.*)' not in value:
+        return GetFilterFraction(USED_PERMISSIONS, value)
+    elif stage == PACKAGE_STAGE:
+      value = current_intent.dpackage
+      if value and '(.*)' not in value:
+        return GetFilterFraction(PACKAGE, value)
+    return 1.0
+
+  cdef object PerformStage(self, int stage, Intent current_intent,
+                           object initial_cut):
+    """Performs one of the tests of FindSharedCut."""
+
+    if stage == ACTION_STAGE:
+      return self.ActionTest(current_intent, initial_cut)
+    elif stage == CATEGORY_STAGE:
+      return self.CategoryTest(current_intent, initial_cut)
+    elif stage == KIND_STAGE:
+      return self.KindTest(current_intent, initial_cut)
+    elif stage == DATA_STAGE:
+      return self.DataTest(current_intent, initial_cut)
+    elif stage == INTENT_PERMISSION_STAGE:
+      return self.IntentPermissionTest(current_intent, initial_cut)
+    else:
+      return self.PackageTest(current_intent, initial_cut)
+
+  cdef tuple TakePlanCounts(self):
+    """Returns the counts of test plans and test cut sizes, and resets them."""
 
-    intent_filters = self.PackageTest(current_intent, intent_filters)
-    if not intent_filters:
+    cdef tuple counts = (self._plan_counts, self._stage_counts)
+    self._plan_counts = {}
+    self._stage_counts = [[0, 0, 0] for _ in range(STAGE_COUNT)]
+    return counts
+
+  cdef void AddPlanCounts(self, tuple counts):
+    """Adds counts returned by TakePlanCounts, for instance in another
+    process."""
+
+    plan_counts, stage_counts = counts
+    for plan, count in plan_counts.iteritems():
+      self._plan_counts[plan] = self._plan_counts.get(plan, 0) + count
+    cdef int stage
+    cdef int index
+    for stage in range(STAGE_COUNT):
+      for index in range(3):
+        self._stage_counts[stage][index] += stage_counts[stage][index]
+
+  cdef void LogPlans(self):
+    """Logs the most used test plans and the average cut sizes of each test.
+
+    Cut sizes are only logged if they were measured with metrics enabled.
+    """
+
+    LOGGER.info('Used %d test plans.', len(self._plan_counts))
+    for plan, count in sorted(self._plan_counts.iteritems(),
+                              key=lambda item: -item[1])[:PLANS_LOGGED]:
+      LOGGER.info('Test plan used %d times: %s.', count,
+                  ' -> '.join([_STAGE_NAMES[stage] for stage in plan]))
+    cdef list stage_counts
+    for stage, stage_counts in enumerate(self._stage_counts):
+      if stage_counts[1]:
+        LOGGER.info('%s test: %d runs, average cut size %.1f -> %.1f.',
+                    _STAGE_NAMES[stage].capitalize(), stage_counts[0],
+                    float(stage_counts[1]) / stage_counts[0],
+                    float(stage_counts[2]) / stage_counts[0])
+      elif stage_counts[0]:
+        # Cut sizes are not measured without metrics.
+        LOGGER.info('%s test: %d runs.', _STAGE_NAMES[stage].capitalize(),
+                    stage_counts[0])
+
+  cdef list FindTargetsInCut(self, Intent current_intent, object cut):
+    """Performs the tests that depend on the sending application.
+
+    Args:
+      current_intent: An implicit Intent.
+      cut: The bitmap of the Intent Filters returned by FindSharedCut.
+
+    Returns: The list of target Intent Filters, or None if there is none.
+    """
+
+    cdef bint measure = MetricsEnabled()
+    cdef long input_size = BitCount(cut) if measure else 0
+    cdef double start = StageStart()
+    cut = self.VisibilityTest(current_intent, cut)
+    cdef long cut_size = BitCount(cut) if measure and cut else 0
+    RecordStage(IMPLICIT_VISIBILITY, start, input_size, cut_size)
+    if not cut:
       return None
+    IF DEBUG:
+      LOGGER.debug("after visibility test %s", BitCount(cut))
 
+    cdef IntentFilter filt
     cdef list targets = []
-    for filt in intent_filters:
+    start = StageStart()
+    for filt in GetFiltersFromBitmap(cut):
       if self.ComponentPermissionTest(current_intent, filt):
         targets.append(filt)
+    RecordStage(IMPLICIT_COMPONENT_PERMISSION, start, cut_size, len(targets))
 
-    cdef int targets_size = len(targets)
+    if not targets:
+      return None
 
-    if targets_size == 0:
+    return targets
+
+  @cython.boundscheck(False)
+  cdef tuple FindImplicitLinksForIntent(
+      self, ComponentIntent component_intent, set intent_filters,
+      bint compute_link_attribute, bint precise_intent=True,
+      bint validate=False, dict shared_cuts=None):
+    cdef Intent current_intent = component_intent.intent
+    cdef list targets = self.FindImplicitTargetsForIntent(
+        component_intent, intent_filters, precise_intent, shared_cuts)
+    if targets is None:
       return None
 
+    cdef int targets_size = len(targets)
+    cdef IntentFilter filt
     cdef DTYPE_t current_link_attribute
     cdef np.ndarray[DTYPE_t, ndim=1] attributes
     cdef Py_ssize_t index = 0
 
     attribute_computation_time = 0
 
+    cdef double stage_start
     if compute_link_attribute:
       start = time.time()
+      stage_start = StageStart()
       attributes = np.empty(targets_size, dtype=DTYPE)
 
       for filt in targets:
@@ -149,24 +451,21 @@ cdef class ImplicitLinkFinder(object):
         attributes[index] = current_link_attribute
         index += 1
       attribute_computation_time = time.time() - start
+      if MetricsEnabled():
+        RecordStage(IMPLICIT_PROBABILITY, stage_start, targets_size,
+                    np.count_nonzero(attributes))
 
     return targets, attributes, attribute_computation_time
 
-  cdef set VisibilityTest(self, Intent current_intent, set initial_cut):
+  cdef object VisibilityTest(self, Intent current_intent, object initial_cut):
     """Performs a visibility test."""
 
     return (GetExportedFilters(initial_cut)
             | GetFiltersOfApp(current_intent.application_id, initial_cut))
 
-  cdef set DataTest(self, Intent current_intent, set initial_cut):
+  cdef object DataTest(self, Intent current_intent, object initial_cut):
     """Performs a data test."""
 
-    cdef set cut
-    cdef set filters_with_types
-    cdef set no_type_filters
-    cdef set mime_type_cut
-    cdef set no_data_cut
-    cdef wildcard_cut
     cdef unicode scheme
 
     if not current_intent.dtype:
@@ -207,15 +506,14 @@ cdef class ImplicitLinkFinder(object):
           else:
             cut = self.UriDataTest(current_intent, mime_type_cut)
         else:
-          cut = set()
+          cut = 0
 
     return cut
 
-  cdef set UriDataTest(self, Intent current_intent, set initial_cut):
+  cdef object UriDataTest(self, Intent current_intent, object initial_cut):
     """Performs a URI data test."""
 
     cdef unicode scheme = current_intent.scheme
-    cdef set result
     cdef unicode host
     cdef unicode port
     cdef unicode path
@@ -232,10 +530,10 @@ cdef class ImplicitLinkFinder(object):
         if path is not None and path != '(.*)':
           result = GetFiltersWithPath(path, result)
     else:
-      result = set()
+      result = 0
     return result
 
-  cdef set MimeTypeTest(self, Intent current_intent, set initial_cut):
+  cdef object MimeTypeTest(self, Intent current_intent, object initial_cut):
     """Performs a MIME type test.
 
     It is assumed that prerequisite checks have already been performed (the
@@ -258,13 +556,13 @@ cdef class ImplicitLinkFinder(object):
     else:
       return initial_cut
 
-  cdef set CategoryTest(self, Intent current_intent, set initial_cut):
+  cdef object CategoryTest(self, Intent current_intent, object initial_cut):
     """Performs a category test."""
 
     return (GetFiltersWithCategories(current_intent.categories, initial_cut)
             if current_intent.categories is not None else initial_cut)
 
-  cdef set ActionTest(self, Intent current_intent, set initial_cut):
+  cdef object ActionTest(self, Intent current_intent, object initial_cut):
     """Performs a action test."""
 
     if current_intent.action:
@@ -272,14 +570,14 @@ cdef class ImplicitLinkFinder(object):
     initial_cut = GetFiltersWithAnyAction(initial_cut)
     return initial_cut
 
-  cdef set IntentPermissionTest(self, current_intent, initial_cut):
+  cdef object IntentPermissionTest(self, current_intent, initial_cut):
     if current_intent.permission:
       return GetFiltersWithUsedPermission(current_intent.permission,
                                           initial_cut)
     else:
       return initial_cut
 
-  cdef set KindTest(self, Intent current_intent, initial_cut):
+  cdef object KindTest(self, Intent current_intent, initial_cut):
     """Performs a kind test."""
 
     return GetFiltersWithKind(current_intent.exit_kind, initial_cut)
@@ -291,9 +589,13 @@ cdef class ImplicitLinkFinder(object):
     except KeyError:
       intents = set()
       self._filter_to_intent_matches[intent_filter_descriptor] = intents
+    if intent in intents:
+      return
     intents.add(intent)
+    self._match_counts.pop(intent_filter_descriptor, None)
+    self._memo_filter_keys.pop(intent_filter_descriptor, None)
 
-  cdef set PackageTest(self, Intent current_intent, set initial_cut):
+  cdef object PackageTest(self, Intent current_intent, object initial_cut):
     if current_intent.dpackage is not None:
       if current_intent.dpackage != '(.*)':
         return GetFiltersOfApp(current_intent.dpackage, initial_cut)
@@ -312,8 +614,67 @@ cdef class ImplicitLinkFinder(object):
       return True
     return False
 
-  cdef set GetIntentMatchesForFilter(self, IntentFilter intent_filter):
-    return self._filter_to_intent_matches[intent_filter.short_descriptor]
+  cdef IntentColumns GetColumns(self):
+    """Returns the columns of the precise Intents.
+
+    Caches that depend on training data are cleared when it changes.
+    """
+
+    cdef IntentColumns columns = GetIntentColumns()
+    if columns is not self._columns:
+      if self._memo is not None and self._columns is not None:
+        LOGGER.warning('Training data changed, no longer using the '
+                       'probability memo.')
+        self._memo.Flush()
+        self._memo = None
+      self._columns = columns
+      self._match_counts.clear()
+      self._intent_cache.clear()
+    return columns
+
+  cdef bytes MemoKey(self, Intent intent, IntentFilter intent_filter):
+    """Returns the key of a link in the probability memo."""
+
+    cdef tuple descriptor = intent_filter.short_descriptor
+    cdef bytes filter_key = self._memo_filter_keys.get(descriptor)
+    if filter_key is None:
+      filter_key = probability_memo.FilterKey(
+          descriptor,
+          [match.descriptor for match
+           in self._filter_to_intent_matches.get(descriptor, ())])
+      self._memo_filter_keys[descriptor] = filter_key
+    return probability_memo.ProbabilityKey(intent.descriptor, filter_key)
+
+  cdef dict GetIntentMatchCounts(self, IntentFilter intent_filter,
+                                 tuple fields):
+    """Counts the precise Intents that match an Intent Filter by their codes
+    for a combination of fields.
+
+    Raises KeyError if no precise Intent matches the Intent Filter.
+
+    Args:
+      intent_filter: An Intent Filter.
+      fields: A tuple of fields of IMPLICIT_ATTRS.
+
+    Returns: A group-by table returned by IntentColumns.GroupCounts.
+    """
+
+    cdef IntentColumns columns = self.GetColumns()
+    cdef tuple descriptor = intent_filter.short_descriptor
+    cdef dict filter_counts = self._match_counts.get(descriptor)
+    if filter_counts is None:
+      filter_counts = {}
+      self._match_counts[descriptor] = filter_counts
+    try:
+      counts = filter_counts[fields]
+      CountCache(FILTER_MATCHES_CACHE, True)
+      return counts
+    except KeyError:
+      CountCache(FILTER_MATCHES_CACHE, False)
+      counts = columns.GroupCounts(
+          fields, columns.RowMask(self._filter_to_intent_matches[descriptor]))
+      filter_counts[fields] = counts
+      return counts
 
   @cython.cdivision(True)
   cdef DTYPE_t GetProbabilityForImplicitIntent(
@@ -327,7 +688,10 @@ cdef class ImplicitLinkFinder(object):
     cdef DTYPE_t cache_value = (-1 if validate else self._cache.get(key, -1))
 
     if cache_value >= 0:
+      CountCache(PROBABILITY_CACHE, True)
       return cache_value
+    if not validate:
+      CountCache(PROBABILITY_CACHE, False)
 
     if intent.IsPrecise():
       if intent_filter.IsPrecise():
@@ -340,15 +704,24 @@ cdef class ImplicitLinkFinder(object):
           self._cache[key] = 0
         return 0
 
-    cdef set intents
+    cdef bytes memo_key = None
+    if self._memo is not None and not validate:
+      memo_key = self.MemoKey(intent, intent_filter)
+      memo_value = self._memo.Get(memo_key)
+      if memo_value is not None:
+        CountCache(PROBABILITY_MEMO_CACHE, True)
+        self._cache[key] = memo_value
+        return memo_value
+      CountCache(PROBABILITY_MEMO_CACHE, False)
+
     cdef set imprecise_fields = intent.imprecise_fields
     cdef set precise_fields = IMPLICIT_ATTRS - imprecise_fields
-    cdef int matches
-    cdef int total
+    cdef long matches
+    cdef long total
     cdef DTYPE_t probability
     cdef dict precise_attributes_dict = {}
     cdef tuple precise_attributes
-    cdef set precise_intents = GetPreciseIntents()
+    cdef IntentColumns columns = self.GetColumns()
 
     if len(precise_fields) > 0:
       for field_type in precise_fields:
@@ -356,112 +729,89 @@ cdef class ImplicitLinkFinder(object):
 
       precise_attributes = tuple(sorted(precise_attributes_dict.items()))
       #TODO Handle imprecise fields.
-      intents = self.GetIntentsForPreciseFields(precise_attributes)
-
-      if intents is None:
+      total = self.CountIntentsWithPreciseFields(precise_attributes)
+      IF DEBUG:
+        print total
+      if total <= 0:
         LOGGER.warn('No training data for field combination for Intent %s.',
                     str(intent))
         if not validate:
           self._cache[key] = 0
+        if memo_key is not None:
+          self._memo.Put(memo_key, 0)
         return 0
-      else:
-        total = len(intents)
-        IF DEBUG:
-          print total
-        if total == 0:
-          LOGGER.warn('No training data for field combination for Intent %s.',
-                      str(intent))
-          if not validate:
-            self._cache[key] = 0
-          return 0
-        try:
-          intents = intents & self.GetIntentMatchesForFilter(intent_filter)
-          matches = len(intents)
-        except KeyError:
-          return 0
-
-        probability = <DTYPE_t> ((100.0 * matches) / total)
-        if not validate:
-          self._cache[key] = probability
-        return probability
+      try:
+        matches = columns.CountRows(
+            precise_attributes,
+            self.GetIntentMatchCounts(
+                intent_filter,
+                tuple([field for field, _ in precise_attributes])))
+      except KeyError:
+        if memo_key is not None:
+          self._memo.Put(memo_key, 0)
+        return 0
+
+      probability = <DTYPE_t> ((100.0 * matches) / total)
+      if not validate:
+        self._cache[key] = probability
+      if memo_key is not None:
+        self._memo.Put(memo_key, probability)
+      return probability
     else:
       LOGGER.warn('No precise field.')
-      total = len(precise_intents)
-      matches = self.GetMatchingIntents(intent_filter, precise_intents,
-                                        imprecise_fields)
+      total = columns.size
+      matches = self.GetMatchingIntents(
+          intent_filter, np.ones(columns.size, dtype=np.bool_),
+          imprecise_fields)
       probability = <DTYPE_t> ((100.0 * matches) / total)
       if not validate:
         self._cache[key] = probability
+      if memo_key is not None:
+        self._memo.Put(memo_key, probability)
       return probability
 
-  cdef set GetIntentsForPreciseFields(self, tuple precise_attributes):
-    """Finds Intents that have a set of precise fields.
+  cdef long CountIntentsWithPreciseFields(self, tuple precise_attributes):
+    """Counts the precise Intents that have a set of precise fields.
 
     Args:
-      precise_attributes: A mapping of precise fields to their values.
-    Returns:
-      The set of all Intents that have the same precise fields if any, None if
-      no Intent has the same field values.
+      precise_attributes: A tuple of pairs of precise fields and their values,
+      sorted by field.
+
+    Returns: The number of precise Intents that have the field values, or -1 if
+    no precise Intent has one of the values.
     """
 
+    cdef IntentColumns columns = self.GetColumns()
     try:
-      return self._intent_cache[precise_attributes]
+      total = self._intent_cache[precise_attributes]
+      CountCache(INTENT_FIELDS_CACHE, True)
+      return total
     except KeyError:
-      pass
-
-    cdef set intents
-    cdef str field_type
-    cdef dict attribute_maps = GetAttributeMaps()
+      CountCache(INTENT_FIELDS_CACHE, False)
 
-    sets = []
-    for field_type, field_value in precise_attributes:
-      try:
-        intents = attribute_maps[field_type][field_value]
-      except KeyError:
-        self._intent_cache[precise_attributes] = None
-        return None
-      sets.append(intents)
-
-    cdef int index = 0
-    cdef int min_size = len(sets[0])
-    for i in range(len(sets)):
-      candidate_set = sets[i]
-      if len(candidate_set) < min_size:
-        index = i
-        min_size = len(candidate_set)
-
-    intents = sets[index]
-    min_set = intents
-    for candidate_set in sets:
-      if candidate_set is not min_set:
-        intents = intents & candidate_set
-
-    self._intent_cache[precise_attributes] = intents
+    total = columns.CountRows(
+        precise_attributes,
+        columns.GroupCounts(tuple([field for field, _ in precise_attributes])))
+    self._intent_cache[precise_attributes] = total
+    return total
 
-    return intents
+  cdef long GetMatchingIntents(self, IntentFilter intent_filter, object intents,
+                               imprecise_fields):
+    """Counts the Intents from a row mask that match an Intent Filter on
+    imprecise fields."""
 
-  cdef int GetMatchingIntents(self, IntentFilter intent_filter, intents,
-                              imprecise_fields):
+    cdef IntentColumns columns = self.GetColumns()
     data_test = True
-    attribute_maps = GetAttributeMaps()
-    empty = set()
 
     for field_type in imprecise_fields:
-      if not intents:
+      if not intents.any():
         return 0
       if field_type == 'action':
-        action_matches = attribute_maps[field_type].get(None, empty)
-
-        for action in intent_filter.actions:
-          action_matches = (action_matches
-                            | attribute_maps[field_type].get(action, empty))
-
-        intents = intents & action_matches
+        intents = intents & columns.ValueMask(
+            field_type, [None] + list(intent_filter.actions or ()))
       elif field_type == 'categories':
-        category_matches = set()
-        for categories in Powerset(intent_filter.categories):
-          category_matches |= attribute_maps[field_type].get(categories, empty)
-        intents = intents & category_matches
+        intents = intents & columns.CategorySubsetMask(
+            intent_filter.categories or frozenset())
       elif (data_test and (field_type == 'dtype' or
                            field_type == 'scheme' or
                            field_type == 'host' or
@@ -471,12 +821,12 @@ cdef class ImplicitLinkFinder(object):
         filter_types = intent_filter.types
         if not filter_types:
           # A Filter with no type can only match Intents with no type.
-          intents = intents & attribute_maps['dtype'].get(None, empty)
+          intents = intents & columns.ValueMask('dtype', [None])
 
           if not intent_filter.HasData():
             # A Filter with no data and no type can only match Intents with no
             # data and no type.
-            intents = intents & attribute_maps['scheme'].get(None, empty)
+            intents = intents & columns.ValueMask('scheme', [None])
 
           else:
             # A Filter with data but no type can only match Intents with
@@ -484,7 +834,8 @@ cdef class ImplicitLinkFinder(object):
             intents = self.ReverseUriDataTest(intent_filter, intents)
 
         else:
-          type_matches = set()
+          mime_types = []
+          base_types = []
           for filter_type in filter_types:
             type_parts = filter_type.split('/', 1)
             base_type = '*'
@@ -494,67 +845,69 @@ cdef class ImplicitLinkFinder(object):
               subtype = type_parts[1]
             if base_type != '*':
               if subtype != '*':
-                type_matches |= attribute_maps['dtype'].get(filter_type,
-                                                                 empty)
-                type_matches |= attribute_maps['dtype'].get(base_type + '/*',
-                                                                 empty)
-                type_matches |= attribute_maps['dtype'].get('*/*', empty)
+                mime_types += [filter_type, base_type + '/*', '*/*']
               else:
-                type_matches |= attribute_maps[BASE_TYPE].get(base_type, empty)
-                type_matches |= attribute_maps[BASE_TYPE].get('*', empty)
-          intents = intents & type_matches
+                base_types += [base_type, '*']
+          intents = intents & (columns.ValueMask('dtype', mime_types) |
+                               columns.ValueMask(BASE_TYPE, base_types))
 
           if not intent_filter.HasData():
             # An Intent Filter that has a MIME type but no data matches Intents
             # with compatible MIME type and either no data, or content: or file:
             # data.
-            scheme_to_intents = attribute_maps['scheme']
-            intents = intents & (scheme_to_intents.get(None, empty) |
-                                 scheme_to_intents.get('content', empty) |
-                                 scheme_to_intents.get('file', empty))
+            intents = intents & columns.ValueMask(
+                'scheme', [None, 'content', 'file'])
           else:
             # An Intent Filter with both a MIME type and data matches Intents
             # with compatible MIME type and data.
             intents = self.ReverseUriDataTest(intent_filter, intents)
 
-    return len(intents)
+    return np.count_nonzero(intents)
 
-  cdef set ReverseUriDataTest(self, IntentFilter intent_filter, set intents):
-    attribute_maps = GetAttributeMaps()
+  cdef object ReverseUriDataTest(self, IntentFilter intent_filter,
+                                 object intents):
+    cdef IntentColumns columns = self.GetColumns()
     schemes = intent_filter.schemes
-    empty = set()
 
     if schemes:
-      scheme_matches = set()
-      for scheme in schemes:
-        scheme_matches |= attribute_maps['scheme'].get(scheme, empty)
-      intents = intents & scheme_matches
+      intents = intents & columns.ValueMask('scheme', schemes)
       hosts = intent_filter.hosts
       if hosts:
-        host_matches = set()
-        for host in hosts:
-          host_matches |= attribute_maps['host'].get(host, empty)
-        intents = intents & host_matches
+        intents = intents & columns.ValueMask('host', hosts)
         ports = intent_filter.ports
         if ports:
-          port_matches = set()
-          for port in ports:
-            port_matches |= attribute_maps['port'].get(port, empty)
-          intents = intents & port_matches
+          intents = intents & columns.ValueMask('port', ports)
         paths = intent_filter.paths
         if paths:
-          path_matches = set()
-          for path in paths:
-            path_matches |= attribute_maps['path'].get(path, empty)
-          intents = intents & path_matches
+          intents = intents & columns.ValueMask('path', paths)
     else:
-      intents = empty
+      intents = np.zeros(columns.size, dtype=np.bool_)
 
     return intents
 
+  def GetState(self):
+    """Returns the precise Intent matches, for saving link state."""
+
+    return self._filter_to_intent_matches
+
+  def SetState(self, dict state):
+    """Restores precise Intent matches saved with GetState."""
+
+    self._filter_to_intent_matches = state
+    self._match_counts.clear()
+    self._intent_cache.clear()
+    self._cache.clear()
+    self._memo_filter_keys.clear()
+
   def Reset(self):
     """Resets global Intent state."""
 
+    self._plan_counts.clear()
+    self._stage_counts = [[0, 0, 0] for _ in range(STAGE_COUNT)]
     self._filter_to_intent_matches.clear()
+    self._match_counts.clear()
     self._intent_cache.clear()
     self._cache.clear()
+    self._memo_filter_keys.clear()
+    self._search_space = None
+    self._search_space_bitmap = 0
@@ -26,27 +26,69 @@ import gflags
 
 from primo.linking.find_explicit_links cimport ExplicitLinkFinder
 from primo.linking.find_implicit_links cimport ImplicitLinkFinder
+from primo.linking.incremental cimport UpdateCorpus
+from primo.linking.incremental cimport UpdateLinks
+from primo.linking.sharded_links cimport FindLinksWithWorkers
 from primo.linking.target_data cimport PrepareForQueries
 from primo.linking.intent_data cimport GetImpreciseComponentIntents
 from primo.linking.intent_data cimport GetPreciseComponentIntents
+from primo.linking.intent_data cimport GetPreciseIntents
 from primo.linking.intents cimport ComponentIntent
 from primo.linking.intents cimport Intent
+from primo.linking.link_table cimport LinkTable
 from primo.linking.validation cimport PerformValidation
+from primo.linking.write_results cimport LinkWriter
 
+from primo.linking import attribute_matching
 from primo.linking import fetch_data
 from primo.linking import intents as intents_mod
+from primo.linking import interning
+from primo.linking import link_store
+from primo.linking import metrics
+from primo.linking import probability_memo
+from primo.linking import snapshot
 from primo.linking import write_results
 
 
 FLAGS = gflags.FLAGS
 gflags.DEFINE_boolean('computeattributes', True, 'Compute attributes.')
+gflags.DEFINE_boolean('group_intents', True,
+                      'Resolve equal Intents from the same application once.')
+gflags.DEFINE_boolean('plan_tests', True,
+                      ('Order Intent Filter tests by estimated selectivity '
+                       'for each Intent.'))
+gflags.DEFINE_boolean('stream_links', False,
+                      ('Write links to --dumpintentlinks as they are found '
+                       'instead of keeping them in memory.'))
+gflags.DEFINE_enum('link_format', write_results.BLOSCPACK,
+                   write_results.LINK_FORMATS,
+                   ('Format of --dumpintentlinks: a compressed file or a '
+                    'directory of memory-mappable columns.'))
+gflags.DEFINE_boolean('index_links', False,
+                      ('Save the indexes used by link_store queries with '
+                       '--dumpintentlinks.'))
+gflags.DEFINE_string('metrics_out', None,
+                     ('Write the call counts, times and cut sizes of link '
+                      'resolution stages and cache hit rates to a JSON file, '
+                      'or to a CSV file if the path ends with .csv.'))
+gflags.DEFINE_string('probability_memo', None,
+                     ('An SQLite file where implicit link probabilities are '
+                      'kept across runs. It is cleared when the precise '
+                      'Intents used as training data change.'))
+gflags.DEFINE_boolean('resolve_all', False,
+                      ('In incremental mode, resolve all Intents again so '
+                       'that link probabilities reflect the updated training '
+                       'data.'))
 
 
 LOGGER = logging.getLogger(__name__)
 
 
 def FindLinksAndLogExceptions(protobufs, protodirs=None, skip_empty=False,
-                              stats=None, dump_results=None, validate=None):
+                              stats=None, dump_results=None, validate=None,
+                              ingest_workers=None, snapshot_in=None,
+                              snapshot_out=None, incremental=False,
+                              remove_apps=None, workers=None):
   """Wrapper that catches and logs exceptions for the Intent matching procedure.
 
   Args:
@@ -58,6 +100,16 @@ def FindLinksAndLogExceptions(protobufs, protodirs=None, skip_empty=False,
     dump_results: If not None, indicates the path of a file where links should
     be dumped in a compressed binary format.
     validate: Indicates whether cross-validation should be performed.
+    ingest_workers: The number of worker processes used for loading protobufs.
+    snapshot_in: If not None, the path of a corpus snapshot to load instead of
+    protobufs.
+    snapshot_out: If not None, the path where a corpus snapshot should be
+    written.
+    incremental: If True, the links stored in snapshot_in are updated with the
+    applications from the protobufs, instead of being computed from scratch.
+    remove_apps: A list of names of applications to remove from the corpus in
+    incremental mode.
+    workers: The number of worker processes used for computing links.
 
   Returns: A tuple with the Intent links, the components, the Intent Filters,
   the applications and the Intents.
@@ -65,7 +117,8 @@ def FindLinksAndLogExceptions(protobufs, protodirs=None, skip_empty=False,
 
   try:
     return FindLinks(protobufs, protodirs, skip_empty, stats, dump_results,
-                     validate)
+                     validate, ingest_workers, snapshot_in, snapshot_out,
+                     incremental, remove_apps, workers)
   except:
     etype, msg, tb = sys.exc_info()
     LOGGER.error('Caught exception %s: %s\n%s', etype, msg,
@@ -73,7 +126,9 @@ def FindLinksAndLogExceptions(protobufs, protodirs=None, skip_empty=False,
 
 
 def FindLinks(protobufs, protodirs=None, skip_empty=False, stats=None,
-              dump_results=None, validate=None):
+              dump_results=None, validate=None, ingest_workers=None,
+              snapshot_in=None, snapshot_out=None, incremental=False,
+              remove_apps=None, workers=None):
   """Computes the links between Intents and Intent Filters.
 
   Args:
@@ -83,8 +138,20 @@ def FindLinks(protobufs, protodirs=None, skip_empty=False, stats=None,
     stats: If not None, gives the path of a file where statistics should be
     stored.
     dump_results: If not None, indicates the path of a file where links should
-    be dumped in a compressed binary format.
+    be dumped in the format given by --link_format. With --stream_links,
+    links are written as they are found and the returned Intent links are
+    empty.
     validate: Indicates whether cross-validation is being performed.
+    ingest_workers: The number of worker processes used for loading protobufs.
+    snapshot_in: If not None, the path of a corpus snapshot to load instead of
+    protobufs.
+    snapshot_out: If not None, the path where a corpus snapshot should be
+    written.
+    incremental: If True, the links stored in snapshot_in are updated with the
+    applications from the protobufs, instead of being computed from scratch.
+    remove_apps: A list of names of applications to remove from the corpus in
+    incremental mode.
+    workers: The number of worker processes used for computing links.
 
   Returns: A tuple with the Intent links, the components, the Intent Filters,
   the applications and the Intents.
@@ -96,11 +163,38 @@ def FindLinks(protobufs, protodirs=None, skip_empty=False, stats=None,
 
   if stats is not None:
     statistics = []
-  cdef dict intent_links = {}
-
-  applications, components, intents, intent_filters = fetch_data.FetchData(
-      protobufs, protodirs, validate)
+  cdef LinkTable intent_links = LinkTable()
+  implicit_link_finder.SetPlanTests(FLAGS.plan_tests)
+
+  link_state = None
+  if incremental and (not snapshot_in or validate):
+    raise ValueError('Incremental updates require a snapshot and cannot be '
+                     'used with validation.')
+  cdef bint stream_links = FLAGS.stream_links and dump_results and not validate
+  if stream_links and (incremental or snapshot_out):
+    raise ValueError('Streamed links are not kept for incremental updates or '
+                     'snapshots.')
+  if snapshot_in:
+    applications, components, intents, intent_filters, link_state = \
+        snapshot.ReadSnapshot(snapshot_in, validate)
+  else:
+    applications, components, intents, intent_filters = fetch_data.FetchData(
+        protobufs, protodirs, validate, ingest_workers)
+  if incremental:
+    if link_state is None:
+      raise ValueError('Snapshot %s does not contain links.' % snapshot_in)
+    intent_links, implicit_link_state = link_state
+    implicit_link_finder.SetState(implicit_link_state)
+    added_applications, removed_intents, removed_targets = UpdateCorpus(
+        applications, components, intents, intent_filters, protobufs,
+        protodirs or [], remove_apps or [], False, ingest_workers or 1)
+  metrics.MarkPhase('ingestion')
+  LOGGER.info('Interned %d distinct field values.', interning.GetPoolSize())
+  if snapshot_out and validate:
+    snapshot.WriteSnapshot(snapshot_out, applications, components, intents,
+                           intent_filters, validate)
   PrepareForQueries(applications)
+  metrics.MarkPhase('index_building')
 
   if stats is not None:
     statistics.append(len(applications))
@@ -108,16 +202,57 @@ def FindLinks(protobufs, protodirs=None, skip_empty=False, stats=None,
   cdef float start = time.time()
 
   if validate:
-    PerformValidation(intents, skip_empty, components, intent_filters, validate)
+    PerformValidation(intents, skip_empty, components, intent_filters, validate,
+                      workers or 1)
     return intent_links, components, intent_filters, applications, intents
 
-  intent_links, link_count, skipped_empty, intent_count, explicit, \
-      attribute_time, explicit_link_finder = FindLinksForIntents(
-          GetPreciseComponentIntents(), GetImpreciseComponentIntents(),
-          skip_empty, components, intent_filters, FLAGS.computeattributes,
-          False)
+  if FLAGS.metrics_out:
+    metrics.Reset()
+    metrics.Enable()
+  cdef LinkWriter link_writer = None
+  if stream_links and FLAGS.link_format == write_results.COLUMNS:
+    link_writer = write_results.ColumnLinkWriter(dump_results)
+  elif stream_links:
+    link_writer = write_results.LinkWriter(dump_results)
+  memo = None
+  if FLAGS.probability_memo and FLAGS.computeattributes:
+    memo = probability_memo.ProbabilityMemo(
+        FLAGS.probability_memo, probability_memo.TrainingFingerprint(
+            [intent.descriptor for intent in GetPreciseIntents()]))
+    implicit_link_finder.SetMemo(memo)
+
+  if incremental:
+    intent_links, link_count, skipped_empty, intent_count, explicit, \
+        attribute_time, explicit_link_finder = UpdateLinks(
+            intent_links, added_applications, removed_intents,
+            removed_targets, skip_empty, components, intent_filters,
+            FLAGS.computeattributes, implicit_link_finder, workers or 1,
+            FLAGS.resolve_all)
+  else:
+    intent_links, link_count, skipped_empty, intent_count, explicit, \
+        attribute_time, explicit_link_finder = FindLinksForIntents(
+            GetPreciseComponentIntents(), GetImpreciseComponentIntents(),
+            skip_empty, components, intent_filters, FLAGS.computeattributes,
+            False, None, implicit_link_finder, FLAGS.group_intents,
+            workers or 1, link_writer)
 
   LOGGER.info('Done processing all Intents.')
+  if memo is not None:
+    implicit_link_finder.SetMemo(None)
+    memo.Close()
+  metrics.MarkPhase('resolution')
+  implicit_link_finder.LogPlans()
+  pattern_cache_counts = attribute_matching.GetPatternCacheCounts()
+  LOGGER.info('Pattern cache hits: %d, misses: %d.', *pattern_cache_counts)
+  if FLAGS.metrics_out:
+    metrics.Enable(False)
+    metrics.WriteReport(FLAGS.metrics_out)
+    LOGGER.info('Wrote link resolution metrics to %s.', FLAGS.metrics_out)
+
+  if snapshot_out:
+    snapshot.WriteSnapshot(snapshot_out, applications, components, intents,
+                           intent_filters, validate,
+                           (intent_links, implicit_link_finder.GetState()))
 
   cdef float end
   cdef float duration
@@ -144,21 +279,40 @@ def FindLinks(protobufs, protodirs=None, skip_empty=False, stats=None,
     statistics.append(explicit_link_finder.GetIntraAppProbability())
     statistics.append(skipped_empty)
     statistics.append(attribute_time)
+    statistics.extend(pattern_cache_counts)
 
     with open(stats, 'a') as stats_file:
       stats_file.write(','.join([str(element) for element in statistics])
                        + '\n')
 
-  if dump_results:
-    write_results.WriteResults(intent_links, link_count, dump_results)
+  if link_writer is not None:
+    LOGGER.info('Wrote %d links.', link_writer.Close())
+  elif dump_results:
+    write_results.WriteResults(intent_links, dump_results, FLAGS.link_format)
+  if dump_results and FLAGS.index_links:
+    link_store.WriteIndex(dump_results, intents, components, intent_filters)
+  metrics.MarkPhase('output')
   return intent_links, components, intent_filters, applications, intents
 
 
 def FindLinksForIntents(precise_intents, imprecise_intents, skip_empty,
                         components, intent_filters, include_attributes,
-                        validation=False):
+                        validation=False,
+                        ExplicitLinkFinder explicit_link_finder=None,
+                        ImplicitLinkFinder implicit_link_finder=None,
+                        group_intents=True, workers=1,
+                        LinkWriter link_writer=None):
   """Computes the links between Intents and Intent Filters.
 
+  Equal Intents have the same descriptor. When Intents are grouped, the links of
+  equal Intents sent from the same application are only computed once, and the
+  tests that do not depend on the sending application are only performed once
+  for all equal Intents. Intents are not grouped during cross-validation, since
+  validation Intents are modified without updating their descriptors.
+
+  With several workers, shards of Intents are resolved by forked processes.
+  This is not done during cross-validation.
+
   Args:
     precise_intents: A list of precise Intents.
     imprecise_intents: A list of imprecise Intents.
@@ -167,20 +321,38 @@ def FindLinksForIntents(precise_intents, imprecise_intents, skip_empty,
     intent_filters: The set of potential target Intent Filters.
     include_attributes: If True, link probabilities will be computed.
     validation: Indicates whether cross-validation is being performed.
+    explicit_link_finder: If not None, the ExplicitLinkFinder to be used.
+    implicit_link_finder: If not None, the ImplicitLinkFinder to be used.
+    group_intents: Indicates whether equal Intents should be resolved once.
+    workers: The number of worker processes.
+    link_writer: If not None, a LinkWriter to which links are written instead
+    of being added to the returned Intent links.
 
   Returns: A tuple with the Intent links, the components, the Intent Filters,
   the applications and the Intents.
   """
 
-  cdef ExplicitLinkFinder explicit_link_finder = ExplicitLinkFinder()
-  cdef ImplicitLinkFinder implicit_link_finder = ImplicitLinkFinder()
+  if explicit_link_finder is None:
+    explicit_link_finder = ExplicitLinkFinder()
+  if implicit_link_finder is None:
+    implicit_link_finder = ImplicitLinkFinder()
+  if workers > 1 and not validation:
+    return FindLinksWithWorkers(
+        list(precise_intents), list(imprecise_intents), skip_empty, components,
+        intent_filters, include_attributes, workers, explicit_link_finder,
+        implicit_link_finder, group_intents, link_writer)
   cdef int intent_count = 0
   cdef int skipped_empty = 0
   cdef int explicit_intent_count = 0
-  cdef dict intent_links = {}
+  cdef LinkTable intent_links = LinkTable()
   cdef long link_count = 0
   cdef float total_attribute_time = 0.0
   cdef ComponentIntent component_intent
+  cdef dict resolved = None
+  cdef dict shared_cuts = None
+  if group_intents and not validation:
+    resolved = {}
+    shared_cuts = {}
   LOGGER.info('Started processing precise Intents.')
   for component_intent in precise_intents:
     if skip_empty and component_intent.IsEmpty():
@@ -189,13 +361,13 @@ def FindLinksForIntents(precise_intents, imprecise_intents, skip_empty,
     links, explicit_count, attribute_time = FindLinksForIntent(
         component_intent, intent_links, components, intent_filters,
         True, include_attributes, explicit_link_finder, implicit_link_finder,
-        validation)
+        validation, resolved, shared_cuts, link_writer)
     link_count += links
     explicit_intent_count += explicit_count
     intent_count += 1
     total_attribute_time += attribute_time
   if validation:
-    intent_links = {}
+    intent_links = LinkTable()
 
   LOGGER.info('Done processing precise Intents.')
   LOGGER.info('Started processing imprecise Intents.')
@@ -206,27 +378,31 @@ def FindLinksForIntents(precise_intents, imprecise_intents, skip_empty,
     links, explicit_count, attribute_time = FindLinksForIntent(
         component_intent, intent_links, components, intent_filters,
         False, include_attributes, explicit_link_finder, implicit_link_finder,
-        validation)
+        validation, resolved, shared_cuts, link_writer)
     link_count += links
     explicit_intent_count += explicit_count
     intent_count += 1
     total_attribute_time += attribute_time
   LOGGER.info('Done processing imprecise Intents.')
+  if resolved is not None:
+    LOGGER.info('Resolved %d groups of equal Intents for %d Intents.',
+                len(resolved), intent_count)
 
   return (intent_links, link_count, skipped_empty, intent_count,
           explicit_intent_count, total_attribute_time, explicit_link_finder)
 
 
 cdef tuple FindLinksForIntent(
-    ComponentIntent component_intent, dict intent_links, set components,
+    ComponentIntent component_intent, LinkTable intent_links, set components,
     set intent_filters, bint precise_intent, bint include_attributes,
     ExplicitLinkFinder explicit_link_finder,
-    ImplicitLinkFinder implicit_link_finder, bint validate=False):
+    ImplicitLinkFinder implicit_link_finder, bint validate=False,
+    dict resolved=None, dict shared_cuts=None, LinkWriter link_writer=None):
   """Computes all the potential targets for a given Intent.
 
   Args:
     component_intent: The Intent for which potential targets should be computed.
-    intent_links: The map of Intent links to which the results should be added.
+    intent_links: The LinkTable to which the links should be added.
     components: The potential target components.
     intent_filters: The potential target Intent Filters.
     precise_intent: Indicates if the argument Intent is precise.
@@ -234,6 +410,12 @@ cdef tuple FindLinksForIntent(
     explicit_link_finder: An ExplicitLinkFinder object.
     implicit_link_finder: An ImplicitLinkFinder object.
     validate: Indicates whether cross-validation is being performed.
+    resolved: If not None, a cache of the targets and link probabilities of
+    equal Intents sent from the same application.
+    shared_cuts: If not None, a cache of the results of the tests that do not
+    depend on the sending application for equal Intents.
+    link_writer: If not None, a LinkWriter to which links are written instead
+    of being added to intent_links.
 
   Returns: A tuple with the number of computed links, the number of explicit
   Intents (0 or 1) and the time taken for computing the link probabilities.
@@ -245,26 +427,46 @@ cdef tuple FindLinksForIntent(
   LOGGER.info(component_intent)
 
   cdef float attribute_time
+  cdef tuple key = None
+  cdef bint reused = False
+
+  if resolved is not None:
+    key = (intent, intent.application_id)
+    if key in resolved:
+      targets_and_attributes = resolved[key]
+      reused = True
 
   if intent.dclass is not None:
-    targets_and_attributes = explicit_link_finder.FindExplicitLinksForIntent(
-        intent, components, True, validate)
+    if reused:
+      if targets_and_attributes and intent.IsPrecise():
+        explicit_link_finder.CountPreciseLink(intent,
+                                              targets_and_attributes[0][-1])
+    else:
+      targets_and_attributes = explicit_link_finder.FindExplicitLinksForIntent(
+          intent, components, True, validate, shared_cuts)
     explicit_intent_count = 1
   else:
-    targets_and_attributes = implicit_link_finder.FindImplicitLinksForIntent(
-        component_intent, intent_filters, True, precise_intent, validate)
+    if not reused:
+      targets_and_attributes = implicit_link_finder.FindImplicitLinksForIntent(
+          component_intent, intent_filters, True, precise_intent, validate,
+          shared_cuts)
     explicit_intent_count = 0
+  if key is not None and not reused:
+    resolved[key] = targets_and_attributes
   cdef long links = 0
   if targets_and_attributes:
-    attribute_time = targets_and_attributes[2]
+    # The probabilities of reused links were already timed.
+    attribute_time = 0.0 if reused else targets_and_attributes[2]
     targets = targets_and_attributes[0]
     links += len(targets)
 
-    if include_attributes:
-      intent_links[component_intent] = (targets,
-                                        targets_and_attributes[1])
+    if link_writer is not None:
+      link_writer.WriteLinks(component_intent, targets,
+                             targets_and_attributes[1])
     else:
-      intent_links[component_intent] = targets
+      intent_links.Append(component_intent, targets,
+                          targets_and_attributes[1] if include_attributes
+                          else None)
   else:
     attribute_time = 0.0
 
@@ -0,0 +1,251 @@
+# Copyright (C) 2015 The Pennsylvania State University and the University of Wisconsin
+# Systems and Internet Infrastructure Security Laboratory
+#
+# Author: Damien Octeau
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Incremental updates of the links of a previous run.
+
+A corpus and its links are loaded from a snapshot. Applications are then
+removed and added, and only the Intents whose targets can change are resolved
+again.
+"""
+
+from primo.linking.applications cimport Application
+from primo.linking.components cimport Component
+from primo.linking.find_explicit_links cimport ExplicitLinkFinder
+from primo.linking.find_implicit_links cimport ImplicitLinkFinder
+from primo.linking.intent_data cimport GetImpreciseComponentIntents
+from primo.linking.intent_data cimport GetPreciseComponentIntents
+from primo.linking.intent_data cimport RemoveComponentIntents
+from primo.linking.intents cimport ComponentIntent
+from primo.linking.intents cimport Intent
+from primo.linking.intents cimport RemoveFromCounters
+from primo.linking.link_table cimport LinkTable
+from primo.linking.target_data cimport RemoveComponent
+
+import logging
+
+import numpy as np
+
+from primo.linking import fetch_data
+from primo.linking import link_table
+import primo.linking.find_links
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+cdef tuple UpdateCorpus(set applications, set components, list intents,
+                        set intent_filters, list protobufs, list protodirs,
+                        list remove_apps, bint validate, int ingest_workers):
+  """Removes and adds applications to a corpus loaded from a snapshot.
+
+  An application from the protobufs replaces any application with the same
+  name. This should be called before PrepareForQueries.
+
+  Args:
+    applications: The set of applications.
+    components: The set of components.
+    intents: The list of Intents.
+    intent_filters: The set of Intent Filters.
+    protobufs: A list of paths to protobufs of added applications.
+    protodirs: A list of paths to directories that contain protobufs of added
+    applications.
+    remove_apps: A list of names of applications to be removed.
+    validate: True if validation is being performed.
+    ingest_workers: The number of worker processes used for loading protobufs.
+
+  Returns: A tuple with the set of added applications, the set of removed
+  ComponentIntents and the set of removed components and Intent Filters.
+  """
+
+  cdef list new_applications = list(
+      fetch_data.LoadApplications(protobufs, protodirs, ingest_workers))
+  cdef set removed_names = set(remove_apps) if remove_apps else set()
+  for application_pb in new_applications:
+    removed_names.add(application_pb.name)
+
+  cdef set removed_intents = set()
+  cdef set removed_targets = set()
+  cdef Application application
+  cdef Component component
+  cdef int removed_count = 0
+  for application in [app for app in applications
+                      if app.name in removed_names]:
+    LOGGER.info('Removing application %s.', application.name)
+    removed_count += 1
+    applications.remove(application)
+    fetch_data.exit_point_count -= application.exit_point_count
+    fetch_data.intent_count -= application.intent_count
+    fetch_data.intent_filter_count -= application.intent_filter_count
+    for component in application.components:
+      RemoveComponent(component)
+      components.discard(component)
+      removed_targets.add(component)
+      for intent_filter in component.filters:
+        intent_filters.discard(intent_filter)
+        removed_targets.add(intent_filter)
+      # Provider Intents are not in the application Intents, but they are in
+      # the Intent data.
+      removed_intents.update(component.intents)
+
+  cdef ComponentIntent component_intent
+  for component_intent in removed_intents:
+    RemoveFromCounters(component_intent.intent)
+  RemoveComponentIntents(removed_intents)
+  intents[:] = [component_intent for component_intent in intents
+                if component_intent not in removed_intents]
+
+  cdef set added_applications = set()
+  for application_pb in new_applications:
+    fetch_data.AddApplication(application_pb, added_applications, components,
+                              intents, intent_filters, validate)
+  applications.update(added_applications)
+
+  LOGGER.info('Removed %d and added %d applications.', removed_count,
+              len(added_applications))
+  return added_applications, removed_intents, removed_targets
+
+
+cdef tuple UpdateLinks(LinkTable intent_links, set added_applications,
+                       set removed_intents, set removed_targets,
+                       bint skip_empty, set components, set intent_filters,
+                       bint include_attributes,
+                       ImplicitLinkFinder implicit_link_finder,
+                       int workers=1, bint resolve_all=False):
+  """Updates the links of a previous run after UpdateCorpus.
+
+  Links of removed Intents and links to removed targets are dropped. The
+  Intents of added applications are resolved, as well as the existing Intents
+  that can target a component or an Intent Filter of an added application.
+  The links of other Intents are kept as is: their probabilities do not
+  reflect the changes in training data, unless all Intents are resolved again.
+
+  This should be called after PrepareForQueries.
+
+  Args:
+    intent_links: The Intent links of the previous run. This is modified.
+    added_applications: The set of added applications.
+    removed_intents: The set of removed ComponentIntents.
+    removed_targets: The set of removed components and Intent Filters.
+    skip_empty: Indicates whether empty Intents should be skipped.
+    components: The set of potential target components.
+    intent_filters: The set of potential target Intent Filters.
+    include_attributes: If True, link probabilities will be computed.
+    implicit_link_finder: An ImplicitLinkFinder with the precise Intent
+    matches of the previous run.
+    workers: The number of worker processes used for resolving Intents.
+    resolve_all: If True, all Intents are resolved again, so that link
+    probabilities are the same as those of a full run.
+
+  Returns: A tuple with the same structure as the result of
+  FindLinksForIntents, where counts are for the Intents that were resolved.
+  """
+
+  cdef ComponentIntent component_intent
+  intent_links = intent_links.RemoveIntents(
+      [component_intent.id for component_intent in removed_intents])
+  if removed_targets:
+    intent_links = intent_links.Select(~np.in1d(
+        intent_links.TargetKeys(),
+        [link_table.TargetKey(target) for target in removed_targets]))
+
+  cdef set new_components = set()
+  cdef set new_filters = set()
+  cdef set new_intents = set()
+  cdef Application application
+  cdef Component component
+  for application in added_applications:
+    for component in application.components:
+      new_components.add(component)
+      new_filters.update(component.filters)
+      new_intents.update(component.intents)
+
+  # Precise Intents are all probed first, since this records their matches
+  # with new Intent Filters.
+  cdef ExplicitLinkFinder explicit_link_finder = ExplicitLinkFinder()
+  cdef list precise = []
+  cdef list imprecise = []
+  cdef Intent intent
+  cdef long row
+  cdef dict components_by_id = None
+  if resolve_all:
+    precise.extend(GetPreciseComponentIntents())
+    imprecise.extend(GetImpreciseComponentIntents())
+  else:
+    offsets = intent_links.Offsets()
+    targets = intent_links.Targets()
+    for component_intent in GetPreciseComponentIntents():
+      if (component_intent in new_intents
+          or _CanTargetAny(component_intent, True, new_components,
+                           new_filters, explicit_link_finder,
+                           implicit_link_finder)):
+        precise.append(component_intent)
+      else:
+        intent = component_intent.intent
+        if not intent.IsExplicit():
+          continue
+        row = intent_links.IntentRow(component_intent.id)
+        if row >= 0:
+          # Keep the explicit link counts that were used by the previous run.
+          if components_by_id is None:
+            components_by_id = dict([(component.id, component)
+                                     for component in components])
+          explicit_link_finder.CountPreciseLink(
+              intent, components_by_id[targets[offsets[row + 1] - 1]])
+    for component_intent in GetImpreciseComponentIntents():
+      if (component_intent in new_intents
+          or _CanTargetAny(component_intent, False, new_components,
+                           new_filters, explicit_link_finder,
+                           implicit_link_finder)):
+        imprecise.append(component_intent)
+
+  LOGGER.info('Resolving %d precise and %d imprecise Intents.', len(precise),
+              len(imprecise))
+  results = primo.linking.find_links.FindLinksForIntents(
+      precise, imprecise, skip_empty, components, intent_filters,
+      include_attributes, False, explicit_link_finder, implicit_link_finder,
+      True, workers)
+
+  intent_links = intent_links.RemoveIntents(
+      [component_intent.id for component_intent in precise + imprecise])
+  if include_attributes and intent_links.size:
+    LOGGER.warning('Kept %d links from the previous run. Their probabilities '
+                   'do not reflect the updated training data, use '
+                   '--resolve_all to compute them again.', intent_links.size)
+  intent_links.AppendTable(results[0])
+
+  return (intent_links, intent_links.size) + results[2:]
+
+
+cdef bint _CanTargetAny(ComponentIntent component_intent, bint precise_intent,
+                        set components, set intent_filters,
+                        ExplicitLinkFinder explicit_link_finder,
+                        ImplicitLinkFinder implicit_link_finder):
+  """Determines if an Intent can target any component or Intent Filter from
+  given sets.
+
+  For precise implicit Intents, this also records the matches with the Intent
+  Filters.
+  """
+
+  cdef Intent intent = component_intent.intent
+  if intent.dclass is not None:
+    return (bool(components) and
+            explicit_link_finder.FindExplicitTargetsForIntent(
+                intent, components) is not None)
+  return (bool(intent_filters) and
+          implicit_link_finder.FindImplicitTargetsForIntent(
+              component_intent, intent_filters, precise_intent) is not None)
+
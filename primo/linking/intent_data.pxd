@@ -17,9 +17,33 @@
 
 from primo.linking.intents cimport ComponentIntent
 
+cdef class IntentColumns(object):
+  # The number of rows.
+  cdef readonly long size
+  # Maps fields to the arrays of the codes of rows.
+  cdef readonly dict codes
+  # Maps fields to maps between field values and codes.
+  cdef dict _values
+  # Maps Intents to rows.
+  cdef dict _row_ids
+  # Maps base types to the codes of the MIME types base/*.
+  cdef dict _base_type_codes
+  # Cache of the group-by tables of all rows.
+  cdef dict _group_counts
+  # Cache of category subset masks.
+  cdef dict _category_masks
+  cdef list ValueCodes(self, str field, object value)
+  cdef object ValueMask(self, str field, object values)
+  cdef object RowMask(self, object intents)
+  cdef object CategorySubsetMask(self, frozenset categories)
+  cdef dict GroupCounts(self, tuple fields, object mask=?)
+  cdef long CountRows(self, tuple attributes, dict counts)
+
 cdef void AddPreciseIntent(ComponentIntent intent)
 cdef void AddImpreciseIntent(ComponentIntent intent)
-cdef dict GetAttributeMaps()
+cdef void RemoveComponentIntents(set component_intents)
+cdef void FreezeIntents(bint frozen)
+cdef IntentColumns GetIntentColumns()
 cdef set GetPreciseIntents()
 cdef set GetPreciseComponentIntents()
 cdef set GetImpreciseComponentIntents()
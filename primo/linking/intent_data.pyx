@@ -18,9 +18,14 @@
 
 from primo.linking.intents cimport ComponentIntent
 from primo.linking.intents cimport Intent
+from primo.linking.metrics cimport CountCache
+from primo.linking.metrics cimport INTENT_GROUP_COUNTS_CACHE
 
+import itertools
 import logging
 
+import numpy as np
+
 from primo.linking.target_data import BASE_TYPE
 from primo.linking.target_data import CLASS
 from primo.linking.target_data import PACKAGE
@@ -44,11 +49,19 @@ cdef dict _ATTRIBUTE_MAPS = {'action': {},
                              'dclass': {},
                              BASE_TYPE: {}}
 
+# The columns of the precise Intents. They are built when they are first needed
+# after training data changes.
+cdef IntentColumns _COLUMNS = None
+
 cdef set _PRECISE_INTENTS = set()
 cdef set _IMPRECISE_INTENTS = set()
 cdef set _PRECISE_COMPONENT_INTENTS = set()
 cdef set _IMPRECISE_COMPONENT_INTENTS = set()
 
+# Indicates whether new Intents are kept out of the sets of Intents and of
+# training data.
+cdef bint _FROZEN = False
+
 
 cdef void AddAttribute(object field_value, Intent intent, dict attribute_map):
   """Helper function that adds an Intent to an Intent attribute map.
@@ -65,6 +78,8 @@ cdef void AddAttribute(object field_value, Intent intent, dict attribute_map):
     end_points = set()
     attribute_map[field_value] = end_points
   end_points.add(intent)
+  global _COLUMNS
+  _COLUMNS = None
 
 
 cdef void AddAttributesForPreciseIntent(Intent intent):
@@ -88,6 +103,33 @@ cdef void AddAttributesForPreciseIntent(Intent intent):
     AddAttribute(field_value, intent, attribute_map)
 
 
+cdef void RemoveAttributesForPreciseIntent(Intent intent):
+  """Removes the attributes of a precise Intent from training data.
+
+  Args:
+    intent: An Intent.
+  """
+
+  cdef str attribute_type
+  cdef dict attribute_map
+  cdef set end_points
+  for attribute_type, attribute_map in _ATTRIBUTE_MAPS.iteritems():
+    if attribute_type == BASE_TYPE:
+      continue
+    field_values = [getattr(intent, attribute_type)]
+    if (attribute_type == 'dtype' and field_values[0]
+        and field_values[0] != '*/*' and field_values[0].endswith('/*')):
+      field_values.append(field_values[0].split('/', 1)[0])
+    for field_value in field_values:
+      end_points = attribute_map.get(field_value)
+      if end_points is not None:
+        end_points.discard(intent)
+        if not end_points:
+          del attribute_map[field_value]
+  global _COLUMNS
+  _COLUMNS = None
+
+
 cdef void AddPreciseIntent(ComponentIntent intent):
   """Adds a precise Intent to the sets of precise Intents and updates training
   data.
@@ -101,6 +143,8 @@ cdef void AddPreciseIntent(ComponentIntent intent):
     intent: A ComponentIntent object.
   """
 
+  if _FROZEN:
+    return
   AddAttributesForPreciseIntent(intent.intent)
   if intent not in _PRECISE_COMPONENT_INTENTS:
     _PRECISE_INTENTS.add(intent.intent)
@@ -114,15 +158,237 @@ cdef void AddImpreciseIntent(ComponentIntent intent):
     intent: A ComponentIntent object.
   """
 
+  if _FROZEN:
+    return
   if intent not in _IMPRECISE_COMPONENT_INTENTS:
     _IMPRECISE_INTENTS.add(intent.intent)
     _IMPRECISE_COMPONENT_INTENTS.add(intent)
 
 
-cdef dict GetAttributeMaps():
-  """Returns the maps between Intent field values and Intents."""
+cdef void RemoveComponentIntents(set component_intents):
+  """Removes ComponentIntents from the sets of Intents and from training data.
 
-  return _ATTRIBUTE_MAPS
+  Equal Intents from different ComponentIntents are only stored once, so an
+  Intent is kept as long as a remaining ComponentIntent has it.
+
+  Args:
+    component_intents: A set of ComponentIntent objects.
+  """
+
+  cdef ComponentIntent component_intent
+  cdef Intent intent
+  _PRECISE_COMPONENT_INTENTS.difference_update(component_intents)
+  _IMPRECISE_COMPONENT_INTENTS.difference_update(component_intents)
+  cdef set remaining_precise = set([component_intent.intent for component_intent
+                                    in _PRECISE_COMPONENT_INTENTS])
+  cdef set remaining_imprecise = set(
+      [component_intent.intent
+       for component_intent in _IMPRECISE_COMPONENT_INTENTS])
+
+  for component_intent in component_intents:
+    intent = component_intent.intent
+    if intent.IsPrecise():
+      if intent in _PRECISE_INTENTS and intent not in remaining_precise:
+        _PRECISE_INTENTS.discard(intent)
+        RemoveAttributesForPreciseIntent(intent)
+    elif intent not in remaining_imprecise:
+      _IMPRECISE_INTENTS.discard(intent)
+
+
+cdef void FreezeIntents(bint frozen):
+  """Sets whether the Intents that are created are left out of the sets of
+  Intents and of training data.
+
+  This lets Intents be resolved against a fixed corpus without changing its
+  training data.
+  """
+
+  global _FROZEN
+  _FROZEN = frozen
+
+
+cdef IntentColumns GetIntentColumns():
+  """Returns the columns of the current precise Intents.
+
+  The returned object is replaced when training data changes, so callers can
+  detect changes by comparing it with the columns they used before.
+  """
+
+  global _COLUMNS
+  if _COLUMNS is None:
+    _COLUMNS = IntentColumns(_PRECISE_INTENTS)
+  return _COLUMNS
+
+
+cdef class IntentColumns(object):
+  """Dictionary-encoded fields of precise Intents.
+
+  Each precise Intent is a row. For each field of IMPLICIT_ATTRS, the values of
+  the rows are replaced by int32 codes held in a NumPy array. Rows that have
+  given values are found with boolean masks, and the rows that have given
+  values for a combination of fields are counted with group-by tables that map
+  tuples of codes to row counts.
+
+  As in the attribute maps, an Intent whose MIME type is base/* also has the
+  field value base for the dtype field.
+  """
+
+  def __cinit__(self, set intents):
+    """Constructor.
+
+    Args:
+      intents: The set of precise Intents.
+    """
+
+    cdef list rows = list(intents)
+    self.size = len(rows)
+    self.codes = {}
+    self._values = {}
+    self._row_ids = dict([(intent, row) for row, intent in enumerate(rows)])
+    self._group_counts = {}
+    self._category_masks = {}
+
+    cdef dict values
+    for field in IMPLICIT_ATTRS:
+      values = {}
+      self.codes[field] = np.fromiter(
+          [values.setdefault(getattr(intent, field), len(values))
+           for intent in rows], dtype=np.int32, count=self.size)
+      self._values[field] = values
+
+    self._base_type_codes = {}
+    for mime_type, code in self._values['dtype'].iteritems():
+      if mime_type and mime_type != '*/*' and mime_type.endswith('/*'):
+        self._base_type_codes.setdefault(mime_type.split('/', 1)[0],
+                                         []).append(code)
+
+  cdef list ValueCodes(self, str field, object value):
+    """Returns the codes of the rows that have a field value.
+
+    Args:
+      field: A field of IMPLICIT_ATTRS.
+      value: A field value.
+
+    Returns: A list of codes, which is empty if no row has the value.
+    """
+
+    cdef list codes = []
+    code = self._values[field].get(value)
+    if code is not None:
+      codes.append(code)
+    if field == 'dtype':
+      codes += self._base_type_codes.get(value, [])
+    return codes
+
+  cdef object ValueMask(self, str field, object values):
+    """Returns the mask of the rows that have any of given field values.
+
+    Args:
+      field: A field name. Fields outside of IMPLICIT_ATTRS, such as BASE_TYPE,
+      are looked up in the attribute maps.
+      values: An iterable of field values.
+    """
+
+    if field not in self.codes:
+      return self.RowMask([intent for value in values
+                           for intent in _ATTRIBUTE_MAPS[field].get(value, ())])
+    selected = np.zeros(len(self._values[field]), dtype=np.bool_)
+    for value in values:
+      selected[self.ValueCodes(field, value)] = True
+    return selected[self.codes[field]]
+
+  cdef object RowMask(self, object intents):
+    """Returns the mask of the rows of given Intents.
+
+    Intents that are not precise Intents of the columns are ignored.
+
+    Args:
+      intents: An iterable of Intents.
+    """
+
+    mask = np.zeros(self.size, dtype=np.bool_)
+    cdef dict row_ids = self._row_ids
+    mask[[row_ids[intent] for intent in intents if intent in row_ids]] = True
+    return mask
+
+  cdef object CategorySubsetMask(self, frozenset categories):
+    """Returns the mask of the rows whose categories are a subset of given
+    categories.
+
+    Rows without categories are included.
+
+    Args:
+      categories: A frozenset of categories, usually those of an Intent Filter.
+    """
+
+    try:
+      return self._category_masks[categories]
+    except KeyError:
+      pass
+
+    cdef dict values = self._values['categories']
+    selected = np.zeros(len(values), dtype=np.bool_)
+    for category_tuple, code in values.iteritems():
+      if not category_tuple or categories.issuperset(category_tuple):
+        selected[code] = True
+    mask = selected[self.codes['categories']]
+    self._category_masks[categories] = mask
+    return mask
+
+  cdef dict GroupCounts(self, tuple fields, object mask=None):
+    """Counts rows by their codes for a combination of fields.
+
+    Tables of all rows are cached.
+
+    Args:
+      fields: A tuple of fields of IMPLICIT_ATTRS.
+      mask: If not None, the mask of the rows to count.
+
+    Returns: A map between tuples of the codes of the fields and row counts.
+    """
+
+    cdef dict counts
+    if mask is None:
+      try:
+        counts = self._group_counts[fields]
+        CountCache(INTENT_GROUP_COUNTS_CACHE, True)
+        return counts
+      except KeyError:
+        CountCache(INTENT_GROUP_COUNTS_CACHE, False)
+
+    rows = np.column_stack([self.codes[field] for field in fields])
+    if mask is not None:
+      rows = rows[mask]
+    counts = {}
+    if len(rows):
+      keys, key_counts = np.unique(rows, axis=0, return_counts=True)
+      counts = dict(zip([tuple(key) for key in keys.tolist()],
+                        key_counts.tolist()))
+    if mask is None:
+      self._group_counts[fields] = counts
+    return counts
+
+  cdef long CountRows(self, tuple attributes, dict counts):
+    """Counts the rows that have a combination of field values.
+
+    Args:
+      attributes: A tuple of (field, value) pairs.
+      counts: The result of GroupCounts for the fields of the attributes.
+
+    Returns: The number of rows, or -1 if no row has one of the values.
+    """
+
+    cdef list alternatives = []
+    cdef list codes
+    for field, value in attributes:
+      codes = self.ValueCodes(field, value)
+      if not codes:
+        return -1
+      alternatives.append(codes)
+    # Each row has one code per field, so the counts of the alternatives are
+    # added.
+    return sum([counts.get(key, 0)
+                for key in itertools.product(*alternatives)])
 
 
 cdef set GetPreciseIntents():
@@ -143,6 +409,28 @@ cdef set GetImpreciseComponentIntents():
   return _IMPRECISE_COMPONENT_INTENTS
 
 
+def GetState():
+  """Returns the global Intent sets and maps, for saving corpus snapshots."""
+
+  return (_ATTRIBUTE_MAPS, _PRECISE_INTENTS, _IMPRECISE_INTENTS,
+          _PRECISE_COMPONENT_INTENTS, _IMPRECISE_COMPONENT_INTENTS)
+
+
+def SetState(tuple state):
+  """Restores global Intent sets and maps saved with GetState."""
+
+  attribute_maps = state[0]
+  for key in _ATTRIBUTE_MAPS.iterkeys():
+    _ATTRIBUTE_MAPS[key] = attribute_maps[key]
+  for intent_set, saved_set in zip((_PRECISE_INTENTS, _IMPRECISE_INTENTS,
+                                    _PRECISE_COMPONENT_INTENTS,
+                                    _IMPRECISE_COMPONENT_INTENTS), state[1:]):
+    intent_set.clear()
+    intent_set.update(saved_set)
+  global _COLUMNS
+  _COLUMNS = None
+
+
 def Reset():
   """Resets global Intent sets and maps."""
 
@@ -150,6 +438,10 @@ def Reset():
   _IMPRECISE_INTENTS.clear()
   _PRECISE_COMPONENT_INTENTS.clear()
   _IMPRECISE_COMPONENT_INTENTS.clear()
+  global _COLUMNS
+  _COLUMNS = None
+  global _FROZEN
+  _FROZEN = False
 
   for key in _ATTRIBUTE_MAPS.iterkeys():
     _ATTRIBUTE_MAPS[key] = {}
@@ -17,6 +17,9 @@
 """Class and factory for Intent Filters."""
 
 from primo.linking.components cimport Component
+from primo.linking.interning cimport Intern
+from primo.linking.interning cimport InternFrozenset
+from primo.linking.interning cimport InternTuple
 from primo.linking.target_data cimport AddIntentFilterAttributes
 
 from primo.linking import ic3_data_pb2
@@ -35,6 +38,19 @@ _ATTRIBUTE_KIND_TO_NAME = {ic3_data_pb2.ACTION: 'actions',
 cdef int _id = 0
 
 
+def GetState():
+  """Returns the global Intent Filter data, for saving corpus snapshots."""
+
+  return _id
+
+
+def SetState(int state):
+  """Restores global Intent Filter data saved with GetState."""
+
+  global _id
+  _id = state
+
+
 cdef IntentFilter MakeIntentFilter(object intent_filter_pb,
                                    Component component):
   """Factory for Intent Filters.
@@ -55,25 +71,25 @@ cdef IntentFilter MakeIntentFilter(object intent_filter_pb,
   attributes = {}
   for attribute in intent_filter_pb.attributes:
     kind = attribute.kind
-    value = attribute.value
+    value = InternTuple(attribute.value)
     attributes[kind] = value
     if kind == ic3_data_pb2.ACTION:
-      actions = frozenset(value)
+      actions = InternFrozenset(value)
     elif kind == ic3_data_pb2.CATEGORY:
-      categories = frozenset(value)
+      categories = InternFrozenset(value)
     elif kind == ic3_data_pb2.TYPE:
-      types = tuple(sorted(value))
+      types = InternTuple(sorted(value))
     elif kind == ic3_data_pb2.SCHEME:
-      schemes = tuple(sorted(value))
+      schemes = InternTuple(sorted(value))
     elif kind == ic3_data_pb2.HOST:
-      hosts = tuple(sorted(value))
+      hosts = InternTuple(sorted(value))
     elif kind == ic3_data_pb2.PORT:
-      ports = tuple(sorted(value))
+      ports = InternTuple(sorted(value))
     elif kind == ic3_data_pb2.PATH:
-      paths = tuple(sorted(value))
+      paths = InternTuple(sorted(value))
 
-  short_descriptor = (categories, actions, schemes, types, hosts, ports, paths,
-                      component.kind)
+  short_descriptor = Intern((categories, actions, schemes, types, hosts, ports,
+                             paths, component.kind))
   descriptor = (short_descriptor, component.descriptor)
   result = IntentFilter(component, categories, actions, schemes, types, hosts,
                         ports, paths, short_descriptor, descriptor, _id)
@@ -189,6 +205,12 @@ cdef class IntentFilter(object):
             (self.actions, self.categories, self.schemes, self.types,
              self.hosts, self.ports, self.paths, self.component.kind))
 
+  def __reduce__(self):
+    return (IntentFilter,
+            (self.component, self.categories, self.actions, self.schemes,
+             self.types, self.hosts, self.ports, self.paths,
+             self.short_descriptor, self.descriptor, self.id))
+
   def __hash__(self):
     return self._hash
 
@@ -19,3 +19,4 @@ from primo.linking.intents cimport Intent
 
 cdef void UpdateImpreciseDistribution(Intent intent)
 cdef void MakeRandomImprecision(Intent intent)
+cdef void ResetPartialImprecisions()
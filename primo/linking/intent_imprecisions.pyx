@@ -215,3 +215,13 @@ cdef unicode MakePartialFieldImprecision(unicode value):
   else:
     # Replace suffix.
     return value[cutoff:] + u'(.*)'
+
+
+cdef void ResetPartialImprecisions():
+  """Forgets which fields are due for a partial imprecision.
+
+  This makes imprecisions only depend on the random seed and on the Intents
+  modified since the last call.
+  """
+
+  _FORCE_PARTIAL_IMPRECISION.clear()
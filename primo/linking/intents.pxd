@@ -59,3 +59,4 @@ cdef class ComponentIntent(object):
 
 cdef ComponentIntent MakeComponentIntent(object intent_pb, Component component,
                                          object exit_point)
+cdef void RemoveFromCounters(Intent intent)
@@ -20,6 +20,8 @@ from primo.linking.applications cimport Application
 from primo.linking.components cimport Component
 from primo.linking.intent_data cimport AddImpreciseIntent
 from primo.linking.intent_data cimport AddPreciseIntent
+from primo.linking.interning cimport Intern
+from primo.linking.interning cimport InternTuple
 from primo.linking.target_data cimport GetTargetCountForValue
 
 from collections import Counter
@@ -51,6 +53,22 @@ CATEGORY_DEFAULT = u'android.intent.category.DEFAULT'
 cdef int _id = 0
 
 
+def GetState():
+  """Returns the global Intent data, for saving corpus snapshots."""
+
+  return (_INTENT_COUNTERS, _id)
+
+
+def SetState(tuple state):
+  """Restores global Intent data saved with GetState."""
+
+  global _id
+  counters, _id = state
+  for field, counter in _INTENT_COUNTERS.iteritems():
+    counter.clear()
+    counter.update(counters[field])
+
+
 cdef ComponentIntent MakeComponentIntent(object intent_pb, Component component,
                                          object exit_point):
   """Factory for ComponentIntent objects.
@@ -62,8 +80,8 @@ cdef ComponentIntent MakeComponentIntent(object intent_pb, Component component,
   """
 
   cdef Intent intent = _MakeIntent(intent_pb, component, exit_point, True)
-  cdef unicode exit_point_name = exit_point.instruction.class_name
-  cdef unicode exit_point_method = exit_point.instruction.method
+  cdef unicode exit_point_name = Intern(exit_point.instruction.class_name)
+  cdef unicode exit_point_method = Intern(exit_point.instruction.method)
   cdef unsigned int exit_point_instruction = exit_point.instruction.id
 
   cdef bint library_exit_point = False
@@ -84,6 +102,30 @@ cdef ComponentIntent MakeComponentIntent(object intent_pb, Component component,
   return result
 
 
+cdef void RemoveFromCounters(Intent intent):
+  """Removes an Intent from the field value counters.
+
+  This mirrors the counter updates made when the Intent was created.
+
+  Args:
+    intent: An Intent created by MakeComponentIntent.
+  """
+
+  if intent.dpackage is not None:
+    _INTENT_COUNTERS[PACKAGE][intent.dpackage] -= 1
+  if intent.dclass is not None:
+    _INTENT_COUNTERS[CLASS][intent.dclass] -= 1
+  _INTENT_COUNTERS[KIND][intent.exit_kind] -= 1
+  _INTENT_COUNTERS[ic3_data_pb2.ACTION][intent.action] -= 1
+  _INTENT_COUNTERS[ic3_data_pb2.CATEGORY][intent.categories] -= 1
+  _INTENT_COUNTERS[ic3_data_pb2.SCHEME][intent.scheme] -= 1
+  _INTENT_COUNTERS[ic3_data_pb2.HOST][intent.host] -= 1
+  _INTENT_COUNTERS[ic3_data_pb2.PORT][intent.port] -= 1
+  _INTENT_COUNTERS[ic3_data_pb2.PATH][intent.path] -= 1
+  # This is the key used in _MakeIntent.
+  _INTENT_COUNTERS[ic3_data_pb2.TYPE][type] -= 1
+
+
 cdef float Expectation(list data):
   cdef float result = 0.0
   cdef float probability
@@ -235,6 +277,13 @@ cdef class Intent(object):
     def __get__(self):
       return self.application.used_permissions
 
+  def __reduce__(self):
+    return (Intent,
+            (self.permission, self.categories, self.action, self.dpackage,
+             self.dclass, self.dtype, self.scheme, self.path, self.extra,
+             self.descriptor, self.exit_kind, self.host, self.port,
+             self.application))
+
   def __hash__(self):
     return self._hash
 
@@ -268,7 +317,7 @@ cdef Intent _MakeIntent(object intent_pb, Component component,
   Returns: The newly-created Intent object.
   """
 
-  cdef unicode permission = (intent_pb.permission
+  cdef unicode permission = (Intern(intent_pb.permission)
                              if intent_pb.HasField('permission') else None)
   cdef list categories = []
   cdef unicode action = None
@@ -291,33 +340,38 @@ cdef Intent _MakeIntent(object intent_pb, Component component,
     kind = attribute.kind
     value = attribute.value
     if kind == ic3_data_pb2.ACTION:
-      action = value[0]
+      action = Intern(value[0])
     elif kind == ic3_data_pb2.CATEGORY:
       categories.extend(value)
     elif kind == ic3_data_pb2.PACKAGE:
-      dpackage = value[0].replace('/', '.')
+      dpackage = Intern(value[0].replace('/', '.'))
       if update_counters:
         _INTENT_COUNTERS[PACKAGE][dpackage] += 1
     elif kind == ic3_data_pb2.CLASS:
-      dclass = value[0].replace("/", ".")
+      dclass = Intern(value[0].replace('/', '.'))
       if update_counters:
         _INTENT_COUNTERS[CLASS][dclass] += 1
     elif kind == ic3_data_pb2.TYPE:
-      dtype = value[0]
+      dtype = Intern(value[0])
     elif kind == ic3_data_pb2.URI:
-      uri = value[0]
+      uri = Intern(value[0])
     elif kind == ic3_data_pb2.SCHEME:
-      scheme = value[0]
+      scheme = Intern(value[0])
     elif kind == ic3_data_pb2.AUTHORITY:
-      authority = value[0]
+      authority = Intern(value[0])
     elif kind == ic3_data_pb2.PATH:
-      path = value[0]
+      path = Intern(value[0])
     elif kind == ic3_data_pb2.EXTRA:
       extras.extend(value)
 
   scheme, host, port, path = _ParseUri(uri, authority, scheme, host, port, path)
+  # Parsed URI parts are new objects.
+  scheme = Intern(scheme)
+  host = Intern(host)
+  port = Intern(port)
+  path = Intern(path)
 
-  cdef tuple categories_tuple = (tuple(sorted(categories)) if categories
+  cdef tuple categories_tuple = (InternTuple(sorted(categories)) if categories
                                  else None)
 
   if update_counters:
@@ -330,9 +384,10 @@ cdef Intent _MakeIntent(object intent_pb, Component component,
     _INTENT_COUNTERS[ic3_data_pb2.PATH][path] += 1
     _INTENT_COUNTERS[ic3_data_pb2.TYPE][type] += 1
 
-  cdef extras_tuple = tuple(sorted(extras)) if extras else None
-  descriptor = (action, categories_tuple, dtype, dpackage, scheme, host, port,
-                path, dclass, permission, exit_kind, extras_tuple)
+  cdef extras_tuple = InternTuple(sorted(extras)) if extras else None
+  # Equal Intents sent by different components share their descriptor.
+  descriptor = Intern((action, categories_tuple, dtype, dpackage, scheme, host,
+                       port, path, dclass, permission, exit_kind, extras_tuple))
 
   return Intent(permission, categories_tuple, action, dpackage, dclass, dtype,
                 scheme, path, extras_tuple, descriptor, exit_kind, host, port,
@@ -450,6 +505,12 @@ cdef class ComponentIntent(object):
     def __get__(self):
       return self._id
 
+  def __reduce__(self):
+    return (ComponentIntent,
+            (self.intent, self.component, self.exit_point_name,
+             self.exit_point_method, self.exit_point_instruction,
+             self.descriptor, self.library_exit_point, self._id))
+
   def __hash__(self):
     return self._hash
 
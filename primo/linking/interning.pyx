@@ -0,0 +1,114 @@
+# Copyright (C) 2015 The Pennsylvania State University and the University of Wisconsin
+# Systems and Internet Infrastructure Security Laboratory
+#
+# Author: Damien Octeau
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""A corpus-wide pool of field values.
+
+Field values such as actions, categories, MIME types, schemes, hosts,
+permissions and component names repeat across applications, but protobufs
+return a new object for each of them. Interning makes equal values share one
+object, which reduces the memory used by the corpus and lets dictionary and set
+lookups in attribute maps succeed on the identity check.
+
+Tuples and frozensets are interned after their elements. Values that are unique
+to an object, such as the descriptors of components, should not be interned,
+since the pool keeps its values alive for the lifetime of the corpus.
+"""
+
+
+cdef dict _POOL = {}
+# If not None, the values added to the pool since TrackNewValues was called.
+cdef list _NEW_VALUES = None
+
+
+def GetState():
+  """Returns the pool of interned values, for saving corpus snapshots.
+
+  The pool should be saved with the corpus objects that share its values, so
+  that loading restores the sharing.
+  """
+
+  return _POOL
+
+
+def SetState(dict state):
+  """Restores a pool of interned values saved with GetState."""
+
+  global _POOL
+  _POOL = state
+
+
+def GetPoolSize():
+  """Returns the number of distinct interned values."""
+
+  return len(_POOL)
+
+
+def TrackNewValues():
+  """Starts recording the values that are added to the pool.
+
+  This lets short-lived objects, such as the applications of link queries
+  against a fixed corpus, be interned without growing the pool.
+  """
+
+  global _NEW_VALUES
+  _NEW_VALUES = []
+
+
+def RemoveNewValues():
+  """Removes the values added to the pool since TrackNewValues was called.
+
+  The removed values should not be used by the objects that remain.
+  """
+
+  global _NEW_VALUES
+  if _NEW_VALUES is None:
+    return
+  for value in _NEW_VALUES:
+    del _POOL[value]
+  _NEW_VALUES = None
+
+
+cdef object Intern(object value):
+  """Returns the pooled object equal to a value.
+
+  Args:
+    value: A hashable value or None.
+
+  Returns: The pooled value, which is value itself if no equal value was
+  interned before.
+  """
+
+  if value is None:
+    return None
+  pooled = _POOL.get(value)
+  if pooled is None:
+    _POOL[value] = value
+    if _NEW_VALUES is not None:
+      _NEW_VALUES.append(value)
+    return value
+  return pooled
+
+
+cdef tuple InternTuple(object values):
+  """Interns a tuple of the interned elements of an iterable, in order."""
+
+  return Intern(tuple([Intern(value) for value in values]))
+
+
+cdef frozenset InternFrozenset(object values):
+  """Interns a frozenset of the interned elements of an iterable."""
+
+  return Intern(frozenset([Intern(value) for value in values]))
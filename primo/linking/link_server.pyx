@@ -0,0 +1,368 @@
+# Copyright (C) 2015 The Pennsylvania State University and the University of Wisconsin
+# Systems and Internet Infrastructure Security Laboratory
+#
+# Author: Damien Octeau
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""A resident server that resolves the links of new applications.
+
+The corpus is loaded and indexed once. Each request carries an Application
+protobuf. The application is added to the target data, its outgoing links and
+the links of the corpus Intents that can target it are resolved, and it is
+removed again. Training data and explicit link counts stay those of the corpus,
+so that requests do not change each other's results.
+
+Requests temporarily change global target data, so they are served one at a
+time, by a single-threaded server on a Unix socket. Messages in both
+directions are framed by their length as a 4-byte big-endian integer. Requests
+hold a serialized Application protobuf and responses hold a JSON object.
+"""
+
+from primo.linking.applications cimport Application
+from primo.linking.components cimport Component
+from primo.linking.find_explicit_links cimport ExplicitLinkFinder
+from primo.linking.find_implicit_links cimport ImplicitLinkFinder
+from primo.linking.intent_data cimport FreezeIntents
+from primo.linking.intent_data cimport GetImpreciseComponentIntents
+from primo.linking.intent_data cimport GetPreciseComponentIntents
+from primo.linking.intent_filters cimport IntentFilter
+from primo.linking.intents cimport ComponentIntent
+from primo.linking.intents cimport RemoveFromCounters
+from primo.linking.target_data cimport AddQueryApplication
+from primo.linking.target_data cimport PrepareForQueries
+from primo.linking.target_data cimport RemoveComponent
+from primo.linking.target_data cimport RemoveQueryApplication
+from primo.linking.write_results cimport LinkWriter
+
+import json
+import logging
+import os
+import socket
+import SocketServer
+import stat
+import struct
+import time
+
+import gflags
+from google.protobuf.message import DecodeError
+
+from primo.linking import applications as applications_mod
+from primo.linking import attribute_matching
+from primo.linking import components as components_mod
+from primo.linking import fetch_data
+from primo.linking import find_links
+from primo.linking import ic3_data_pb2
+from primo.linking import intent_filters as intent_filters_mod
+from primo.linking import interning
+from primo.linking import snapshot
+
+
+FLAGS = gflags.FLAGS
+
+LOGGER = logging.getLogger(__name__)
+
+# The length prefix of messages.
+_LENGTH = struct.Struct('>I')
+
+
+class LinkServerError(Exception):
+  """Raised when a request cannot be served."""
+
+
+cdef class _LinkCollector(LinkWriter):
+  """Keeps the links of Intents as objects instead of writing them."""
+
+  cdef readonly list links
+
+  def __init__(self):
+    self.links = []
+
+  cpdef WriteLinks(self, ComponentIntent component_intent, list targets,
+                   object probabilities):
+    self.links.append((component_intent, targets, probabilities))
+
+
+class LinkResolver(object):
+  """Resolves the links of applications that are not in a corpus."""
+
+  def __init__(self, protobufs, protodirs=None, snapshot_in=None,
+               skip_empty=False, ingest_workers=1, workers=1):
+    """Loads and indexes the corpus and records its precise links.
+
+    Args:
+      protobufs: A list of paths to protobufs.
+      protodirs: A list of paths to directories that contain protobufs.
+      snapshot_in: If not None, the path of a corpus snapshot to load instead
+      of protobufs.
+      skip_empty: Indicates whether empty Intents should be skipped.
+      ingest_workers: The number of worker processes used for loading
+      protobufs.
+      workers: The number of worker processes used for resolving the precise
+      Intents of the corpus.
+    """
+
+    if snapshot_in:
+      applications, components, _, intent_filters, _ = snapshot.ReadSnapshot(
+          snapshot_in, None)
+    else:
+      applications, components, _, intent_filters = fetch_data.FetchData(
+          protobufs, protodirs, None, ingest_workers)
+    PrepareForQueries(applications)
+    self._application_names = set([application.name
+                                   for application in applications])
+    self._components = components
+    self._intent_filters = intent_filters
+    self._skip_empty = skip_empty
+
+    # Resolving the precise Intents records their matches with Intent Filters
+    # and counts explicit links, which are used for link probabilities.
+    # Imprecise Intents are resolved as well so that the attribute lookups
+    # of the first request are already cached.
+    cdef ImplicitLinkFinder implicit_link_finder = ImplicitLinkFinder()
+    implicit_link_finder.SetPlanTests(FLAGS.plan_tests)
+    self._precise_intents = list(GetPreciseComponentIntents())
+    self._imprecise_intents = list(GetImpreciseComponentIntents())
+    results = find_links.FindLinksForIntents(
+        self._precise_intents, self._imprecise_intents, skip_empty,
+        components, intent_filters, False, False, None, implicit_link_finder,
+        True, workers)
+    self._explicit_link_finder = results[-1]
+    self._implicit_link_finder = implicit_link_finder
+    implicit_link_finder.GetColumns()
+    FreezeIntents(True)
+    LOGGER.info('Loaded %d applications with %d precise and %d imprecise '
+                'Intents.', len(applications), len(self._precise_intents),
+                len(self._imprecise_intents))
+
+  def Resolve(self, application_pb):
+    """Resolves the links of an application that is not in the corpus.
+
+    Args:
+      application_pb: An Application protobuf object.
+
+    Returns: A tuple with the lists of outgoing and incoming links. Links are
+    tuples with a ComponentIntent, a target component or Intent Filter and a
+    link probability.
+    """
+
+    if application_pb.name in self._application_names:
+      raise LinkServerError('Application %s is already in the corpus.'
+                            % application_pb.name)
+
+    # Ids are restored so that they do not grow with requests, since Intent
+    # Filter ids index bitmaps. Field values that were interned for the
+    # application and the lookups cached for it are also dropped.
+    samples = set(applications_mod.GetState())
+    components_state = components_mod.GetState()
+    intent_filters_state = intent_filters_mod.GetState()
+    cdef Application application = None
+    cdef Component component
+    cdef ComponentIntent component_intent
+    interning.TrackNewValues()
+    attribute_matching.TrackNewLookups()
+    try:
+      application = applications_mod.MakeApplication(application_pb, False)
+      AddQueryApplication(application)
+      return self._ResolveApplication(application)
+    finally:
+      if application is not None:
+        RemoveQueryApplication(application)
+        for component in application.components:
+          RemoveComponent(component)
+          for component_intent in component.intents or ():
+            RemoveFromCounters(component_intent.intent)
+      applications_mod.SetState(samples)
+      components_mod.SetState(components_state)
+      intent_filters_mod.SetState(intent_filters_state)
+      interning.RemoveNewValues()
+      attribute_matching.RemoveNewLookups()
+
+  def _ResolveApplication(self, Application application):
+    """Resolves the links of an application added to the target data."""
+
+    cdef set new_components = set(application.components)
+    cdef set new_filters = set()
+    cdef list new_intents = []
+    cdef Component component
+    for component in application.components:
+      new_filters.update(component.filters)
+      new_intents.extend(component.intents or ())
+
+    cdef ExplicitLinkFinder explicit_link_finder = \
+        (<ExplicitLinkFinder> self._explicit_link_finder).Overlay()
+    cdef ImplicitLinkFinder implicit_link_finder = \
+        (<ImplicitLinkFinder> self._implicit_link_finder).Overlay()
+    # Precise Intents are resolved first, which records their matches with the
+    # new Intent Filters.
+    incoming = self._FindLinks(self._precise_intents, self._imprecise_intents,
+                               new_components, new_filters,
+                               explicit_link_finder, implicit_link_finder)
+    # The Intents of the application are not training data, so they are all
+    # resolved as imprecise Intents, which does not record matches.
+    outgoing = (self._FindLinks([], new_intents, self._components,
+                                self._intent_filters, explicit_link_finder,
+                                implicit_link_finder)
+                + self._FindLinks([], new_intents, new_components, new_filters,
+                                  explicit_link_finder, implicit_link_finder))
+    return outgoing, incoming
+
+  def _FindLinks(self, precise_intents, imprecise_intents, components,
+                 intent_filters, explicit_link_finder, implicit_link_finder):
+    """Returns the links of Intents to given targets."""
+
+    cdef _LinkCollector collector = _LinkCollector()
+    find_links.FindLinksForIntents(
+        precise_intents, imprecise_intents, self._skip_empty, components,
+        intent_filters, True, False, explicit_link_finder,
+        implicit_link_finder, True, 1, collector)
+    return [(component_intent, target, int(probabilities[index]))
+            for component_intent, targets, probabilities in collector.links
+            for index, target in enumerate(targets)]
+
+  def HandleRequest(self, payload):
+    """Serves a request.
+
+    Args:
+      payload: A serialized Application protobuf.
+
+    Returns: The JSON response, with the outgoing and incoming links of the
+    application or an error message.
+    """
+
+    start = time.time()
+    application_pb = ic3_data_pb2.Application()
+    try:
+      application_pb.ParseFromString(payload)
+      outgoing, incoming = self.Resolve(application_pb)
+    except (DecodeError, LinkServerError) as exception:
+      LOGGER.warning('Rejected request: %s', exception)
+      response = {'error': str(exception)}
+    else:
+      response = {'application': application_pb.name,
+                  'outgoing': [_LinkRecord(link) for link in outgoing],
+                  'incoming': [_LinkRecord(link) for link in incoming]}
+      LOGGER.info('Resolved %d outgoing and %d incoming links for %s in '
+                  '%.3f s.', len(outgoing), len(incoming), application_pb.name,
+                  time.time() - start)
+    response['time'] = time.time() - start
+    return json.dumps(response)
+
+
+def _LinkRecord(link):
+  """Converts a link returned by LinkResolver.Resolve to a JSON object."""
+
+  cdef ComponentIntent component_intent
+  component_intent, target, probability = link
+  cdef Component sender = component_intent.component
+  cdef Component component
+  if isinstance(target, IntentFilter):
+    component = (<IntentFilter> target).component
+  else:
+    component = target
+  return {'sender': {'application': sender.application.name,
+                     'component': sender.name,
+                     'class': component_intent.exit_point_name,
+                     'method': component_intent.exit_point_method,
+                     'instruction': component_intent.exit_point_instruction},
+          'target': {'application': component.application.name,
+                     'component': component.name,
+                     'kind': 'filter' if component is not target
+                             else 'component'},
+          'probability': probability}
+
+
+def ReadFrame(stream):
+  """Reads a message from a file object.
+
+  Returns: The message, or None at the end of the stream.
+  """
+
+  header = stream.read(_LENGTH.size)
+  if not header:
+    return None
+  if len(header) < _LENGTH.size:
+    raise LinkServerError('Truncated message header.')
+  size, = _LENGTH.unpack(header)
+  payload = stream.read(size)
+  if len(payload) < size:
+    raise LinkServerError('Truncated message.')
+  return payload
+
+
+def WriteFrame(stream, payload):
+  """Writes a message to a file object."""
+
+  stream.write(_LENGTH.pack(len(payload)) + payload)
+  stream.flush()
+
+
+class _RequestHandler(SocketServer.StreamRequestHandler):
+  """Serves the requests of a connection until the client closes it."""
+
+  def handle(self):
+    while True:
+      try:
+        payload = ReadFrame(self.rfile)
+      except LinkServerError as exception:
+        LOGGER.warning('Dropped connection: %s', exception)
+        return
+      if payload is None:
+        return
+      WriteFrame(self.wfile, self.server.resolver.HandleRequest(payload))
+
+
+class LinkServer(SocketServer.UnixStreamServer):
+  """Serves a LinkResolver on a Unix socket, one connection at a time."""
+
+  def __init__(self, socket_path, resolver):
+    """Constructor.
+
+    A stale socket file at socket_path is replaced.
+
+    Args:
+      socket_path: The path of the Unix socket.
+      resolver: A LinkResolver.
+    """
+
+    if (os.path.exists(socket_path)
+        and stat.S_ISSOCK(os.stat(socket_path).st_mode)):
+      os.remove(socket_path)
+    SocketServer.UnixStreamServer.__init__(self, socket_path, _RequestHandler)
+    self.resolver = resolver
+
+  def server_close(self):
+    SocketServer.UnixStreamServer.server_close(self)
+    if os.path.exists(self.server_address):
+      os.remove(self.server_address)
+
+
+def QueryServer(socket_path, application_pb):
+  """Sends an application to a running LinkServer.
+
+  Args:
+    socket_path: The path of the Unix socket of the server.
+    application_pb: An Application protobuf object.
+
+  Returns: The decoded JSON response.
+  """
+
+  connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  connection.connect(socket_path)
+  try:
+    WriteFrame(connection.makefile('wb'), application_pb.SerializeToString())
+    payload = ReadFrame(connection.makefile('rb'))
+  finally:
+    connection.close()
+  if payload is None:
+    raise LinkServerError('The server closed the connection.')
+  return json.loads(payload)
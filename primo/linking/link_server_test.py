@@ -0,0 +1,158 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2015 The Pennsylvania State University and the University of Wisconsin
+# Systems and Internet Infrastructure Security Laboratory
+#
+# Author: Damien Octeau
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+
+"""Tests for link server module."""
+
+import json
+import multiprocessing
+import os.path
+import shutil
+import StringIO
+import sys
+import tempfile
+import unittest
+
+import gflags
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..'))
+
+from primo.linking import fetch_data
+from primo.linking import find_links
+from primo.linking import link_server
+from primo.linking import link_table
+from primo.linking import synthetic
+
+
+def _FullRunLinks(protodir, application_name):
+  """Computes all the links of a corpus and returns those of an application.
+
+  This is run in a separate process, since the corpus data is global.
+
+  Returns: A sorted list of (direction, sender, target) tuples, with the same
+  fields as the responses of the link server.
+  """
+
+  intent_links, components, _, _, _ = find_links.FindLinks([], [protodir])
+  components_by_id = dict([(component.id, component)
+                           for component in components])
+  filter_components = dict([(intent_filter.id, component)
+                            for component in components
+                            for intent_filter in component.filters])
+  component_intents = dict([(component_intent.id, component_intent)
+                            for component in components
+                            for component_intent in component.intents or ()])
+  offsets = intent_links.Offsets()
+  targets = intent_links.Targets()
+  target_flags = intent_links.TargetFlags()
+  links = []
+  for row, intent_id in enumerate(intent_links.IntentIds().tolist()):
+    component_intent = component_intents[intent_id]
+    sender = component_intent.component
+    for index in range(offsets[row], offsets[row + 1]):
+      if target_flags[index] & link_table.TARGET_COMPONENT:
+        target = components_by_id[targets[index]]
+        kind = u'component'
+      else:
+        target = filter_components[targets[index]]
+        kind = u'filter'
+      if application_name not in (sender.application.name,
+                                  target.application.name):
+        continue
+      links.append((
+          u'outgoing' if sender.application.name == application_name
+          else u'incoming',
+          (sender.application.name, sender.name,
+           component_intent.exit_point_name,
+           component_intent.exit_point_method,
+           component_intent.exit_point_instruction),
+          (target.application.name, target.name, kind)))
+  return sorted(links)
+
+
+def _ResponseLinks(response):
+  """Returns the links of a link server response, as in _FullRunLinks."""
+
+  links = []
+  for direction in (u'outgoing', u'incoming'):
+    for link in response[direction]:
+      sender = link[u'sender']
+      target = link[u'target']
+      links.append((
+          direction,
+          (sender[u'application'], sender[u'component'], sender[u'class'],
+           sender[u'method'], sender[u'instruction']),
+          (target[u'application'], target[u'component'], target[u'kind'])))
+  return sorted(links)
+
+
+class LinkServerTest(unittest.TestCase):
+  def testFrames(self):
+    stream = StringIO.StringIO()
+    link_server.WriteFrame(stream, 'request')
+    link_server.WriteFrame(stream, '')
+    stream.seek(0)
+    self.assertEqual(link_server.ReadFrame(stream), 'request')
+    self.assertEqual(link_server.ReadFrame(stream), '')
+    self.assertIsNone(link_server.ReadFrame(stream))
+
+  def testTruncatedFrames(self):
+    stream = StringIO.StringIO()
+    link_server.WriteFrame(stream, 'request')
+    data = stream.getvalue()
+    self.assertRaises(link_server.LinkServerError, link_server.ReadFrame,
+                      StringIO.StringIO(data[:2]))
+    self.assertRaises(link_server.LinkServerError, link_server.ReadFrame,
+                      StringIO.StringIO(data[:-1]))
+
+  def testResolve(self):
+    if not gflags.FLAGS.is_parsed():
+      gflags.FLAGS(sys.argv[:1])
+    directory = tempfile.mkdtemp()
+    try:
+      # Few distinct actions and categories make for many links.
+      paths = synthetic.GenerateCorpus(
+          directory, synthetic.CorpusParameters(app_count=100, action_count=10,
+                                                category_count=5))
+      application_pb = fetch_data.LoadApplication(paths[-1])
+      # The reference links are those of a full run on all applications.
+      pool = multiprocessing.Pool(1)
+      try:
+        wanted_links = pool.apply(_FullRunLinks,
+                                  (directory, application_pb.name))
+      finally:
+        pool.close()
+        pool.join()
+      self.assertTrue(wanted_links)
+
+      resolver = link_server.LinkResolver(paths[:-1])
+      response = json.loads(
+          resolver.HandleRequest(application_pb.SerializeToString()))
+      self.assertEqual(response[u'application'], application_pb.name)
+      self.assertEqual(_ResponseLinks(response), wanted_links)
+      # Requests do not change the corpus.
+      repeated = json.loads(
+          resolver.HandleRequest(application_pb.SerializeToString()))
+      for direction in (u'outgoing', u'incoming'):
+        self.assertEqual(repeated[direction], response[direction])
+
+      self.assertRaises(link_server.LinkServerError, resolver.Resolve,
+                        fetch_data.LoadApplication(paths[0]))
+      self.assertIn(u'error', json.loads(resolver.HandleRequest('invalid')))
+    finally:
+      shutil.rmtree(directory)
+
+if __name__ == '__main__':
+  unittest.main()
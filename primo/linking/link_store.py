@@ -0,0 +1,289 @@
+# Copyright (C) 2015 The Pennsylvania State University and the University of Wisconsin
+# Systems and Internet Infrastructure Security Laboratory
+#
+# Author: Damien Octeau
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Indexed queries over dumped Intent links.
+
+A LinkStore opens a link file or column directory written by write_results and
+answers queries about the links of an Intent, of a target or of an application.
+Links are indexed by sorting their positions by Intent and by target. A lookup
+first searches the first keys of the shards of the sorted keys, then the keys
+of a single shard, so it takes logarithmic time and only reads one shard of a
+memory-mapped index.
+
+Components, which are the targets of explicit Intents, and Intent Filters have
+separate ids. Target keys combine the explicit flag of links and target ids.
+
+Indexes can be saved with WriteIndex, either in a column directory or in a
+<link file>.index directory. Saved indexes also contain the applications of
+Intents and targets, which are needed for application queries. Indexes are
+built when a LinkStore is opened if they were not saved after the links.
+"""
+
+import json
+import logging
+import os
+
+import numpy as np
+
+from primo.linking import write_results
+from primo.linking.link_table import TargetKeys
+
+
+LOGGER = logging.getLogger(__name__)
+
+# The number of sorted keys in a shard of an index.
+SHARD_SIZE = 4096
+
+_INDEX_SUFFIX = '.index'
+_APPLICATIONS = 'applications.json'
+_INDEXES = ['intent', 'target']
+_APPLICATION_TABLES = ['intent', 'component', 'filter']
+
+
+class LinkStoreError(Exception):
+  """Raised when a query cannot be answered."""
+
+
+class ShardedIndex(object):
+  """Sorted keys of links with the positions of the links."""
+
+  def __init__(self, keys, positions):
+    """Constructor.
+
+    Args:
+      keys: The sorted array of keys.
+      positions: The positions of the links with the sorted keys.
+    """
+
+    self.keys = keys
+    self.positions = positions
+    self._fences = np.array(keys[::SHARD_SIZE])
+
+  @classmethod
+  def Build(cls, keys):
+    """Builds an index from the keys of all links, in link order."""
+
+    positions = np.argsort(keys, kind='mergesort')
+    return cls(keys[positions], positions)
+
+  def Lookup(self, key):
+    """Returns the positions of the links with a given key."""
+
+    start = self._Bound(key, 'left')
+    end = self._Bound(key, 'right')
+    return self.positions[start:end]
+
+  def _Bound(self, key, side):
+    """Finds the bound of a range of keys, searching a single shard."""
+
+    shard = max(np.searchsorted(self._fences, key, side) - 1, 0)
+    shard_start = shard * SHARD_SIZE
+    return shard_start + np.searchsorted(
+        self.keys[shard_start:shard_start + SHARD_SIZE], key, side)
+
+
+class LinkStore(object):
+  """Answers queries about the links of a link file or column directory."""
+
+  def __init__(self, path):
+    """Opens links and loads or builds their indexes.
+
+    Args:
+      path: The path to a link file or column directory.
+    """
+
+    self._columns = write_results.LoadLinkColumns(path)
+    self.size = self._columns['intent'].size
+    index_directory = _IndexDirectory(path)
+    self._indexes = {}
+    self._application_names = None
+    self._application_tables = None
+    if _HasCurrentIndex(path):
+      self._LoadIndexes(index_directory)
+    else:
+      LOGGER.info('Building indexes of %d links.', self.size)
+      self._indexes['intent'] = ShardedIndex.Build(self._columns['intent'])
+      self._indexes['target'] = ShardedIndex.Build(
+          TargetKeys(self._columns['target'], self._columns['explicit']))
+
+  def IntentLinks(self, intent_id, min_probability=0):
+    """Returns the links of an Intent.
+
+    Args:
+      intent_id: The id of a ComponentIntent.
+      min_probability: The minimum probability of returned links.
+
+    Returns: An array of links with type write_results.DTYPE.
+    """
+
+    return self._Rows(self._indexes['intent'].Lookup(intent_id),
+                      min_probability)
+
+  def TargetLinks(self, target_id, explicit, min_probability=0):
+    """Returns the links that reach a target.
+
+    Args:
+      target_id: The id of a component or Intent Filter.
+      explicit: True if the target is a component, False if it is an Intent
+      Filter.
+      min_probability: The minimum probability of returned links.
+
+    Returns: An array of links with type write_results.DTYPE.
+    """
+
+    key = TargetKeys(target_id, explicit)
+    return self._Rows(self._indexes['target'].Lookup(key), min_probability)
+
+  def ApplicationLinks(self, application, incoming=False, min_probability=0):
+    """Returns the links sent or received by an application.
+
+    Args:
+      application: The name of an application.
+      incoming: If True, links received by the application are returned.
+      Otherwise, links sent by the application are returned.
+      min_probability: The minimum probability of returned links.
+
+    Returns: An array of links with type write_results.DTYPE.
+    """
+
+    if self._application_names is None:
+      raise LinkStoreError('Application queries require saved indexes.')
+    try:
+      application_index = self._application_names.index(application)
+    except ValueError:
+      raise LinkStoreError('Unknown application %s.' % application)
+
+    if incoming:
+      index = self._indexes['target']
+      keys = np.concatenate([
+          TargetKeys(np.flatnonzero(
+              self._application_tables['component'] == application_index),
+                     True),
+          TargetKeys(np.flatnonzero(
+              self._application_tables['filter'] == application_index),
+                     False)])
+    else:
+      index = self._indexes['intent']
+      keys = np.flatnonzero(
+          self._application_tables['intent'] == application_index)
+    positions = [index.Lookup(key) for key in keys.tolist()]
+    return self._Rows(np.concatenate(positions) if positions
+                      else np.empty(0, dtype=np.int64), min_probability)
+
+  def _Rows(self, positions, min_probability):
+    """Gathers the links at given positions.
+
+    Args:
+      positions: An array of link positions.
+      min_probability: The minimum probability of returned links.
+
+    Returns: An array of links with type write_results.DTYPE, in file order.
+    """
+
+    positions = np.sort(positions)
+    if min_probability > 0:
+      positions = positions[
+          self._columns['probability'][positions] >= min_probability]
+    rows = np.empty(positions.size, dtype=write_results.DTYPE)
+    for name, column in self._columns.iteritems():
+      rows[name] = column[positions]
+    return rows
+
+  def _LoadIndexes(self, index_directory):
+    """Memory-maps saved indexes and loads application tables."""
+
+    for name in _INDEXES:
+      keys = np.load(os.path.join(index_directory, '%s_keys.npy' % name),
+                     mmap_mode='r')
+      if keys.size != self.size:
+        raise LinkStoreError('Index %s in %s has %d links instead of %d.'
+                             % (name, index_directory, keys.size, self.size))
+      self._indexes[name] = ShardedIndex(
+          keys, np.load(os.path.join(index_directory, '%s_positions.npy'
+                                     % name), mmap_mode='r'))
+    with open(os.path.join(index_directory, _APPLICATIONS)) as names_file:
+      self._application_names = json.load(names_file)
+    self._application_tables = dict([
+        (name, np.load(os.path.join(index_directory,
+                                    '%s_applications.npy' % name)))
+        for name in _APPLICATION_TABLES])
+
+
+def WriteIndex(path, intents, components, intent_filters):
+  """Builds and saves the indexes of a link file or column directory.
+
+  Args:
+    path: The path to a link file or column directory.
+    intents: The ComponentIntents of the corpus.
+    components: The components of the corpus.
+    intent_filters: The Intent Filters of the corpus.
+  """
+
+  columns = write_results.LoadLinkColumns(path,
+                                          ['intent', 'target', 'explicit'])
+  index_directory = _IndexDirectory(path)
+  if not os.path.isdir(index_directory):
+    os.makedirs(index_directory)
+
+  LOGGER.info('Writing indexes of %d links to %s.', columns['intent'].size,
+              index_directory)
+  for name, keys in (('intent', columns['intent']),
+                     ('target', TargetKeys(columns['target'],
+                                           columns['explicit']))):
+    index = ShardedIndex.Build(keys)
+    np.save(os.path.join(index_directory, '%s_keys.npy' % name), index.keys)
+    np.save(os.path.join(index_directory, '%s_positions.npy' % name),
+            index.positions)
+
+  application_names = sorted(set(
+      [component.application_id for component in components]
+      + [component_intent.intent.application_id
+         for component_intent in intents]))
+  application_indices = dict([(name, index) for index, name
+                              in enumerate(application_names)])
+  for name, elements in (
+      ('intent', [(component_intent.id, component_intent.intent.application_id)
+                  for component_intent in intents]),
+      ('component', [(component.id, component.application_id)
+                     for component in components]),
+      ('filter', [(intent_filter.id, intent_filter.application_id)
+                  for intent_filter in intent_filters])):
+    table = np.empty(max([element_id for element_id, _ in elements] or [-1])
+                     + 1, dtype=np.int32)
+    table.fill(-1)
+    for element_id, application in elements:
+      table[element_id] = application_indices[application]
+    np.save(os.path.join(index_directory, '%s_applications.npy' % name),
+            table)
+  # The application names are written last, since they mark complete indexes.
+  with open(os.path.join(index_directory, _APPLICATIONS), 'w') as names_file:
+    json.dump(application_names, names_file)
+
+
+def _HasCurrentIndex(path):
+  """Determines if saved indexes were written after the links."""
+
+  names_path = os.path.join(_IndexDirectory(path), _APPLICATIONS)
+  links_path = (os.path.join(path, write_results.MANIFEST)
+                if os.path.isdir(path) else path)
+  return (os.path.isfile(names_path)
+          and os.path.getmtime(names_path) >= os.path.getmtime(links_path))
+
+
+def _IndexDirectory(path):
+  """Returns the directory of the indexes of a link file or column directory."""
+
+  return path if os.path.isdir(path) else path + _INDEX_SUFFIX
@@ -0,0 +1,80 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2015 The Pennsylvania State University and the University of Wisconsin
+# Systems and Internet Infrastructure Security Laboratory
+#
+# Author: Damien Octeau
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+
+"""Tests for link_store module."""
+
+import bloscpack
+import numpy as np
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..'))
+
+from primo.linking import link_store
+from primo.linking import write_results
+
+
+class LinkStoreTest(unittest.TestCase):
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.path = os.path.join(self.directory, 'links.blp')
+    random_state = np.random.RandomState(0)
+    self.links = np.zeros(5000, dtype=write_results.DTYPE)
+    self.links['intent'] = random_state.randint(0, 300, self.links.size)
+    self.links['target'] = random_state.randint(0, 100, self.links.size)
+    self.links['explicit'] = random_state.randint(0, 2, self.links.size)
+    self.links['probability'] = random_state.randint(0, 101, self.links.size)
+    bloscpack.pack_ndarray_file(self.links, self.path)
+    self.shard_size = link_store.SHARD_SIZE
+    link_store.SHARD_SIZE = 16
+
+  def tearDown(self):
+    link_store.SHARD_SIZE = self.shard_size
+    shutil.rmtree(self.directory)
+
+  def assertSameLinks(self, actual, expected):
+    np.testing.assert_array_equal(np.sort(actual), np.sort(expected))
+
+  def testIntentLinks(self):
+    store = link_store.LinkStore(self.path)
+    for intent_id in [-1, 0, 17, 299, 300]:
+      self.assertSameLinks(
+          store.IntentLinks(intent_id, 50),
+          self.links[(self.links['intent'] == intent_id)
+                     & (self.links['probability'] >= 50)])
+
+  def testTargetLinks(self):
+    store = link_store.LinkStore(self.path)
+    for target_id in [0, 42, 99]:
+      for explicit in [False, True]:
+        self.assertSameLinks(
+            store.TargetLinks(target_id, explicit),
+            self.links[(self.links['target'] == target_id)
+                       & (self.links['explicit'] == explicit)])
+
+  def testApplicationLinksWithoutSavedIndexes(self):
+    store = link_store.LinkStore(self.path)
+    self.assertRaises(link_store.LinkStoreError, store.ApplicationLinks,
+                      u'app1')
+
+
+if __name__ == '__main__':
+  unittest.main()
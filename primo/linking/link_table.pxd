@@ -0,0 +1,49 @@
+# Copyright (C) 2015 The Pennsylvania State University and the University of Wisconsin
+# Systems and Internet Infrastructure Security Laboratory
+#
+# Author: Damien Octeau
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+cimport numpy as np
+
+from primo.linking.intents cimport ComponentIntent
+
+# Target flags.
+cdef enum:
+  COMPONENT_FLAG = 1
+  PERMISSION_FLAG = 2
+  INTRA_APP_FLAG = 4
+
+cdef class LinkTable(object):
+  cdef np.ndarray _intent_ids
+  cdef np.ndarray _intent_fields
+  cdef np.ndarray _offsets
+  cdef np.ndarray _targets
+  cdef np.ndarray _target_flags
+  cdef np.ndarray _probabilities
+  # Maps Intent ids to rows. It is built when it is first needed.
+  cdef dict _rows
+  # The number of Intents.
+  cdef readonly Py_ssize_t intent_count
+  # The number of links.
+  cdef readonly Py_ssize_t size
+
+  cpdef Append(self, ComponentIntent component_intent, list targets,
+               object probabilities)
+  cpdef AppendTable(self, LinkTable links)
+  cpdef Clear(self)
+  cpdef LinkTable Select(self, object link_mask)
+  cpdef LinkTable RemoveIntents(self, object intent_ids)
+  cpdef long IntentRow(self, long intent_id)
+  cdef void _Reserve(self, Py_ssize_t intent_count, Py_ssize_t size)
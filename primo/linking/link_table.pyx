@@ -0,0 +1,353 @@
+# Copyright (C) 2015 The Pennsylvania State University and the University of Wisconsin
+# Systems and Internet Infrastructure Security Laboratory
+#
+# Author: Damien Octeau
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compact storage of the links found for Intents.
+
+A LinkTable stores links in compressed sparse row form. Intents are rows, with
+their ids, their fields that are written with links and the offsets of their
+links. Links are stored in flat arrays of target ids, target flags and
+probabilities, so a link takes six bytes instead of a list entry pointing to a
+target object. The fields of Intents and the flags of targets are computed when
+links are appended, so links can be written and compared without their
+objects.
+
+Components, which are the targets of explicit Intents, and Intent Filters have
+separate ids, so targets are identified by keys that combine the
+TARGET_COMPONENT flag and target ids.
+"""
+
+cimport cython
+cimport numpy as np
+
+import numpy as np
+
+from primo.linking.components cimport Component
+from primo.linking.intent_filters cimport IntentFilter
+from primo.linking.intents cimport ComponentIntent
+from primo.linking.intents cimport Intent
+
+
+# Target flags.
+TARGET_COMPONENT = COMPONENT_FLAG
+TARGET_PERMISSION = PERMISSION_FLAG
+TARGET_INTRA_APP = INTRA_APP_FLAG
+
+# The number of Intent fields: explicit, data, library and extras.
+INTENT_FIELD_COUNT = 4
+
+_INITIAL_CAPACITY = 16
+
+
+cdef class LinkTable(object):
+  """The links of Intents in compressed sparse row form.
+
+  Each Intent should be appended once. Intents without links are not stored.
+  """
+
+  def __cinit__(self):
+    self._intent_ids = np.empty(_INITIAL_CAPACITY, dtype=np.int32)
+    self._intent_fields = np.empty((_INITIAL_CAPACITY, INTENT_FIELD_COUNT),
+                                   dtype=np.int8)
+    self._offsets = np.zeros(_INITIAL_CAPACITY + 1, dtype=np.int64)
+    self._targets = np.empty(_INITIAL_CAPACITY, dtype=np.int32)
+    self._target_flags = np.empty(_INITIAL_CAPACITY, dtype=np.int8)
+    self._probabilities = np.empty(_INITIAL_CAPACITY, dtype=np.int8)
+    self.intent_count = 0
+    self.size = 0
+    self._rows = None
+
+  def __reduce__(self):
+    return (MakeLinkTable, (self.IntentIds().copy(), self.IntentFields().copy(),
+                            self.Offsets().copy(), self.Targets().copy(),
+                            self.TargetFlags().copy(),
+                            self.Probabilities().copy()))
+
+  def __len__(self):
+    return self.size
+
+  @cython.boundscheck(False)
+  @cython.wraparound(False)
+  cpdef Append(self, ComponentIntent component_intent, list targets,
+               object probabilities):
+    """Appends the links of an Intent.
+
+    Args:
+      component_intent: A ComponentIntent object.
+      targets: The targets of the Intent, which are components or Intent
+      Filters.
+      probabilities: The link probabilities, or None if they were not
+      computed, in which case they are stored as 0.
+    """
+
+    cdef Py_ssize_t targets_size = len(targets)
+    if not targets_size:
+      return
+    self._Reserve(self.intent_count + 1, self.size + targets_size)
+
+    cdef Py_ssize_t row = self.intent_count
+    cdef Intent intent = component_intent.intent
+    cdef np.ndarray[np.int32_t] intent_ids = self._intent_ids
+    cdef np.ndarray[np.int8_t, ndim=2] intent_fields = self._intent_fields
+    intent_ids[row] = component_intent.id
+    intent_fields[row, 0] = 1 if intent.IsExplicit() else 0
+    if not intent.HasData():
+      intent_fields[row, 1] = 0
+    elif intent.HasImpreciseData():
+      intent_fields[row, 1] = 1
+    else:
+      intent_fields[row, 1] = 2
+    intent_fields[row, 2] = 1 if component_intent.library_exit_point else 0
+    intent_fields[row, 3] = 0 if intent.extra is None else 1
+
+    cdef np.ndarray[np.int32_t] target_ids = self._targets
+    cdef np.ndarray[np.int8_t] target_flags = self._target_flags
+    cdef unicode application_name = intent.application.name
+    cdef IntentFilter intent_filter
+    cdef Component component
+    cdef Py_ssize_t j = self.size
+    cdef np.int8_t flags
+    for target in targets:
+      if type(target) is IntentFilter:
+        intent_filter = target
+        component = intent_filter.component
+        target_ids[j] = intent_filter.id
+        flags = 0
+      elif type(target) is Component:
+        component = target
+        target_ids[j] = component.id
+        flags = COMPONENT_FLAG
+      else:
+        component = None
+        target_ids[j] = target.id
+        flags = 0
+        if target.permission is not None:
+          flags |= PERMISSION_FLAG
+        if application_name == target.application_id:
+          flags |= INTRA_APP_FLAG
+      if component is not None:
+        if component.permission is not None:
+          flags |= PERMISSION_FLAG
+        if application_name == component.application.name:
+          flags |= INTRA_APP_FLAG
+      target_flags[j] = flags
+      j += 1
+
+    if probabilities is None:
+      self._probabilities[self.size:j] = 0
+    else:
+      self._probabilities[self.size:j] = probabilities
+    self.size = j
+    self.intent_count += 1
+    self._offsets[self.intent_count] = j
+    self._rows = None
+
+  cpdef AppendTable(self, LinkTable links):
+    """Appends the links of another table.
+
+    Args:
+      links: A LinkTable whose Intents are not in this table.
+    """
+
+    if not links.intent_count:
+      return
+    self._Reserve(self.intent_count + links.intent_count,
+                  self.size + links.size)
+    cdef Py_ssize_t rows = self.intent_count
+    cdef Py_ssize_t start = self.size
+    self._intent_ids[rows:rows + links.intent_count] = links.IntentIds()
+    self._intent_fields[rows:rows + links.intent_count] = links.IntentFields()
+    self._offsets[rows + 1:rows + links.intent_count + 1] = (
+        links.Offsets()[1:] + start)
+    self._targets[start:start + links.size] = links.Targets()
+    self._target_flags[start:start + links.size] = links.TargetFlags()
+    self._probabilities[start:start + links.size] = links.Probabilities()
+    self.intent_count += links.intent_count
+    self.size += links.size
+    self._rows = None
+
+  cpdef Clear(self):
+    """Removes all links, keeping the allocated storage."""
+
+    self.intent_count = 0
+    self.size = 0
+    self._rows = None
+
+  cpdef LinkTable Select(self, object link_mask):
+    """Returns a table with a subset of the links.
+
+    Intents without selected links are not kept.
+
+    Args:
+      link_mask: A boolean array with one element per link.
+    """
+
+    link_mask = np.asarray(link_mask, dtype=np.bool_)
+    cumulative = np.zeros(self.size + 1, dtype=np.int64)
+    np.cumsum(link_mask, out=cumulative[1:])
+    offsets = self.Offsets()
+    sizes = cumulative[offsets[1:]] - cumulative[offsets[:-1]]
+    kept = sizes > 0
+    new_offsets = np.zeros(np.count_nonzero(kept) + 1, dtype=np.int64)
+    np.cumsum(sizes[kept], out=new_offsets[1:])
+    return MakeLinkTable(self.IntentIds()[kept], self.IntentFields()[kept],
+                         new_offsets, self.Targets()[link_mask],
+                         self.TargetFlags()[link_mask],
+                         self.Probabilities()[link_mask])
+
+  cpdef LinkTable RemoveIntents(self, object intent_ids):
+    """Returns a table without the links of given Intents.
+
+    Args:
+      intent_ids: An iterable of ComponentIntent ids.
+    """
+
+    intent_ids = np.fromiter(intent_ids, dtype=np.int32)
+    if not intent_ids.size:
+      return self
+    return self.Select(np.repeat(
+        ~np.in1d(self.IntentIds(), intent_ids), self.Sizes()))
+
+  cpdef long IntentRow(self, long intent_id):
+    """Returns the row of an Intent, or -1 if it has no links."""
+
+    if self._rows is None:
+      self._rows = dict([(row_id, row) for row, row_id
+                         in enumerate(self.IntentIds().tolist())])
+    return self._rows.get(intent_id, -1)
+
+  def IntentIds(self):
+    """Returns the ids of the Intents, one per row."""
+
+    return self._intent_ids[:self.intent_count]
+
+  def IntentFields(self):
+    """Returns the explicit, data, library and extras fields of the Intents."""
+
+    return self._intent_fields[:self.intent_count]
+
+  def Offsets(self):
+    """Returns the offsets of the links of each Intent, plus the link count."""
+
+    return self._offsets[:self.intent_count + 1]
+
+  def Sizes(self):
+    """Returns the number of links of each Intent."""
+
+    return np.diff(self.Offsets())
+
+  def Targets(self):
+    """Returns the ids of the targets of the links."""
+
+    return self._targets[:self.size]
+
+  def TargetFlags(self):
+    """Returns the TARGET_* flags of the targets of the links."""
+
+    return self._target_flags[:self.size]
+
+  def Probabilities(self):
+    """Returns the probabilities of the links."""
+
+    return self._probabilities[:self.size]
+
+  def LinkIntentIds(self):
+    """Returns the Intent id of each link."""
+
+    return np.repeat(self.IntentIds(), self.Sizes())
+
+  def TargetKeys(self):
+    """Returns the target key of each link."""
+
+    return TargetKeys(self.Targets(),
+                      (self.TargetFlags() & COMPONENT_FLAG) != 0)
+
+  def LinkKeys(self):
+    """Returns keys that identify links by their Intent and target."""
+
+    return ((self.LinkIntentIds().astype(np.int64) << 33)
+            | self.TargetKeys())
+
+  cdef void _Reserve(self, Py_ssize_t intent_count, Py_ssize_t size):
+    """Grows the arrays so that they can hold given numbers of rows and
+    links."""
+
+    cdef Py_ssize_t capacity = self._intent_ids.shape[0]
+    if intent_count > capacity:
+      capacity = max(intent_count, 2 * capacity)
+      self._intent_ids = _Grow(self._intent_ids, capacity, self.intent_count)
+      self._intent_fields = _Grow(self._intent_fields, capacity,
+                                  self.intent_count)
+      self._offsets = _Grow(self._offsets, capacity + 1,
+                            self.intent_count + 1)
+    capacity = self._targets.shape[0]
+    if size > capacity:
+      capacity = max(size, 2 * capacity)
+      self._targets = _Grow(self._targets, capacity, self.size)
+      self._target_flags = _Grow(self._target_flags, capacity, self.size)
+      self._probabilities = _Grow(self._probabilities, capacity, self.size)
+
+
+cdef np.ndarray _Grow(np.ndarray array, Py_ssize_t capacity, Py_ssize_t used):
+  """Returns a larger copy of the used elements of an array."""
+
+  cdef np.ndarray grown = np.empty((capacity,) + (<object> array).shape[1:],
+                                   dtype=array.dtype)
+  grown[:used] = array[:used]
+  return grown
+
+
+def MakeLinkTable(intent_ids, intent_fields, offsets, targets, target_flags,
+                  probabilities):
+  """Builds a LinkTable from its arrays.
+
+  Args:
+    intent_ids: The ids of the Intents.
+    intent_fields: The INTENT_FIELD_COUNT fields of each Intent.
+    offsets: The offsets of the links of each Intent, plus the link count.
+    targets: The target ids of the links.
+    target_flags: The TARGET_* flags of the targets.
+    probabilities: The link probabilities.
+  """
+
+  cdef LinkTable links = LinkTable()
+  links.intent_count = len(intent_ids)
+  links.size = len(targets)
+  links._intent_ids = np.array(intent_ids, dtype=np.int32)
+  links._intent_fields = np.array(intent_fields, dtype=np.int8).reshape(
+      links.intent_count, INTENT_FIELD_COUNT)
+  links._offsets = np.array(offsets, dtype=np.int64)
+  links._targets = np.array(targets, dtype=np.int32)
+  links._target_flags = np.array(target_flags, dtype=np.int8)
+  links._probabilities = np.array(probabilities, dtype=np.int8)
+  return links
+
+
+def TargetKeys(targets, components):
+  """Combines target ids and component flags into target keys.
+
+  Args:
+    targets: An array of target ids.
+    components: An array that indicates which targets are components.
+  """
+
+  return ((np.asarray(components, dtype=np.int64) << 32)
+          | (np.asarray(targets, dtype=np.int64) & 0xffffffff))
+
+
+def TargetKey(target):
+  """Returns the target key of a component or Intent Filter."""
+
+  return (int(type(target) is Component) << 32) | target.id
@@ -0,0 +1,108 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2015 The Pennsylvania State University and the University of Wisconsin
+# Systems and Internet Infrastructure Security Laboratory
+#
+# Author: Damien Octeau
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+
+"""Tests for link table module."""
+
+import cPickle
+import numpy as np
+import os.path
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..'))
+
+from primo.linking import link_table
+from primo.linking.applications import Application
+from primo.linking.intents import ComponentIntent
+from primo.linking.intents import Intent
+
+
+class MockTarget(object):
+  def __init__(self, _id, permission, application):
+    self.id = _id
+    self.permission = permission
+    self.application_id = application.name
+
+
+class LinkTableTest(unittest.TestCase):
+  def setUp(self):
+    application1 = Application(u'app1', None, 1, None)
+    application2 = Application(u'app2', None, 1, None)
+    intent1 = Intent(None, None, u'action1', None, None, None, None, None,
+                     None, None, 0, None, None, application1)
+    intent2 = Intent(None, None, u'action2', None, None, None, None, None,
+                     None, None, 0, None, None, application2)
+    self.intents = [
+        ComponentIntent(intent1, None, None, None, 0, (1,), False, 1),
+        ComponentIntent(intent2, None, None, None, 0, (2,), True, 2)]
+    self.links = link_table.LinkTable()
+    self.links.Append(self.intents[0],
+                      [MockTarget(1, None, application2),
+                       MockTarget(2, u'permission', application1)],
+                      np.array([10, 20]))
+    self.links.Append(self.intents[1], [], np.array([]))
+    self.links.Append(self.intents[1],
+                      [MockTarget(3, None, application2)] * 20,
+                      np.arange(20))
+
+  def testAppend(self):
+    self.assertEqual(self.links.intent_count, 2)
+    self.assertEqual(len(self.links), 22)
+    np.testing.assert_array_equal(self.links.IntentIds(), [1, 2])
+    np.testing.assert_array_equal(self.links.Offsets(), [0, 2, 22])
+    np.testing.assert_array_equal(self.links.IntentFields()[:, 2], [0, 1])
+    np.testing.assert_array_equal(
+        self.links.TargetFlags()[:3],
+        [0, link_table.TARGET_PERMISSION | link_table.TARGET_INTRA_APP,
+         link_table.TARGET_INTRA_APP])
+    np.testing.assert_array_equal(self.links.Probabilities()[:3], [10, 20, 0])
+    self.assertEqual(self.links.IntentRow(2), 1)
+    self.assertEqual(self.links.IntentRow(3), -1)
+
+  def testIntentRow(self):
+    # The first lookup builds the row index.
+    self.assertEqual(self.links.IntentRow(3), -1)
+    self.assertEqual(self.links.IntentRow(1), 0)
+    links = self.links.Select(np.ones(len(self.links), dtype=bool))
+    self.assertEqual(links.IntentRow(1), 0)
+    self.assertEqual(links.IntentRow(2), 1)
+
+  def testSelect(self):
+    mask = np.zeros(len(self.links), dtype=bool)
+    mask[1] = True
+    selected = self.links.Select(mask)
+    np.testing.assert_array_equal(selected.IntentIds(), [1])
+    np.testing.assert_array_equal(selected.Offsets(), [0, 1])
+    np.testing.assert_array_equal(selected.Targets(), [2])
+
+    removed = self.links.RemoveIntents([1])
+    np.testing.assert_array_equal(removed.IntentIds(), [2])
+    np.testing.assert_array_equal(removed.Offsets(), [0, 20])
+
+    removed.AppendTable(selected)
+    np.testing.assert_array_equal(removed.IntentIds(), [2, 1])
+    np.testing.assert_array_equal(removed.Offsets(), [0, 20, 21])
+    np.testing.assert_array_equal(removed.LinkKeys()[-1], (1 << 33) | 2)
+
+  def testPickle(self):
+    links = cPickle.loads(cPickle.dumps(self.links, cPickle.HIGHEST_PROTOCOL))
+    for name in ('IntentIds', 'IntentFields', 'Offsets', 'Targets',
+                 'TargetFlags', 'Probabilities'):
+      np.testing.assert_array_equal(getattr(links, name)(),
+                                    getattr(self.links, name)())
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,54 @@
+# Copyright (C) 2015 The Pennsylvania State University and the University of Wisconsin
+# Systems and Internet Infrastructure Security Laboratory
+#
+# Author: Damien Octeau
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Instrumented stages of link resolution. The first ones are the tests of
+# ImplicitLinkFinder.FindSharedCut, in the order of its stage constants.
+cdef enum:
+  IMPLICIT_ACTION
+  IMPLICIT_CATEGORY
+  IMPLICIT_KIND
+  IMPLICIT_DATA
+  IMPLICIT_INTENT_PERMISSION
+  IMPLICIT_PACKAGE
+  IMPLICIT_VISIBILITY
+  IMPLICIT_COMPONENT_PERMISSION
+  IMPLICIT_PROBABILITY
+  EXPLICIT_CLASS
+  EXPLICIT_PACKAGE
+  EXPLICIT_KIND
+  EXPLICIT_VISIBILITY
+  EXPLICIT_PROBABILITY
+  METRIC_STAGE_COUNT
+
+# Instrumented caches.
+cdef enum:
+  ATTRIBUTE_CACHE
+  ATTRIBUTE_BITMAP_CACHE
+  INTENT_GROUP_COUNTS_CACHE
+  SHARED_CUT_CACHE
+  PROBABILITY_CACHE
+  INTENT_FIELDS_CACHE
+  FILTER_MATCHES_CACHE
+  EXPLICIT_APPLICATIONS_CACHE
+  PROBABILITY_MEMO_CACHE
+  METRIC_CACHE_COUNT
+
+cdef bint MetricsEnabled()
+cdef double StageStart()
+cdef void RecordStage(int stage, double start, long input_size,
+                      long output_size)
+cdef void CountCache(int cache, bint hit)
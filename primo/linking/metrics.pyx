@@ -0,0 +1,321 @@
+# Copyright (C) 2015 The Pennsylvania State University and the University of Wisconsin
+# Systems and Internet Infrastructure Security Laboratory
+#
+# Author: Damien Octeau
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Instrumentation of the stages of link resolution.
+
+Stages record their number of calls, their cumulative time and histograms of
+the sizes of their input and output cuts. Sizes are counted in buckets of
+powers of two: bucket 0 holds empty cuts and bucket k holds sizes between
+2^(k-1) and 2^k - 1. Caches record their hits and misses.
+
+Cache counts are always kept, since they only cost an increment. Stages are
+only timed and measured after Enable has been called, so that cut sizes are
+not computed otherwise. Counters are kept in C arrays of this module, so that
+worker processes send theirs back with TakeMetrics and the parent process adds
+them with AddMetrics.
+
+Runs can also mark the end of their phases with MarkPhase, which records the
+wall time, CPU time and memory use of the process at that point.
+"""
+
+from posix.time cimport clock_gettime
+from posix.time cimport timespec
+from posix.time cimport CLOCK_MONOTONIC
+
+import csv
+import json
+import os
+import resource
+import time
+
+
+DEF SIZE_BUCKETS = 32
+
+STAGE_NAMES = ('implicit action', 'implicit category', 'implicit kind',
+               'implicit data', 'implicit intent permission',
+               'implicit package', 'implicit visibility',
+               'implicit component permission', 'implicit probability',
+               'explicit class', 'explicit package', 'explicit kind',
+               'explicit visibility', 'explicit probability')
+CACHE_NAMES = ('attribute', 'attribute bitmap', 'intent group counts',
+               'shared cut', 'probability', 'intent fields', 'filter matches',
+               'explicit applications', 'probability memo')
+
+# The marks recorded by MarkPhase.
+cdef list _PHASE_MARKS = []
+
+cdef bint _ENABLED = False
+cdef long _CALLS[METRIC_STAGE_COUNT]
+cdef double _TIMES[METRIC_STAGE_COUNT]
+cdef long _INPUT_TOTALS[METRIC_STAGE_COUNT]
+cdef long _OUTPUT_TOTALS[METRIC_STAGE_COUNT]
+cdef long _INPUT_SIZES[METRIC_STAGE_COUNT][SIZE_BUCKETS]
+cdef long _OUTPUT_SIZES[METRIC_STAGE_COUNT][SIZE_BUCKETS]
+# Hits and misses of each cache.
+cdef long _CACHE_COUNTS[METRIC_CACHE_COUNT][2]
+
+
+cdef bint MetricsEnabled():
+  """Determines if stages should be measured."""
+
+  return _ENABLED
+
+
+cdef double StageStart():
+  """Returns the start time of a stage, or 0 if stages are not measured."""
+
+  if not _ENABLED:
+    return 0
+  cdef timespec now
+  clock_gettime(CLOCK_MONOTONIC, &now)
+  return now.tv_sec + now.tv_nsec * 1e-9
+
+
+cdef void RecordStage(int stage, double start, long input_size,
+                      long output_size):
+  """Records a call to a stage.
+
+  Args:
+    stage: A stage constant.
+    start: The start time returned by StageStart.
+    input_size: The size of the input cut of the stage.
+    output_size: The size of the output cut of the stage.
+  """
+
+  if not _ENABLED:
+    return
+  cdef timespec now
+  clock_gettime(CLOCK_MONOTONIC, &now)
+  _CALLS[stage] += 1
+  _TIMES[stage] += now.tv_sec + now.tv_nsec * 1e-9 - start
+  _INPUT_TOTALS[stage] += input_size
+  _OUTPUT_TOTALS[stage] += output_size
+  _INPUT_SIZES[stage][_SizeBucket(input_size)] += 1
+  _OUTPUT_SIZES[stage][_SizeBucket(output_size)] += 1
+
+
+cdef void CountCache(int cache, bint hit):
+  """Counts a cache hit or miss.
+
+  Args:
+    cache: A cache constant.
+    hit: True for a hit, False for a miss.
+  """
+
+  _CACHE_COUNTS[cache][0 if hit else 1] += 1
+
+
+cdef inline int _SizeBucket(long size):
+  """Returns the histogram bucket of a cut size."""
+
+  cdef int bucket = 0
+  while size > 0 and bucket < SIZE_BUCKETS - 1:
+    size >>= 1
+    bucket += 1
+  return bucket
+
+
+def Enable(bint enabled=True):
+  """Enables or disables the measurement of stages."""
+
+  global _ENABLED
+  _ENABLED = enabled
+
+
+def Reset():
+  """Resets all counters."""
+
+  cdef int stage
+  cdef int bucket
+  for stage in range(METRIC_STAGE_COUNT):
+    _CALLS[stage] = 0
+    _TIMES[stage] = 0
+    _INPUT_TOTALS[stage] = 0
+    _OUTPUT_TOTALS[stage] = 0
+    for bucket in range(SIZE_BUCKETS):
+      _INPUT_SIZES[stage][bucket] = 0
+      _OUTPUT_SIZES[stage][bucket] = 0
+  cdef int cache
+  for cache in range(METRIC_CACHE_COUNT):
+    _CACHE_COUNTS[cache][0] = 0
+    _CACHE_COUNTS[cache][1] = 0
+
+
+def TakeMetrics():
+  """Returns all counters and resets them, for instance in a worker process.
+
+  Returns: A tuple of lists that can be passed to AddMetrics.
+  """
+
+  cdef int stage
+  cdef int cache
+  metrics = ([_CALLS[stage] for stage in range(METRIC_STAGE_COUNT)],
+             [_TIMES[stage] for stage in range(METRIC_STAGE_COUNT)],
+             [_INPUT_TOTALS[stage] for stage in range(METRIC_STAGE_COUNT)],
+             [_OUTPUT_TOTALS[stage] for stage in range(METRIC_STAGE_COUNT)],
+             [list(_INPUT_SIZES[stage]) for stage in range(METRIC_STAGE_COUNT)],
+             [list(_OUTPUT_SIZES[stage])
+              for stage in range(METRIC_STAGE_COUNT)],
+             [list(_CACHE_COUNTS[cache])
+              for cache in range(METRIC_CACHE_COUNT)])
+  Reset()
+  return metrics
+
+
+def AddMetrics(tuple metrics):
+  """Adds counters returned by TakeMetrics, for instance in another process."""
+
+  calls, times, input_totals, output_totals, input_sizes, output_sizes, \
+      cache_counts = metrics
+  cdef int stage
+  cdef int bucket
+  for stage in range(METRIC_STAGE_COUNT):
+    _CALLS[stage] += calls[stage]
+    _TIMES[stage] += times[stage]
+    _INPUT_TOTALS[stage] += input_totals[stage]
+    _OUTPUT_TOTALS[stage] += output_totals[stage]
+    for bucket in range(SIZE_BUCKETS):
+      _INPUT_SIZES[stage][bucket] += input_sizes[stage][bucket]
+      _OUTPUT_SIZES[stage][bucket] += output_sizes[stage][bucket]
+  cdef int cache
+  for cache in range(METRIC_CACHE_COUNT):
+    _CACHE_COUNTS[cache][0] += cache_counts[cache][0]
+    _CACHE_COUNTS[cache][1] += cache_counts[cache][1]
+
+
+def GetReport():
+  """Returns a report of all counters.
+
+  Returns: A map with a 'stages' map and a 'caches' map, keyed by stage and
+  cache names, and the 'size_buckets' labels of the size histograms. Size
+  histograms are truncated after the last bucket that is used by any stage.
+  """
+
+  cdef int stage
+  cdef int bucket
+  cdef int bucket_count = 1
+  for stage in range(METRIC_STAGE_COUNT):
+    for bucket in range(SIZE_BUCKETS):
+      if _INPUT_SIZES[stage][bucket] or _OUTPUT_SIZES[stage][bucket]:
+        bucket_count = max(bucket_count, bucket + 1)
+
+  stages = {}
+  for stage in range(METRIC_STAGE_COUNT):
+    stages[STAGE_NAMES[stage]] = {
+        'calls': _CALLS[stage],
+        'seconds': _TIMES[stage],
+        'mean_input_size': (float(_INPUT_TOTALS[stage]) / _CALLS[stage]
+                            if _CALLS[stage] else 0.0),
+        'mean_output_size': (float(_OUTPUT_TOTALS[stage]) / _CALLS[stage]
+                             if _CALLS[stage] else 0.0),
+        'input_sizes': list(_INPUT_SIZES[stage])[:bucket_count],
+        'output_sizes': list(_OUTPUT_SIZES[stage])[:bucket_count]}
+
+  caches = {}
+  cdef int cache
+  cdef long lookups
+  for cache in range(METRIC_CACHE_COUNT):
+    lookups = _CACHE_COUNTS[cache][0] + _CACHE_COUNTS[cache][1]
+    caches[CACHE_NAMES[cache]] = {
+        'hits': _CACHE_COUNTS[cache][0],
+        'misses': _CACHE_COUNTS[cache][1],
+        'hit_rate': (float(_CACHE_COUNTS[cache][0]) / lookups
+                     if lookups else 0.0)}
+
+  return {'stages': stages, 'caches': caches,
+          'size_buckets': [_BucketLabel(bucket)
+                           for bucket in range(bucket_count)]}
+
+
+def WriteReport(str destination):
+  """Writes the report of GetReport to a file.
+
+  Args:
+    destination: The path to the destination file. The report is written in
+    CSV format if it ends with .csv, with one row per value, and in JSON format
+    otherwise.
+  """
+
+  report = GetReport()
+  if not destination.endswith('.csv'):
+    with open(destination, 'w') as destination_file:
+      json.dump(report, destination_file, indent=2, sort_keys=True)
+    return
+
+  with open(destination, 'wb') as destination_file:
+    writer = csv.writer(destination_file)
+    writer.writerow(['section', 'name', 'metric', 'value'])
+    for name in STAGE_NAMES:
+      values = report['stages'][name]
+      for metric in ('calls', 'seconds', 'mean_input_size',
+                     'mean_output_size'):
+        writer.writerow(['stage', name, metric, values[metric]])
+      for metric in ('input_sizes', 'output_sizes'):
+        for label, count in zip(report['size_buckets'], values[metric]):
+          writer.writerow(['stage', name, '%s %s' % (metric, label), count])
+    for name in CACHE_NAMES:
+      values = report['caches'][name]
+      for metric in ('hits', 'misses', 'hit_rate'):
+        writer.writerow(['cache', name, metric, values[metric]])
+
+
+cdef str _BucketLabel(int bucket):
+  """Returns the range of sizes of a histogram bucket."""
+
+  if bucket < 2:
+    return str(bucket)
+  if bucket == SIZE_BUCKETS - 1:
+    return '%d+' % (1 << (bucket - 1))
+  return '%d-%d' % (1 << (bucket - 1), (1 << bucket) - 1)
+
+
+def MarkPhase(str name):
+  """Records the end of a phase of a run.
+
+  Args:
+    name: The name of the phase.
+  """
+
+  usage = resource.getrusage(resource.RUSAGE_SELF)
+  _PHASE_MARKS.append({'phase': name,
+                       'time': time.time(),
+                       'cpu_time': usage.ru_utime + usage.ru_stime,
+                       'rss': _CurrentRss(),
+                       # ru_maxrss is in kilobytes on Linux.
+                       'peak_rss': usage.ru_maxrss * 1024})
+
+
+def TakePhaseMarks():
+  """Returns the marks recorded by MarkPhase, in order, and clears them.
+
+  Returns: A list of maps with the phase name, the wall and CPU times in
+  seconds, and the current and peak resident set sizes in bytes. The current
+  size is None where it cannot be read.
+  """
+
+  marks = list(_PHASE_MARKS)
+  del _PHASE_MARKS[:]
+  return marks
+
+
+cdef object _CurrentRss():
+  """Returns the resident set size of the process in bytes, or None."""
+
+  try:
+    with open('/proc/self/statm') as statm_file:
+      return int(statm_file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+  except (IOError, OSError, ValueError):
+    return None
@@ -31,14 +31,19 @@ matplotlib.use('Agg')
 
 from matplotlib import pyplot
 from matplotlib import rcParams
-import bloscpack as bp
 import numpy as np
 
-from primo.linking.write_results cimport Row
+from primo.linking.write_results import IterLinkChunks
 
 
 FONT_SIZE = 22
 
+# Probabilities are integers between 0 and 100.
+_PROBABILITY_LEVELS = 101
+# Probability histograms are kept for each combination of explicit and
+# intra-application flags.
+_HISTOGRAM_COUNT = 4
+
 rcParams['axes.labelsize'] = FONT_SIZE
 rcParams['xtick.labelsize'] = FONT_SIZE
 rcParams['ytick.labelsize'] = FONT_SIZE
@@ -57,33 +62,79 @@ def MakePlotsAndStats(input, output):
   """Draws all plots and records various statistics to .tex files.
 
   Args:
-    input: The input links file.
+    input: The input links file or column directory.
     output: The output directory where the plots should be saved.
   """
 
   # This allows us to output numbers in the form 1,000,000 instead of 1000000.
   locale.setlocale(locale.LC_ALL, 'en_US.UTF-8')
-  logging.info('Loading file %s.', input)
-  cdef np.ndarray[Row] links = bp.unpack_ndarray_file(input)
-  logging.info('Loaded %d Intent links.', links.shape[0])
-
-  cdef np.ndarray[np.int32_t] intents = links[:]['intent']
+  logging.info('Computing statistics of Intent links in %s.', input)
+  cdef long link_count
+  cdef np.ndarray[np.int64_t, ndim=2] histograms
   cdef np.ndarray[np.int64_t] connectivities
+  link_count, histograms, connectivities = AccumulateStatistics(input)
+  logging.info('Finished computing statistics of %d Intent links.', link_count)
 
   with open(os.path.join(output, 'other-results.tex'), 'w') as results_file:
     results_file.write(locale.format_string(
-        '\\newcommand{\\linkcount}{%d}\n', links.size, grouping=True))
-    PlotPriorityDistribution(links, results_file, output)
-    PlotPriorityDistributionInterIntra(links, output)
-    logging.info('Computing Intent connectivities.')
-    connectivities = np.unique(intents, return_counts=True)[1]
-    logging.info('Finished computing Intent connectivities from Intent links.')
+        '\\newcommand{\\linkcount}{%d}\n', link_count, grouping=True))
+    PlotPriorityDistribution(histograms.sum(axis=0), results_file, output)
+    PlotPriorityDistributionInterIntra(histograms, output)
     ConnectivityCdf(connectivities, results_file, output)
     LinksCdf(connectivities, results_file, output)
 
 
+cdef tuple AccumulateStatistics(str input):
+  """Computes probability histograms and Intent connectivities in one pass.
+
+  Links are read one chunk at a time, so that memory use does not grow with the
+  number of links. Probabilities are integers between 0 and 100, so their
+  distribution is exactly described by the link count of each value.
+
+  Args:
+    input: The input links file or column directory.
+
+  Returns: A tuple with the number of links, the probability histograms and the
+  connectivities. Histograms are indexed by 2 * explicit + intra_app and by
+  probability. Connectivities are the link counts of Intents that have links, in
+  Intent id order.
+  """
+
+  cdef long link_count = 0
+  cdef np.ndarray[np.int64_t] histograms = np.zeros(
+      _HISTOGRAM_COUNT * _PROBABILITY_LEVELS, dtype=np.int64)
+  cdef np.ndarray[np.int64_t] intent_counts = np.zeros(0, dtype=np.int64)
+  for links in IterLinkChunks(
+      input, ['intent', 'explicit', 'probability', 'intra_app']):
+    link_count += links['intent'].size
+    keys = ((2 * links['explicit'].astype(np.intp) + links['intra_app'])
+            * _PROBABILITY_LEVELS + links['probability'])
+    histograms += np.bincount(keys, minlength=histograms.size)
+    chunk_counts = np.bincount(links['intent'])
+    if chunk_counts.size > intent_counts.size:
+      intent_counts = np.concatenate(
+          (intent_counts,
+           np.zeros(chunk_counts.size - intent_counts.size, dtype=np.int64)))
+    intent_counts[:chunk_counts.size] += chunk_counts
+
+  return (link_count,
+          histograms.reshape(_HISTOGRAM_COUNT, _PROBABILITY_LEVELS),
+          intent_counts[intent_counts > 0])
+
+
+cdef tuple HistogramValues(np.ndarray[np.int64_t] histogram):
+  """Returns the probabilities and link counts of a probability histogram.
+
+  Only the probabilities of at least one link are returned, so that plots have
+  the same range as plots of all link probabilities.
+  """
+
+  levels = np.flatnonzero(histogram)
+  return (levels.astype(np.float32) / 100, histogram[levels])
+
+
 cdef void PlotCdf(data, str xlabel, str ylabel, str destination, float x_min,
-                  float y_min, object bins):
+                  float y_min, object bins, weights=None):
   """Plots a cumulative distribution function.
 
   Args:
@@ -94,6 +145,8 @@ cdef void PlotCdf(data, str xlabel, str ylabel, str destination, float x_min,
     x_min: The lower bound for the X axis.
     y_min: The lower bound for the Y axis.
     bins: The histogram bins.
+    weights: The number of occurrences of each value of the data, or None if
+    values occur once.
   """
 
   cdef float x_max = data.max()
@@ -102,8 +155,8 @@ cdef void PlotCdf(data, str xlabel, str ylabel, str destination, float x_min,
   pyplot.ylabel(ylabel)
   pyplot.xscale('log')
   pyplot.grid(which='both', color='0.7')
-  vals, bins, _ = pyplot.hist(data, bins, normed=True, cumulative=True,
-                              histtype='step')
+  vals, bins, _ = pyplot.hist(data, bins, normed=True, weights=weights,
+                              cumulative=True, histtype='step')
   x_max = x_max + (x_max - x_min) / 200
   pyplot.xlim([x_min, x_max])
   pyplot.ylim([y_min, 1])
@@ -185,12 +238,14 @@ cdef int CountLessThan(data, threshold):
   return (data <= threshold).sum()
 
 
-cdef void PlotHistogram(data, str xlabel, str ylabel, str destination,
-                        yticks=None):
+cdef void PlotHistogram(data, weights, str xlabel, str ylabel,
+                        str destination, yticks=None):
   """Plots a histogram.
 
   Args:
     data: The data.
+    weights: The number of occurrences of each value of the data, or None if
+    values occur once.
     xlabel: The label for the X axis.
     ylabel: The label for the Y axis.
     destination: The path to the destination file.
@@ -199,7 +254,8 @@ cdef void PlotHistogram(data, str xlabel, str ylabel, str destination,
 
   figure = pyplot.figure()
   data = np.clip(data, 0, 1)
-  vals, bins, _ = pyplot.hist(data, 50, normed=False, cumulative=False)
+  vals, bins, _ = pyplot.hist(data, 50, normed=False, weights=weights,
+                              cumulative=False)
   pyplot.xlabel(xlabel)
   pyplot.ylabel(ylabel)
   pyplot.yscale('log', nonposy='clip')
@@ -209,80 +265,69 @@ cdef void PlotHistogram(data, str xlabel, str ylabel, str destination,
   pyplot.savefig(destination, bbox_inches='tight', pad_inches=0.1)
 
 
-cdef void PlotPriorityDistribution(np.ndarray[Row] intent_links,
+cdef void PlotPriorityDistribution(np.ndarray[np.int64_t] histogram,
                                    object results_file, str output):
   """Plots the distribution of probability values and writes some statistics to
   a .tex file.
 
   Args:
-    intent_links: The Intent links array.
+    histogram: The link count of each probability value.
     results_file: An open .tex file.
     output: The path to the destination directory.
   """
 
   logging.info('Plotting probability distribution CDF.')
 
-  cdef np.ndarray[np.float32_t] priorities = \
-      intent_links[:]['probability'].astype(np.float32)
-
-  priorities /= 100
+  priorities, counts = HistogramValues(histogram)
 
   PlotCdf(priorities, 'Probability $P_{i, f}$ (log scale)',
           'CDF of links',
           os.path.join(output, 'probability_cdf.pdf'), 1e-2, 0.95,
-          np.linspace(0, 1, 500))
+          np.linspace(0, 1, 500), counts)
   logging.info('Finished plotting probability distribution CDF.')
 
   logging.info('Plotting probability distribution histogram.')
-  PlotHistogram(priorities, 'Probability $P_{i, f}$',
+  PlotHistogram(priorities, counts, 'Probability $P_{i, f}$',
                 'Link count (log scale)',
                 os.path.join(output, 'probability_hist.pdf'))
   logging.info('Finished plotting probability distribution histogram.')
 
 
-cdef void PlotPriorityDistributionInterIntra(np.ndarray[Row] links, str output):
+cdef void PlotPriorityDistributionInterIntra(
+    np.ndarray[np.int64_t, ndim=2] histograms, str output):
   """Plots the distribution of probabilities for various combinations of
   explicit/implicit Intents and inter/intra-application links.
 
   Args:
-    links: The Intent links.
+    histograms: The probability histograms, indexed by 2 * explicit + intra_app.
     output: The path to the output directory.
   """
 
   logging.info('Plotting probability distribution by inter/intra app Intent.')
 
-  cdef np.ndarray[np.float32_t] data
-  data = links[(links[:]['explicit'] == 1) &
-               (links[:]['intra_app'] == 1)][:]['probability'].astype(
-                   np.float32)
   rcParams['axes.labelsize'] = 32
   rcParams['xtick.labelsize'] = 32
   rcParams['ytick.labelsize'] = 32
   rcParams['legend.fontsize'] = 32
-  data /= 100
-  PlotHistogram(data, 'Probability $P_{i, f}$', 'Link count (log scale)',
+  data, counts = HistogramValues(histograms[3])
+  PlotHistogram(data, counts, 'Probability $P_{i, f}$',
+                'Link count (log scale)',
                 os.path.join(output, 'expl_intra.pdf'))
 
-  data = links[(links[:]['explicit'] == 1) &
-               (links[:]['intra_app'] == 0)][:]['probability'].astype(
-                   np.float32)
-  data /= 100
-  PlotHistogram(data, 'Probability $P_{i, f}$', 'Link count (log scale)',
+  data, counts = HistogramValues(histograms[2])
+  PlotHistogram(data, counts, 'Probability $P_{i, f}$',
+                'Link count (log scale)',
                 os.path.join(output, 'expl_inter.pdf'))
 
-  data = links[(links[:]['explicit'] == 0) &
-               (links[:]['intra_app'] == 0)][:]['probability'].astype(
-                   np.float32)
-  data /= 100
-  PlotHistogram(data, 'Probability $P_{i, f}$', 'Link count (log scale)',
+  data, counts = HistogramValues(histograms[0])
+  PlotHistogram(data, counts, 'Probability $P_{i, f}$',
+                'Link count (log scale)',
                 os.path.join(output, 'impl_inter.pdf'),
                 yticks=[1, 1e2, 1e4, 1e6, 1e8])
 
-  data = links[(links[:]['explicit'] == 0) &
-               (links[:]['intra_app'] == 1)][:]['probability'].astype(
-                   np.float32)
-  data /= 100
-  PlotHistogram(data, 'Probability $P_{i, f}$', 'Link count (log scale)',
+  data, counts = HistogramValues(histograms[1])
+  PlotHistogram(data, counts, 'Probability $P_{i, f}$',
+                'Link count (log scale)',
                 os.path.join(output, 'impl_intra.pdf'))
   logging.info('Finished plotting histograms.')
   rcParams['axes.labelsize'] = FONT_SIZE
@@ -0,0 +1,200 @@
+# Copyright (C) 2015 The Pennsylvania State University and the University of Wisconsin
+# Systems and Internet Infrastructure Security Laboratory
+#
+# Author: Damien Octeau
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Persistent memo of implicit link probabilities.
+
+The probability of a link between an imprecise Intent and an Intent Filter
+only depends on the fields of the Intent, on the short descriptor of the Intent
+Filter, on the precise Intents that match Intent Filters with that short
+descriptor and on the training data, which is the set of precise Intents. A
+ProbabilityMemo stores these probabilities in an SQLite file, so that later
+runs over a mostly unchanged corpus reuse them instead of computing them again.
+
+Keys are SHA-1 digests of the Intent descriptor, of the short descriptor of
+the Intent Filter and of the descriptors of its matching precise Intents. The
+file also records a fingerprint of the training data. When it differs from the
+fingerprint of the current training data, all probabilities are deleted before
+the memo is used.
+
+Stored probabilities are loaded when the memo is opened. New probabilities are
+written by Flush, which can be called from worker processes: each process uses
+its own SQLite connection.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+# This should be incremented whenever the keys or the meaning of stored
+# probabilities change.
+MEMO_VERSION = 1
+
+# The number of new probabilities after which they are written.
+_FLUSH_SIZE = 100000
+# The number of seconds to wait for another process to release a lock.
+_TIMEOUT = 60
+
+
+class ProbabilityMemo(object):
+  """An on-disk memo of implicit link probabilities."""
+
+  def __init__(self, path, fingerprint):
+    """Opens a memo file, clearing it if the training data changed.
+
+    Args:
+      path: The path to the SQLite file. It is created if needed.
+      fingerprint: The fingerprint of the current training data, from
+      TrainingFingerprint.
+    """
+
+    self._path = path
+    self._connection = None
+    self._pid = None
+    self._pending = {}
+    connection = self._Connect()
+    connection.execute('CREATE TABLE IF NOT EXISTS metadata '
+                       '(name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+    connection.execute('CREATE TABLE IF NOT EXISTS probabilities '
+                       '(key BLOB PRIMARY KEY, probability INTEGER NOT NULL)')
+    metadata = dict(connection.execute('SELECT name, value FROM metadata'))
+    if (metadata.get('version') != str(MEMO_VERSION)
+        or metadata.get('fingerprint') != fingerprint):
+      self.Invalidate(fingerprint)
+    self._entries = dict([(str(key), probability) for key, probability
+                          in connection.execute(
+                              'SELECT key, probability FROM probabilities')])
+    LOGGER.info('Loaded %d memoized probabilities from %s.',
+                len(self._entries), path)
+
+  def __len__(self):
+    return len(self._entries)
+
+  def Get(self, key):
+    """Returns a memoized probability, or None if it is not known."""
+
+    return self._entries.get(key)
+
+  def Put(self, key, probability):
+    """Memoizes a probability. It is written by the next Flush."""
+
+    self._entries[key] = probability
+    self._pending[key] = probability
+    if len(self._pending) >= _FLUSH_SIZE:
+      self.Flush()
+
+  def Flush(self):
+    """Writes new probabilities to the file.
+
+    Returns: The number of written probabilities.
+    """
+
+    count = len(self._pending)
+    if not count:
+      return 0
+    connection = self._Connect()
+    with connection:
+      connection.executemany(
+          'INSERT OR REPLACE INTO probabilities VALUES (?, ?)',
+          [(buffer(key), probability)
+           for key, probability in self._pending.iteritems()])
+    self._pending.clear()
+    return count
+
+  def Invalidate(self, fingerprint):
+    """Deletes all probabilities and records new training data.
+
+    Args:
+      fingerprint: The fingerprint of the new training data.
+    """
+
+    connection = self._Connect()
+    with connection:
+      count = connection.execute('DELETE FROM probabilities').rowcount
+      connection.executemany(
+          'INSERT OR REPLACE INTO metadata VALUES (?, ?)',
+          [('version', str(MEMO_VERSION)), ('fingerprint', fingerprint)])
+    self._entries = {}
+    self._pending.clear()
+    if count > 0:
+      LOGGER.info('Training data changed, deleted %d memoized probabilities.',
+                  count)
+
+  def Close(self):
+    """Writes new probabilities and closes the file."""
+
+    self.Flush()
+    if self._connection is not None and self._pid == os.getpid():
+      self._connection.close()
+    self._connection = None
+
+  def _Connect(self):
+    """Returns the connection of the current process."""
+
+    if self._pid != os.getpid():
+      # Connections cannot be shared with forked processes.
+      self._connection = sqlite3.connect(self._path, timeout=_TIMEOUT)
+      self._pid = os.getpid()
+    return self._connection
+
+
+def TrainingFingerprint(descriptors):
+  """Computes the fingerprint of training data.
+
+  Args:
+    descriptors: The descriptors of the precise Intents.
+
+  Returns: A hexadecimal digest that does not depend on the order of the
+  descriptors.
+  """
+
+  digest = hashlib.sha1()
+  for descriptor in sorted([repr(descriptor) for descriptor in descriptors]):
+    digest.update(descriptor)
+    digest.update('\n')
+  return digest.hexdigest()
+
+
+def FilterKey(short_descriptor, match_descriptors):
+  """Computes the part of memo keys that comes from an Intent Filter.
+
+  Args:
+    short_descriptor: The short descriptor of the Intent Filter.
+    match_descriptors: The descriptors of the precise Intents that match the
+    Intent Filter.
+  """
+
+  digest = hashlib.sha1(repr(short_descriptor))
+  for descriptor in sorted([repr(descriptor)
+                            for descriptor in match_descriptors]):
+    digest.update('\n')
+    digest.update(descriptor)
+  return digest.digest()
+
+
+def ProbabilityKey(intent_descriptor, filter_key):
+  """Computes the memo key of a link.
+
+  Args:
+    intent_descriptor: The descriptor of the Intent.
+    filter_key: The key of the Intent Filter, from FilterKey.
+  """
+
+  return hashlib.sha1(repr(intent_descriptor) + filter_key).digest()
@@ -0,0 +1,77 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2015 The Pennsylvania State University and the University of Wisconsin
+# Systems and Internet Infrastructure Security Laboratory
+#
+# Author: Damien Octeau
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+
+"""Tests for probability memo module."""
+
+import os.path
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..'))
+
+from primo.linking import probability_memo
+
+
+class ProbabilityMemoTest(unittest.TestCase):
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.path = os.path.join(self.directory, 'memo.db')
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def testReuse(self):
+    filter_key = probability_memo.FilterKey((u'action',), [(u'a',), (u'b',)])
+    key = probability_memo.ProbabilityKey((u'intent',), filter_key)
+    fingerprint = probability_memo.TrainingFingerprint([(u'a',), (u'b',)])
+
+    memo = probability_memo.ProbabilityMemo(self.path, fingerprint)
+    self.assertIsNone(memo.Get(key))
+    memo.Put(key, 42)
+    self.assertEqual(memo.Get(key), 42)
+    memo.Close()
+
+    memo = probability_memo.ProbabilityMemo(
+        self.path, probability_memo.TrainingFingerprint([(u'b',), (u'a',)]))
+    self.assertEqual(len(memo), 1)
+    self.assertEqual(memo.Get(key), 42)
+    memo.Close()
+
+  def testInvalidation(self):
+    key = probability_memo.ProbabilityKey(
+        (u'intent',), probability_memo.FilterKey((u'action',), []))
+    memo = probability_memo.ProbabilityMemo(
+        self.path, probability_memo.TrainingFingerprint([(u'a',)]))
+    memo.Put(key, 42)
+    memo.Close()
+
+    memo = probability_memo.ProbabilityMemo(
+        self.path, probability_memo.TrainingFingerprint([(u'a',), (u'b',)]))
+    self.assertEqual(len(memo), 0)
+    self.assertIsNone(memo.Get(key))
+    memo.Close()
+
+  def testFilterKey(self):
+    self.assertEqual(
+        probability_memo.FilterKey((u'action',), [(u'a',), (u'b',)]),
+        probability_memo.FilterKey((u'action',), [(u'b',), (u'a',)]))
+    self.assertNotEqual(probability_memo.FilterKey((u'action',), [(u'a',)]),
+                        probability_memo.FilterKey((u'action',), []))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,29 @@
+# Copyright (C) 2015 The Pennsylvania State University and the University of Wisconsin
+# Systems and Internet Infrastructure Security Laboratory
+#
+# Author: Damien Octeau
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from primo.linking.find_explicit_links cimport ExplicitLinkFinder
+from primo.linking.find_implicit_links cimport ImplicitLinkFinder
+from primo.linking.write_results cimport LinkWriter
+
+cdef tuple FindLinksWithWorkers(list precise_intents, list imprecise_intents,
+                                bint skip_empty, set components,
+                                set intent_filters, bint include_attributes,
+                                int workers,
+                                ExplicitLinkFinder explicit_link_finder,
+                                ImplicitLinkFinder implicit_link_finder,
+                                bint group_intents,
+                                LinkWriter link_writer=?)
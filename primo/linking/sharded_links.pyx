@@ -0,0 +1,233 @@
+# Copyright (C) 2015 The Pennsylvania State University and the University of Wisconsin
+# Systems and Internet Infrastructure Security Laboratory
+#
+# Author: Damien Octeau
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Link resolution with several worker processes.
+
+Workers are forked after the target and Intent data have been built, so they
+share it with the parent process through copy-on-write. Each worker resolves a
+shard of Intents and sends its links back as a LinkTable. Intent and target ids
+are assigned before workers are forked, so they are the same in all processes.
+
+Precise Intents are resolved first. Their matches with Intent Filters and their
+explicit link counts are merged into the parent process before workers are
+forked again for imprecise Intents, since the probabilities of imprecise links
+depend on them.
+"""
+
+from primo.linking.find_explicit_links cimport ExplicitLinkFinder
+from primo.linking.find_implicit_links cimport ImplicitLinkFinder
+from primo.linking.intents cimport ComponentIntent
+from primo.linking.link_table cimport LinkTable
+from primo.linking.write_results cimport LinkWriter
+
+import logging
+import multiprocessing
+
+import primo.linking.find_links
+from primo.linking import attribute_matching
+from primo.linking import metrics
+
+
+LOGGER = logging.getLogger(__name__)
+
+# The state shared with workers. It is set before workers are forked.
+cdef tuple _SHARED_STATE = None
+
+
+cdef tuple FindLinksWithWorkers(list precise_intents, list imprecise_intents,
+                                bint skip_empty, set components,
+                                set intent_filters, bint include_attributes,
+                                int workers,
+                                ExplicitLinkFinder explicit_link_finder,
+                                ImplicitLinkFinder implicit_link_finder,
+                                bint group_intents,
+                                LinkWriter link_writer=None):
+  """Computes the links between Intents and Intent Filters with workers.
+
+  Args:
+    precise_intents: A list of precise Intents.
+    imprecise_intents: A list of imprecise Intents.
+    skip_empty: Indicates whether empty Intents should be skipped.
+    components: The set of potential target components.
+    intent_filters: The set of potential target Intent Filters.
+    include_attributes: If True, link probabilities will be computed.
+    workers: The number of worker processes.
+    explicit_link_finder: The ExplicitLinkFinder to be used. Explicit link
+    counts are added to it.
+    implicit_link_finder: The ImplicitLinkFinder to be used. Precise Intent
+    matches are added to it.
+    group_intents: Indicates whether equal Intents should be resolved once.
+    link_writer: If not None, a LinkWriter to which the links of each shard are
+    written as it is merged, instead of being added to the returned Intent
+    links.
+
+  Returns: A tuple with the same structure as the result of
+  find_links.FindLinksForIntents.
+  """
+
+  global _SHARED_STATE
+
+  # Equal Intents are put next to each other, so that most of them are in the
+  # same shard when they are grouped.
+  precise_intents = sorted(precise_intents, key=_IntentSortKey)
+  imprecise_intents = sorted(imprecise_intents, key=_IntentSortKey)
+  cdef LinkTable intent_links = LinkTable()
+  cdef list totals = [0, 0, 0, 0, 0.0]
+
+  try:
+    LOGGER.info('Started processing precise Intents with %d workers.',
+                workers)
+    _SHARED_STATE = (precise_intents, True, skip_empty, components,
+                     intent_filters, include_attributes, explicit_link_finder,
+                     implicit_link_finder, group_intents)
+    for result in _RunShards(len(precise_intents), workers):
+      _MergeShardResult(result, precise_intents, intent_links, totals,
+                        explicit_link_finder, implicit_link_finder,
+                        link_writer)
+    LOGGER.info('Done processing precise Intents.')
+
+    LOGGER.info('Started processing imprecise Intents with %d workers.',
+                workers)
+    _SHARED_STATE = (imprecise_intents, False, skip_empty, components,
+                     intent_filters, include_attributes, explicit_link_finder,
+                     implicit_link_finder, group_intents)
+    for result in _RunShards(len(imprecise_intents), workers):
+      _MergeShardResult(result, imprecise_intents, intent_links, totals,
+                        explicit_link_finder, implicit_link_finder,
+                        link_writer)
+    LOGGER.info('Done processing imprecise Intents.')
+  finally:
+    _SHARED_STATE = None
+
+  return (intent_links, totals[0], totals[1], totals[2], totals[3], totals[4],
+          explicit_link_finder)
+
+
+cdef object _IntentSortKey(ComponentIntent component_intent):
+  return hash(component_intent.intent)
+
+
+cdef list _RunShards(int intent_count, int workers):
+  """Forks workers and resolves shards of the shared Intents.
+
+  Args:
+    intent_count: The number of shared Intents.
+    workers: The number of worker processes.
+
+  Returns: The list of shard results.
+  """
+
+  if intent_count == 0:
+    return []
+
+  cdef int shard_size = max(1, intent_count // (4 * workers))
+  cdef list shards = [(start, min(start + shard_size, intent_count))
+                      for start in range(0, intent_count, shard_size)]
+  pool = multiprocessing.Pool(workers)
+  try:
+    return pool.map(ResolveShard, shards, 1)
+  finally:
+    pool.close()
+    pool.join()
+
+
+def ResolveShard(tuple shard):
+  """Resolves a shard of the shared Intents in a worker process.
+
+  Args:
+    shard: The start and end indices of the shard in the shared Intents.
+
+  Returns: A tuple with the LinkTable of the shard, the counts returned by
+  find_links.FindLinksForIntents, the precise Intent matches, the explicit link
+  counts, the test plan counts, the stage and cache metrics and the pattern
+  cache counts. Precise Intent matches map Intent Filter descriptors to Intent
+  indices.
+  """
+
+  cdef list intents
+  cdef bint precise
+  cdef ExplicitLinkFinder explicit_link_finder
+  cdef ImplicitLinkFinder implicit_link_finder
+  (intents, precise, skip_empty, components, intent_filters,
+   include_attributes, explicit_link_finder, implicit_link_finder,
+   group_intents) = _SHARED_STATE
+
+  cdef int start = shard[0]
+  cdef list shard_intents = intents[start:shard[1]]
+  if precise:
+    # Only the counts and matches of this shard are sent back.
+    explicit_link_finder = ExplicitLinkFinder()
+    implicit_link_finder.SetState({})
+  implicit_link_finder.TakePlanCounts()
+  # Counts inherited from the parent process are discarded.
+  metrics.TakeMetrics()
+  attribute_matching.TakePatternCacheCounts()
+
+  intent_links, link_count, skipped_empty, intent_count, explicit_count, \
+      attribute_time, _ = primo.linking.find_links.FindLinksForIntents(
+          shard_intents if precise else [], [] if precise else shard_intents,
+          skip_empty, components, intent_filters, include_attributes, False,
+          explicit_link_finder, implicit_link_finder, group_intents)
+  # Probabilities memoized by this worker are written by the worker.
+  implicit_link_finder.FlushMemo()
+
+  matches = None
+  explicit_counts = None
+  cdef ComponentIntent shard_intent
+  if precise:
+    positions = {}
+    for index, shard_intent in enumerate(shard_intents):
+      positions.setdefault(shard_intent.intent, start + index)
+    matches = dict([(descriptor, [positions[intent] for intent in intent_set])
+                    for descriptor, intent_set
+                    in implicit_link_finder.GetState().iteritems()])
+    explicit_counts = explicit_link_finder.GetCounts()
+
+  return (intent_links,
+          (link_count, skipped_empty, intent_count, explicit_count,
+           attribute_time), matches, explicit_counts,
+          implicit_link_finder.TakePlanCounts(), metrics.TakeMetrics(),
+          attribute_matching.TakePatternCacheCounts())
+
+
+cdef void _MergeShardResult(tuple result, list intents,
+                            LinkTable intent_links, list totals,
+                            ExplicitLinkFinder explicit_link_finder,
+                            ImplicitLinkFinder implicit_link_finder,
+                            LinkWriter link_writer):
+  """Merges the result of ResolveShard into the parent process."""
+
+  (links, counts, matches, explicit_counts, plan_counts, shard_metrics,
+   pattern_cache_counts) = result
+  if link_writer is not None:
+    link_writer.WriteTable(links)
+  else:
+    intent_links.AppendTable(links)
+  for index, count in enumerate(counts):
+    totals[index] += count
+
+  cdef ComponentIntent component_intent
+  if matches is not None:
+    for descriptor, intent_indices in matches.iteritems():
+      for intent_index in intent_indices:
+        component_intent = intents[intent_index]
+        implicit_link_finder.AddPreciseIntentMatch(descriptor,
+                                                   component_intent.intent)
+  if explicit_counts is not None:
+    explicit_link_finder.AddCounts(explicit_counts[0], explicit_counts[1])
+  implicit_link_finder.AddPlanCounts(plan_counts)
+  metrics.AddMetrics(shard_metrics)
+  attribute_matching.AddPatternCacheCounts(pattern_cache_counts)
@@ -0,0 +1,145 @@
+# Copyright (C) 2015 The Pennsylvania State University and the University of Wisconsin
+# Systems and Internet Infrastructure Security Laboratory
+#
+# Author: Damien Octeau
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Module for saving and loading snapshots of a compiled corpus.
+
+A snapshot contains the applications, components, Intents and Intent Filters
+built from protobufs, together with the global target and Intent data. Loading
+a snapshot replaces fetching data from protobufs. A snapshot may also contain
+the links computed for the corpus, which are used for incremental updates.
+
+The file format is a fixed-size header (magic string, format version and SHA-1
+digest of the payload) followed by the zlib-compressed pickled payload.
+"""
+
+import cPickle
+import hashlib
+import logging
+import struct
+import zlib
+
+from primo.linking import applications as applications_mod
+from primo.linking import components as components_mod
+from primo.linking import fetch_data
+from primo.linking import intent_data
+from primo.linking import intent_filters as intent_filters_mod
+from primo.linking import intents as intents_mod
+from primo.linking import interning
+from primo.linking import target_data
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+# This should be incremented whenever the content of snapshots changes.
+SNAPSHOT_VERSION = 6
+
+_MAGIC = 'PRIMOSNP'
+_HEADER = struct.Struct('<8sI20s')
+
+
+class SnapshotError(Exception):
+  """Raised when a snapshot cannot be loaded."""
+
+
+def WriteSnapshot(destination, apps, components, intents, intent_filters,
+                  validate, link_state=None):
+  """Writes a snapshot of the current corpus to a file.
+
+  This should be called after fetching data. If link_state is not None, this
+  should be called after computing links.
+
+  Args:
+    destination: The path to the snapshot file.
+    apps: The set of applications.
+    components: The set of components.
+    intents: The list of Intents.
+    intent_filters: The set of Intent Filters.
+    validate: True if validation is being performed.
+    link_state: If not None, a tuple with the LinkTable of Intent links and the
+    state of the ImplicitLinkFinder that computed them.
+  """
+
+  LOGGER.info('Writing snapshot to %s.', destination)
+  # Applications come first, so that every object is first reached from the
+  # root of the object graph and reference cycles only go through pickled state.
+  state = (apps, components, intents, intent_filters, validate,
+           (fetch_data.exit_point_count, fetch_data.intent_count,
+            fetch_data.intent_filter_count),
+           applications_mod.GetState(), components_mod.GetState(),
+           intent_filters_mod.GetState(), intents_mod.GetState(),
+           target_data.GetState(), intent_data.GetState(),
+           interning.GetState(), link_state)
+  payload = zlib.compress(cPickle.dumps(state, cPickle.HIGHEST_PROTOCOL))
+  with open(destination, 'wb') as snapshot_file:
+    snapshot_file.write(_HEADER.pack(_MAGIC, SNAPSHOT_VERSION,
+                                     hashlib.sha1(payload).digest()))
+    snapshot_file.write(payload)
+  LOGGER.info('Wrote snapshot of %d bytes.', _HEADER.size + len(payload))
+
+
+def ReadSnapshot(source, validate):
+  """Loads a corpus snapshot and restores global data.
+
+  This should be called instead of fetching data, in a fresh process.
+
+  Args:
+    source: The path to the snapshot file.
+    validate: True if validation is being performed.
+
+  Returns: A tuple with the set of applications, the set of components, the list
+  of Intents, the set of Intent Filters and the link state (None if the
+  snapshot does not contain links).
+  """
+
+  LOGGER.info('Loading snapshot %s.', source)
+  with open(source, 'rb') as snapshot_file:
+    header = snapshot_file.read(_HEADER.size)
+    payload = snapshot_file.read()
+
+  if len(header) != _HEADER.size:
+    raise SnapshotError('%s is not a snapshot.' % source)
+  magic, version, digest = _HEADER.unpack(header)
+  if magic != _MAGIC:
+    raise SnapshotError('%s is not a snapshot.' % source)
+  if version != SNAPSHOT_VERSION:
+    raise SnapshotError('Snapshot %s has version %s, expected %s.'
+                        % (source, version, SNAPSHOT_VERSION))
+  if hashlib.sha1(payload).digest() != digest:
+    raise SnapshotError('Snapshot %s is corrupted.' % source)
+
+  (apps, components, intents, intent_filters, snapshot_validate, counts,
+   applications_state, components_state, intent_filters_state, intents_state,
+   target_state, intent_state, interning_state,
+   link_state) = cPickle.loads(zlib.decompress(payload))
+  if bool(snapshot_validate) != bool(validate):
+    # Imprecise Intent Filters are skipped when building a corpus for
+    # validation.
+    raise SnapshotError('Snapshot %s was not built for the same validation '
+                        'mode.' % source)
+
+  (fetch_data.exit_point_count, fetch_data.intent_count,
+   fetch_data.intent_filter_count) = counts
+  applications_mod.SetState(applications_state)
+  components_mod.SetState(components_state)
+  intent_filters_mod.SetState(intent_filters_state)
+  intents_mod.SetState(intents_state)
+  target_data.SetState(target_state)
+  intent_data.SetState(intent_state)
+  interning.SetState(interning_state)
+
+  LOGGER.info('Loaded %d applications from snapshot.', len(apps))
+  return apps, components, intents, intent_filters, link_state
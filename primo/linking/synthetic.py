@@ -0,0 +1,366 @@
+# Copyright (C) 2015 The Pennsylvania State University and the University of Wisconsin
+# Systems and Internet Infrastructure Security Laboratory
+#
+# Author: Damien Octeau
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Generation of synthetic corpora of IC3 Application protobufs.
+
+Synthetic corpora can be shared and scaled freely, unlike corpora of real
+applications. Action and category values are drawn from Zipf-like
+distributions, where the value of rank r has a weight proportional to
+1 / r^skew, since a few values account for most Intents and Intent Filters in
+real corpora. MIME types are drawn from a weighted mix. Intent fields can be
+made fully imprecise ((.*)) or partially imprecise (a prefix followed by
+(.*)), as they are when string analysis cannot find their values.
+"""
+
+import bisect
+import logging
+import os
+import random
+
+import gflags
+
+from primo.linking import ic3_data_pb2
+
+
+FLAGS = gflags.FLAGS
+gflags.DEFINE_integer('app_count', 100, 'Number of synthetic applications.')
+gflags.DEFINE_integer('components_per_app', 4,
+                      'Average number of components of an application.')
+gflags.DEFINE_integer('filters_per_component', 1,
+                      'Average number of Intent Filters of a component.')
+gflags.DEFINE_integer('exit_points_per_component', 2,
+                      'Average number of exit points of a component.')
+gflags.DEFINE_integer('action_count', 200, 'Number of distinct actions.')
+gflags.DEFINE_float('action_skew', 1.1,
+                    'Exponent of the Zipf-like distribution of actions.')
+gflags.DEFINE_integer('category_count', 50, 'Number of distinct categories.')
+gflags.DEFINE_float('category_skew', 1.1,
+                    'Exponent of the Zipf-like distribution of categories.')
+gflags.DEFINE_list('mime_types', None,
+                   ('Comma-separated MIME types with their weights, as '
+                    'type:weight. Defaults to a mix of common types.'))
+gflags.DEFINE_float('mime_fraction', 0.3,
+                    'Fraction of Intents and Intent Filters with a MIME type.')
+gflags.DEFINE_float('data_fraction', 0.3,
+                    'Fraction of Intents and Intent Filters with a URI.')
+gflags.DEFINE_float('explicit_fraction', 0.3, 'Fraction of explicit Intents.')
+gflags.DEFINE_float('permission_fraction', 0.1,
+                    ('Fraction of applications, components and Intents with '
+                     'a permission.'))
+gflags.DEFINE_float('imprecise_fraction', 0.1,
+                    'Fraction of fully imprecise Intent fields.')
+gflags.DEFINE_float('partial_imprecise_fraction', 0.05,
+                    'Fraction of partially imprecise Intent fields.')
+
+
+LOGGER = logging.getLogger(__name__)
+
+_COMPONENT = ic3_data_pb2.Application.Component
+# Exit point kinds. Dynamic receivers and providers are not Intent targets.
+_EXIT_KINDS = [_COMPONENT.ACTIVITY, _COMPONENT.ACTIVITY, _COMPONENT.SERVICE,
+               _COMPONENT.RECEIVER]
+_COMPONENT_KINDS = _EXIT_KINDS + [_COMPONENT.DYNAMIC_RECEIVER,
+                                  _COMPONENT.PROVIDER]
+_CATEGORY_DEFAULT = u'android.intent.category.DEFAULT'
+_SCHEMES = [u'http', u'https', u'content', u'file', u'geo', u'tel']
+_IMPRECISE = u'(.*)'
+
+DEFAULT_MIME_TYPES = {u'text/plain': 4, u'image/*': 3, u'image/jpeg': 2,
+                      u'*/*': 1, u'video/mp4': 1, u'application/pdf': 1}
+
+
+class CorpusParameters(object):
+  """The parameters of a synthetic corpus."""
+
+  def __init__(self, app_count=100, components_per_app=4,
+               filters_per_component=1, exit_points_per_component=2,
+               action_count=200, action_skew=1.1, category_count=50,
+               category_skew=1.1, mime_types=None, mime_fraction=0.3,
+               data_fraction=0.3, explicit_fraction=0.3,
+               permission_fraction=0.1, imprecise_fraction=0.1,
+               partial_imprecise_fraction=0.05):
+    """Constructor.
+
+    Args:
+      app_count: The number of applications.
+      components_per_app: The average number of components of an application.
+      filters_per_component: The average number of Intent Filters of a
+      component.
+      exit_points_per_component: The average number of exit points of a
+      component.
+      action_count: The number of distinct actions.
+      action_skew: The exponent of the Zipf-like distribution of actions.
+      category_count: The number of distinct categories, not counting the
+      default category.
+      category_skew: The exponent of the Zipf-like distribution of categories.
+      mime_types: A map between MIME types and their weights, or None for
+      DEFAULT_MIME_TYPES.
+      mime_fraction: The fraction of Intents and Intent Filters with a MIME
+      type.
+      data_fraction: The fraction of Intents and Intent Filters with a URI.
+      explicit_fraction: The fraction of explicit Intents.
+      permission_fraction: The fraction of applications that use a permission,
+      and of components and Intents that require one.
+      imprecise_fraction: The fraction of Intent fields that are fully
+      imprecise.
+      partial_imprecise_fraction: The fraction of Intent fields that are
+      partially imprecise.
+    """
+
+    self.app_count = app_count
+    self.components_per_app = components_per_app
+    self.filters_per_component = filters_per_component
+    self.exit_points_per_component = exit_points_per_component
+    self.action_count = action_count
+    self.action_skew = action_skew
+    self.category_count = category_count
+    self.category_skew = category_skew
+    self.mime_types = mime_types or DEFAULT_MIME_TYPES
+    self.mime_fraction = mime_fraction
+    self.data_fraction = data_fraction
+    self.explicit_fraction = explicit_fraction
+    self.permission_fraction = permission_fraction
+    self.imprecise_fraction = imprecise_fraction
+    self.partial_imprecise_fraction = partial_imprecise_fraction
+
+
+def ParametersFromFlags():
+  """Makes CorpusParameters from command line flags."""
+
+  mime_types = None
+  if FLAGS.mime_types:
+    mime_types = {}
+    for mime_type in FLAGS.mime_types:
+      name, weight = mime_type.rsplit(':', 1)
+      mime_types[unicode(name)] = float(weight)
+  return CorpusParameters(
+      FLAGS.app_count, FLAGS.components_per_app, FLAGS.filters_per_component,
+      FLAGS.exit_points_per_component, FLAGS.action_count, FLAGS.action_skew,
+      FLAGS.category_count, FLAGS.category_skew, mime_types,
+      FLAGS.mime_fraction, FLAGS.data_fraction, FLAGS.explicit_fraction,
+      FLAGS.permission_fraction, FLAGS.imprecise_fraction,
+      FLAGS.partial_imprecise_fraction)
+
+
+class WeightedChoice(object):
+  """Draws values with fixed weights."""
+
+  def __init__(self, values, weights):
+    self._values = list(values)
+    self._cumulative_weights = []
+    total = 0.0
+    for weight in weights:
+      total += weight
+      self._cumulative_weights.append(total)
+
+  @classmethod
+  def Zipf(cls, values, skew):
+    """Makes a choice where the value of rank r has weight 1 / r^skew."""
+
+    return cls(values, [1.0 / rank ** skew
+                        for rank in range(1, len(values) + 1)])
+
+  def Draw(self, rng):
+    """Draws a value with a random.Random object."""
+
+    return self._values[bisect.bisect_right(
+        self._cumulative_weights, rng.random() * self._cumulative_weights[-1])]
+
+
+class CorpusGenerator(object):
+  """Generates the Application protobufs of a synthetic corpus."""
+
+  def __init__(self, parameters, seed=0):
+    """Constructor.
+
+    Args:
+      parameters: A CorpusParameters object.
+      seed: The seed of the random generator. Each application is generated
+      from its own seed, so applications can be generated in any order.
+    """
+
+    self.parameters = parameters
+    self._seed = seed
+    self._actions = WeightedChoice.Zipf(
+        [u'com.synthetic.action.ACTION_%d' % index
+         for index in range(parameters.action_count)], parameters.action_skew)
+    self._categories = WeightedChoice.Zipf(
+        [u'com.synthetic.category.CATEGORY_%d' % index
+         for index in range(parameters.category_count)],
+        parameters.category_skew)
+    mime_types = sorted(parameters.mime_types.iteritems())
+    self._mime_types = WeightedChoice([mime_type for mime_type, _ in mime_types],
+                                      [weight for _, weight in mime_types])
+    self._hosts = WeightedChoice.Zipf([u'host%d.example.com' % index
+                                       for index in range(50)], 1.0)
+    self._permissions = WeightedChoice.Zipf(
+        [u'com.synthetic.permission.PERMISSION_%d' % index
+         for index in range(20)], 1.0)
+
+  def Generate(self, index):
+    """Generates an application.
+
+    Args:
+      index: The index of the application in the corpus.
+
+    Returns: An ic3_data_pb2.Application object.
+    """
+
+    rng = random.Random(self._seed * 1000003 + index)
+    parameters = self.parameters
+    application = ic3_data_pb2.Application()
+    application.name = _ApplicationName(index)
+    application.version = 1
+    if rng.random() < parameters.permission_fraction:
+      application.used_permissions.append(self._permissions.Draw(rng))
+
+    for component_index in range(
+        _DrawCount(rng, parameters.components_per_app, 1)):
+      component = application.components.add()
+      component.name = _ComponentName(index, component_index)
+      component.kind = rng.choice(_COMPONENT_KINDS)
+      component.exported = rng.random() < 0.5
+      if rng.random() < parameters.permission_fraction:
+        component.permission = self._permissions.Draw(rng)
+      if component.kind != _COMPONENT.PROVIDER:
+        for _ in range(_DrawCount(rng, parameters.filters_per_component, 0)):
+          self._AddIntentFilter(rng, component)
+      for exit_index in range(
+          _DrawCount(rng, parameters.exit_points_per_component, 0)):
+        self._AddExitPoint(rng, component, exit_index)
+    return application
+
+  def _AddIntentFilter(self, rng, component):
+    """Adds a random Intent Filter to a component."""
+
+    intent_filter = component.intent_filters.add()
+    actions = set([self._actions.Draw(rng)
+                   for _ in range(1 + int(rng.random() < 0.3))])
+    _AddAttribute(intent_filter, ic3_data_pb2.ACTION, *sorted(actions))
+    categories = set([self._categories.Draw(rng)
+                      for _ in range(int(rng.random() < 0.4))])
+    if component.kind == _COMPONENT.ACTIVITY and rng.random() < 0.9:
+      # Activities only receive implicit Intents with the default category.
+      categories.add(_CATEGORY_DEFAULT)
+    if categories:
+      _AddAttribute(intent_filter, ic3_data_pb2.CATEGORY, *sorted(categories))
+    if rng.random() < self.parameters.mime_fraction:
+      _AddAttribute(intent_filter, ic3_data_pb2.TYPE,
+                    self._mime_types.Draw(rng))
+    if rng.random() < self.parameters.data_fraction:
+      _AddAttribute(intent_filter, ic3_data_pb2.SCHEME, rng.choice(_SCHEMES))
+      if rng.random() < 0.7:
+        _AddAttribute(intent_filter, ic3_data_pb2.HOST,
+                      self._hosts.Draw(rng))
+        if rng.random() < 0.3:
+          _AddAttribute(intent_filter, ic3_data_pb2.PATH, u'/path%d'
+                        % rng.randint(0, 9))
+
+  def _AddExitPoint(self, rng, component, exit_index):
+    """Adds an exit point with a random Intent to a component."""
+
+    parameters = self.parameters
+    exit_point = component.exit_points.add()
+    exit_point.kind = rng.choice(_EXIT_KINDS)
+    exit_point.instruction.class_name = component.name
+    exit_point.instruction.method = u'method%d' % exit_index
+    exit_point.instruction.id = exit_index
+    exit_point.instruction.statement = u'statement%d' % exit_index
+    intent = exit_point.intents.add()
+    if rng.random() < parameters.permission_fraction:
+      intent.permission = self._permissions.Draw(rng)
+
+    if rng.random() < parameters.explicit_fraction:
+      target_app = rng.randrange(parameters.app_count)
+      target_component = rng.randrange(
+          max(1, 2 * parameters.components_per_app - 1))
+      if rng.random() < 0.5:
+        _AddAttribute(intent, ic3_data_pb2.PACKAGE,
+                      self._MakeImprecise(rng, _ApplicationName(target_app)))
+      _AddAttribute(intent, ic3_data_pb2.CLASS, self._MakeImprecise(
+          rng, _ComponentName(target_app, target_component)))
+      return
+
+    _AddAttribute(intent, ic3_data_pb2.ACTION,
+                  self._MakeImprecise(rng, self._actions.Draw(rng)))
+    if rng.random() < 0.3:
+      _AddAttribute(intent, ic3_data_pb2.CATEGORY,
+                    self._MakeImprecise(rng, self._categories.Draw(rng)))
+    if rng.random() < parameters.mime_fraction:
+      _AddAttribute(intent, ic3_data_pb2.TYPE,
+                    self._MakeImprecise(rng, self._mime_types.Draw(rng)))
+    if rng.random() < parameters.data_fraction:
+      _AddAttribute(intent, ic3_data_pb2.URI, self._MakeImprecise(
+          rng, u'%s://%s/path%d' % (rng.choice(_SCHEMES[:2]),
+                                    self._hosts.Draw(rng), rng.randint(0, 9))))
+
+  def _MakeImprecise(self, rng, value):
+    """Makes a field value fully or partially imprecise at random."""
+
+    draw = rng.random()
+    if draw < self.parameters.imprecise_fraction:
+      return _IMPRECISE
+    if draw < (self.parameters.imprecise_fraction
+               + self.parameters.partial_imprecise_fraction):
+      return value[:rng.randint(1, max(1, len(value) - 1))] + _IMPRECISE
+    return value
+
+
+def GenerateCorpus(destination, parameters, seed=0):
+  """Writes the protobufs of a synthetic corpus.
+
+  Args:
+    destination: The path to the destination directory.
+    parameters: A CorpusParameters object.
+    seed: The seed of the random generator.
+
+  Returns: The list of paths to the protobufs.
+  """
+
+  if not os.path.isdir(destination):
+    os.makedirs(destination)
+  generator = CorpusGenerator(parameters, seed)
+  paths = []
+  for index in range(parameters.app_count):
+    path = os.path.join(destination, '%s.dat' % _ApplicationName(index))
+    with open(path, 'wb') as protobuf_file:
+      protobuf_file.write(generator.Generate(index).SerializeToString())
+    paths.append(path)
+  LOGGER.info('Wrote %d synthetic applications to %s.', len(paths),
+              destination)
+  return paths
+
+
+def _DrawCount(rng, average, minimum):
+  """Draws a count uniformly between minimum and 2 * average - minimum."""
+
+  return rng.randint(minimum, max(minimum, 2 * average - minimum))
+
+
+def _ApplicationName(index):
+  return u'com.synthetic.app%d' % index
+
+
+def _ComponentName(app_index, component_index):
+  return u'%s.Component%d' % (_ApplicationName(app_index), component_index)
+
+
+def _AddAttribute(message, kind, *values):
+  """Adds an attribute with some values to an Intent or Intent Filter."""
+
+  attribute = message.attributes.add()
+  attribute.kind = kind
+  attribute.value.extend(values)
@@ -0,0 +1,77 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2015 The Pennsylvania State University and the University of Wisconsin
+# Systems and Internet Infrastructure Security Laboratory
+#
+# Author: Damien Octeau
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for synthetic corpus generation."""
+
+import os.path
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..'))
+
+from primo.linking import fetch_data
+from primo.linking import ic3_data_pb2
+from primo.linking import synthetic
+
+
+class SyntheticTest(unittest.TestCase):
+  def testGenerateIsDeterministic(self):
+    generator = synthetic.CorpusGenerator(
+        synthetic.CorpusParameters(app_count=5), seed=3)
+    same = synthetic.CorpusGenerator(
+        synthetic.CorpusParameters(app_count=5), seed=3)
+    other = synthetic.CorpusGenerator(
+        synthetic.CorpusParameters(app_count=5), seed=4)
+    self.assertEqual(generator.Generate(2), same.Generate(2))
+    self.assertNotEqual(generator.Generate(2), other.Generate(2))
+
+  def testImpreciseFields(self):
+    parameters = synthetic.CorpusParameters(
+        app_count=20, explicit_fraction=0, imprecise_fraction=1)
+    generator = synthetic.CorpusGenerator(parameters)
+    actions = set()
+    for index in range(parameters.app_count):
+      for component in generator.Generate(index).components:
+        for exit_point in component.exit_points:
+          for attribute in exit_point.intents[0].attributes:
+            if attribute.kind == ic3_data_pb2.ACTION:
+              actions.update(attribute.value)
+    self.assertEqual(actions, set([u'(.*)']))
+
+  def testGenerateCorpus(self):
+    destination = tempfile.mkdtemp()
+    try:
+      paths = synthetic.GenerateCorpus(
+          destination, synthetic.CorpusParameters(app_count=3))
+      self.assertEqual(len(paths), 3)
+      applications = [fetch_data.LoadApplication(path) for path in paths]
+      self.assertEqual([application.name for application in applications],
+                       [u'com.synthetic.app0', u'com.synthetic.app1',
+                        u'com.synthetic.app2'])
+      self.assertTrue(all([application.components
+                           for application in applications]))
+    finally:
+      shutil.rmtree(destination)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -20,29 +20,35 @@ from primo.linking.components cimport Component
 from primo.linking.intent_filters cimport IntentFilter
 
 cdef void PrepareForQueries(set applications)
+cdef void AddQueryApplication(Application application)
+cdef void RemoveQueryApplication(Application application)
 cdef int GetExportedComponentCount(int kind, set search_space=?)
 cdef set GetAppsMatching(unicode app_name, unicode component_name)
 cdef set GetComponentsOfApp(unicode app_name, set search_space)
 cdef set GetComponentsWithName(unicode component_name, set search_space)
 cdef set GetComponentsWithKind(int kind, set search_space)
-cdef set GetFiltersWithUsedPermission(unicode used_permission,
-                                      set search_space)
-cdef set GetFiltersWithAction(unicode action, set search_space)
-cdef set GetFiltersOfApp(unicode app, set search_space)
-cdef set GetFiltersWithKind(int kind, set search_space)
-cdef set GetFiltersWithAnyAction(set search_space)
-cdef set GetFiltersWithCategories(tuple categories, set search_space)
-cdef set GetFiltersWithTypes(list mime_types, set search_space)
-cdef set GetFiltersWithBaseTypes(list base_types, search_space)
-cdef set GetFiltersWithScheme(unicode scheme, set search_space)
-cdef set GetFiltersWithHost(unicode host, set search_space)
-cdef set GetFiltersWithPort(unicode port, set search_space)
-cdef set GetFiltersWithPath(unicode path, set search_space)
-cdef set GetExportedFilters(set search_space)
-cdef set GetFiltersWithoutType(set search_space)
-cdef set GetNoDataFilters(set search_space)
-cdef set GetFiltersWithType(set search_space)
+cdef object GetFiltersWithUsedPermission(unicode used_permission,
+                                         object search_space)
+cdef object GetFiltersWithAction(unicode action, object search_space)
+cdef object GetFiltersOfApp(unicode app, object search_space)
+cdef object GetFiltersWithKind(int kind, object search_space)
+cdef object GetFiltersWithAnyAction(object search_space)
+cdef object GetFiltersWithCategories(tuple categories, object search_space)
+cdef object GetFiltersWithTypes(list mime_types, object search_space)
+cdef object GetFiltersWithBaseTypes(list base_types, object search_space)
+cdef object GetFiltersWithScheme(unicode scheme, object search_space)
+cdef object GetFiltersWithHost(unicode host, object search_space)
+cdef object GetFiltersWithPort(unicode port, object search_space)
+cdef object GetFiltersWithPath(unicode path, object search_space)
+cdef object GetExportedFilters(object search_space)
+cdef object GetFiltersWithoutType(object search_space)
+cdef object GetNoDataFilters(object search_space)
+cdef object GetFiltersWithType(object search_space)
+cdef object GetFilterBitmap(set intent_filters)
+cdef list GetFiltersFromBitmap(object bitmap)
 cdef long GetTargetCountForValue(object field, object value)
+cdef double GetFilterFraction(object field, object value)
 cdef void AddIntentFilterAttributes(IntentFilter intent_filter, dict attributes)
 cdef void AddComponent(Component component)
+cdef void RemoveComponent(Component component)
 cdef set GetExportedComponents(set search_space)
@@ -24,8 +24,10 @@ from collections import Counter
 import logging
 
 from primo.linking.attribute_matching cimport AttributeMap
+from primo.linking.attribute_matching cimport BitmapAttributeMap
+from primo.linking.attribute_matching cimport BitmapToIds
+from primo.linking.attribute_matching cimport MakeBitmap
 
-from primo.linking.util import Powerset
 from primo.linking import ic3_data_pb2
 
 
@@ -46,7 +48,7 @@ PACKAGE = 'package'
 CLASS = 'class'
 BASE_TYPE = 'base_type'
 _COUNTER_STRATEGIES = {ACTION: tuple,
-                       CATEGORY: Powerset,
+                       CATEGORY: tuple,
                        SCHEME: tuple,
                        HOST: tuple,
                        PORT: tuple,
@@ -56,27 +58,28 @@ _COUNTER_STRATEGIES = {ACTION: tuple,
                        USED_PERMISSIONS: tuple,
                        PACKAGE: tuple}
 
-# Intent Filter and component constants.
-cdef AttributeMap _ACTION_TO_FILTERS = AttributeMap()
+# Intent Filter and component constants. Intent Filters are stored by id, so
+# that queries on Intent Filters can be performed on bitmaps.
+cdef BitmapAttributeMap _ACTION_TO_FILTERS = BitmapAttributeMap()
 cdef AttributeMap _APP_TO_COMPONENTS = AttributeMap()
 cdef AttributeMap _APP_TO_APP = AttributeMap()
-cdef AttributeMap _APP_TO_FILTERS = AttributeMap()
+cdef BitmapAttributeMap _APP_TO_FILTERS = BitmapAttributeMap()
 cdef AttributeMap _COMPONENT_TO_APPS = AttributeMap()
-cdef AttributeMap _BASE_TYPE_TO_FILTERS = AttributeMap()
-cdef AttributeMap _CATEGORY_TO_FILTERS = AttributeMap()
+cdef BitmapAttributeMap _BASE_TYPE_TO_FILTERS = BitmapAttributeMap()
+cdef BitmapAttributeMap _CATEGORY_TO_FILTERS = BitmapAttributeMap()
 cdef AttributeMap _COMPONENT_NAME_TO_COMPONENTS = AttributeMap()
 cdef tuple _KIND_TO_COMPONENTS = (set(), set(), set(), set(), set())
 _EXPORTED_COMPONENTS = set()
 _EXPORTED_FILTERS = set()
 _NO_DATA_FILTERS = set()
-cdef AttributeMap _SCHEME_TO_FILTERS = AttributeMap()
-cdef AttributeMap _HOST_TO_FILTERS = AttributeMap()
-cdef AttributeMap _PORT_TO_FILTERS = AttributeMap()
-cdef AttributeMap _PATH_TO_FILTERS = AttributeMap()
-cdef AttributeMap _TYPE_TO_FILTERS = AttributeMap()
+cdef BitmapAttributeMap _SCHEME_TO_FILTERS = BitmapAttributeMap()
+cdef BitmapAttributeMap _HOST_TO_FILTERS = BitmapAttributeMap()
+cdef BitmapAttributeMap _PORT_TO_FILTERS = BitmapAttributeMap()
+cdef BitmapAttributeMap _PATH_TO_FILTERS = BitmapAttributeMap()
+cdef BitmapAttributeMap _TYPE_TO_FILTERS = BitmapAttributeMap()
 cdef tuple _KIND_TO_FILTERS = (set(), set(), set(), set(), set())
-cdef AttributeMap _USED_PERMISSION_TO_FILTERS = AttributeMap()
-cdef AttributeMap _EXTRA_TO_FILTERS = AttributeMap()
+cdef BitmapAttributeMap _USED_PERMISSION_TO_FILTERS = BitmapAttributeMap()
+cdef BitmapAttributeMap _EXTRA_TO_FILTERS = BitmapAttributeMap()
 cdef AttributeMap _EXTRA_TO_COMPONENTS = AttributeMap()
 _ATTRIBUTE_MAPS = {ACTION: [_ACTION_TO_FILTERS],
                    CATEGORY: [_CATEGORY_TO_FILTERS],
@@ -107,6 +110,55 @@ cdef list FILTER_COUNT = [0]
 # Map between component kinds and applications that export them.
 cdef dict _EXPORTED_APPS = {}
 
+# Maps between Intent Filters and their ids. Equal Intent Filters share the id
+# of the first one, since sets of Intent Filters only contain one of them.
+cdef dict _FILTER_IDS = {}
+cdef dict _FILTERS_BY_ID = {}
+
+# Cache of the bitmaps of the sets of Intent Filter ids, keyed by set identity.
+cdef dict _FILTER_SET_BITMAPS = {}
+
+# The target data that is saved in corpus snapshots. _EXPORTED_APPS is not
+# included, since it is computed by PrepareForQueries.
+cdef tuple _SNAPSHOT_ATTRIBUTE_MAPS = (
+    _ACTION_TO_FILTERS, _APP_TO_COMPONENTS, _APP_TO_APP, _APP_TO_FILTERS,
+    _COMPONENT_TO_APPS, _BASE_TYPE_TO_FILTERS, _CATEGORY_TO_FILTERS,
+    _COMPONENT_NAME_TO_COMPONENTS, _SCHEME_TO_FILTERS, _HOST_TO_FILTERS,
+    _PORT_TO_FILTERS, _PATH_TO_FILTERS, _TYPE_TO_FILTERS,
+    _USED_PERMISSION_TO_FILTERS, _EXTRA_TO_FILTERS, _EXTRA_TO_COMPONENTS)
+cdef tuple _SNAPSHOT_SETS = (_KIND_TO_COMPONENTS + _KIND_TO_FILTERS +
+                             (_EXPORTED_COMPONENTS, _EXPORTED_FILTERS,
+                              _NO_DATA_FILTERS))
+
+
+def GetState():
+  """Returns the global target data, for saving corpus snapshots."""
+
+  return (_SNAPSHOT_ATTRIBUTE_MAPS, _SNAPSHOT_SETS, _COUNTERS, FILTER_COUNT[0],
+          _FILTER_IDS, _FILTERS_BY_ID)
+
+
+def SetState(tuple state):
+  """Restores global target data saved with GetState."""
+
+  cdef AttributeMap attribute_map
+  (attribute_maps, target_sets, counters, FILTER_COUNT[0], filter_ids,
+   filters_by_id) = state
+  for attribute_map, saved_map in zip(_SNAPSHOT_ATTRIBUTE_MAPS,
+                                      attribute_maps):
+    attribute_map.CopyFrom(saved_map)
+  for target_set, saved_set in zip(_SNAPSHOT_SETS, target_sets):
+    target_set.clear()
+    target_set.update(saved_set)
+  for field, counter in _COUNTERS.iteritems():
+    counter.clear()
+    counter.update(counters[field])
+  _FILTER_IDS.clear()
+  _FILTER_IDS.update(filter_ids)
+  _FILTERS_BY_ID.clear()
+  _FILTERS_BY_ID.update(filters_by_id)
+  _FILTER_SET_BITMAPS.clear()
+
 
 cdef void AddComponent(Component component):
   """Adds a component and updates the appropriate sets and maps.
@@ -127,28 +179,30 @@ cdef void AddComponent(Component component):
   AddKindToCounter(component.kind, target_count)
   _COUNTERS[PACKAGE][app_name] += target_count
   _KIND_TO_COMPONENTS[component.kind].add(component)
+  _FILTER_SET_BITMAPS.clear()
+  cdef long filter_id
   for intent_filter in component.filters:
-    _APP_TO_FILTERS.AddAttribute(app_name, intent_filter)
-    _KIND_TO_FILTERS[component.kind].add(intent_filter)
+    filter_id = _FILTER_IDS[intent_filter]
+    _APP_TO_FILTERS.AddAttribute(app_name, filter_id)
+    _KIND_TO_FILTERS[component.kind].add(filter_id)
     if app.used_permissions:
       for used_permission in app.used_permissions:
         _COUNTERS[USED_PERMISSIONS][used_permission] += 1
-        _USED_PERMISSION_TO_FILTERS.AddAttribute(used_permission,
-                                                  intent_filter)
+        _USED_PERMISSION_TO_FILTERS.AddAttribute(used_permission, filter_id)
     else:
       _COUNTERS[USED_PERMISSIONS][None] += 1
-      _USED_PERMISSION_TO_FILTERS.AddAttribute(None, intent_filter)
+      _USED_PERMISSION_TO_FILTERS.AddAttribute(None, filter_id)
     if component.extras:
       for extra in component.extras:
         try:
-          _EXTRA_TO_FILTERS.AddAttribute(extra, intent_filter)
+          _EXTRA_TO_FILTERS.AddAttribute(extra, filter_id)
         except TypeError:
-          _EXTRA_TO_FILTERS.AddAttribute(extra.extra, intent_filter)
+          _EXTRA_TO_FILTERS.AddAttribute(extra.extra, filter_id)
 
   if component.exported:
     _EXPORTED_COMPONENTS.add(component)
     for intent_filter in component.filters:
-      _EXPORTED_FILTERS.add(intent_filter)
+      _EXPORTED_FILTERS.add(_FILTER_IDS[intent_filter])
 
   if component.extras:
     for extra in component.extras:
@@ -158,6 +212,69 @@ cdef void AddComponent(Component component):
         _EXTRA_TO_COMPONENTS.AddAttribute(extra.extra, component)
 
 
+cdef void RemoveComponent(Component component):
+  """Removes a component added with AddComponent, along with its Intent Filters.
+
+  This is meant for removing entire applications: the application is removed
+  from the application maps along with its first component.
+
+  Args:
+    component: The component to be removed.
+  """
+
+  cdef unicode name = component.name
+  cdef Application app = component.application
+  cdef unicode app_name = app.name
+  _APP_TO_COMPONENTS.RemoveEndPoint(component, (app_name,))
+  _APP_TO_APP.RemoveEndPoint(app, (app_name,))
+  _COMPONENT_NAME_TO_COMPONENTS.RemoveEndPoint(component, (name,))
+  _COMPONENT_TO_APPS.RemoveEndPoint(app, (name,))
+  FILTER_COUNT[0] -= len(component.filters)
+  cdef int target_count = len(component.filters) if component.filters else 1
+  AddKindToCounter(component.kind, -target_count)
+  _COUNTERS[PACKAGE][app_name] -= target_count
+  _KIND_TO_COMPONENTS[component.kind].discard(component)
+  _FILTER_SET_BITMAPS.clear()
+  cdef long filter_id
+  for intent_filter in component.filters:
+    filter_id = _FILTER_IDS[intent_filter]
+    _APP_TO_FILTERS.RemoveEndPoint(filter_id, (app_name,))
+    _KIND_TO_FILTERS[component.kind].discard(filter_id)
+    if app.used_permissions:
+      for used_permission in app.used_permissions:
+        _COUNTERS[USED_PERMISSIONS][used_permission] -= 1
+      _USED_PERMISSION_TO_FILTERS.RemoveEndPoint(filter_id,
+                                                 app.used_permissions)
+    else:
+      _COUNTERS[USED_PERMISSIONS][None] -= 1
+      _USED_PERMISSION_TO_FILTERS.RemoveEndPoint(filter_id, (None,))
+    if component.extras:
+      _EXTRA_TO_FILTERS.RemoveEndPoint(filter_id,
+                                       _ExtraNames(component.extras))
+    RemoveIntentFilterAttributes(intent_filter)
+    _EXPORTED_FILTERS.discard(filter_id)
+  # Equal Intent Filters share an id, so ids are only released at the end.
+  for intent_filter in component.filters:
+    _FILTERS_BY_ID.pop(_FILTER_IDS.pop(intent_filter, None), None)
+
+  _EXPORTED_COMPONENTS.discard(component)
+
+  if component.extras:
+    _EXTRA_TO_COMPONENTS.RemoveEndPoint(component,
+                                        _ExtraNames(component.extras))
+
+
+cdef list _ExtraNames(tuple extras):
+  """Returns the attribute values under which extras were added.
+
+  Args:
+    extras: A tuple of extras, either names or Extra protobuf objects.
+  """
+
+  return [extra if isinstance(extra, unicode) else extra.extra
+          for extra in extras]
+
+
 cdef void PrepareForQueries(set applications):
   """Prepares the entry point field data for queries.
 
@@ -176,6 +293,30 @@ cdef void PrepareForQueries(set applications):
         exported_apps[kind].add(application)
 
 
+cdef void AddQueryApplication(Application application):
+  """Adds an application to the data computed by PrepareForQueries.
+
+  Args:
+    application: An application whose components were added after
+    PrepareForQueries was called.
+  """
+
+  for kind, applications in _EXPORTED_APPS.iteritems():
+    if application.exported_component_maps[kind]:
+      applications.add(application)
+
+
+cdef void RemoveQueryApplication(Application application):
+  """Removes an application from the data computed by PrepareForQueries.
+
+  Args:
+    application: An application that is being removed.
+  """
+
+  for applications in _EXPORTED_APPS.itervalues():
+    applications.discard(application)
+
+
 cdef int GetExportedComponentCount(int kind, set search_space=None):
   """Returns the number of apps with exported components of a certain kind.
 
@@ -266,6 +407,24 @@ cdef long GetTargetCountForValue(object field, object value):
     return total
 
 
+cdef double GetFilterFraction(object field, object value):
+  """Estimates the fraction of Intent Filters with a given field value.
+
+  The estimate uses the attribute counters, so it does not account for Intent
+  Filters with wildcard values.
+
+  Args:
+    field: A field name or index.
+    value: A field value.
+
+  Returns: A number between 0 and 1.
+  """
+
+  if FILTER_COUNT[0] <= 0:
+    return 1.0
+  return min(float(_COUNTERS[field][value]) / FILTER_COUNT[0], 1.0)
+
+
 cdef void AddIntentFilterAttributes(IntentFilter intent_filter,
                                     dict attributes):
   """Adds Intent Filter attributes to the Filter data.
@@ -275,48 +434,117 @@ cdef void AddIntentFilterAttributes(IntentFilter intent_filter,
     attributes: A map of Intent Filter attributes.
   """
 
-  _AddIntentFilterAttribute(ACTION, attributes, _ACTION_TO_FILTERS,
-                            intent_filter)
+  cdef long filter_id = _FILTER_IDS.setdefault(intent_filter, intent_filter.id)
+  _FILTERS_BY_ID.setdefault(filter_id, intent_filter)
+
+  _AddIntentFilterAttribute(ACTION, attributes, _ACTION_TO_FILTERS, filter_id)
   _AddIntentFilterAttribute(CATEGORY, attributes, _CATEGORY_TO_FILTERS,
-                            intent_filter)
-  _AddIntentFilterAttribute(SCHEME, attributes, _SCHEME_TO_FILTERS,
-                            intent_filter)
-  _AddIntentFilterAttribute(HOST, attributes, _HOST_TO_FILTERS,
-                            intent_filter)
-  _AddIntentFilterAttribute(PORT, attributes, _PORT_TO_FILTERS,
-                            intent_filter)
-  _AddIntentFilterAttribute(PATH, attributes, _PATH_TO_FILTERS,
-                            intent_filter)
+                            filter_id)
+  _AddIntentFilterAttribute(SCHEME, attributes, _SCHEME_TO_FILTERS, filter_id)
+  _AddIntentFilterAttribute(HOST, attributes, _HOST_TO_FILTERS, filter_id)
+  _AddIntentFilterAttribute(PORT, attributes, _PORT_TO_FILTERS, filter_id)
+  _AddIntentFilterAttribute(PATH, attributes, _PATH_TO_FILTERS, filter_id)
   if not intent_filter.HasData():
-    _NO_DATA_FILTERS.add(intent_filter)
+    _NO_DATA_FILTERS.add(filter_id)
+    _FILTER_SET_BITMAPS.clear()
 
   if TYPE in attributes:
     for mime_type in attributes[TYPE]:
       _COUNTERS[TYPE][mime_type] += 1
       type_parts = mime_type.split('/', 1)
       if len(type_parts) == 2:
-        _BASE_TYPE_TO_FILTERS.AddAttribute(type_parts[0], intent_filter)
-        _TYPE_TO_FILTERS.AddAttribute(mime_type, intent_filter)
+        _BASE_TYPE_TO_FILTERS.AddAttribute(type_parts[0], filter_id)
+        _TYPE_TO_FILTERS.AddAttribute(mime_type, filter_id)
       else:
-        _BASE_TYPE_TO_FILTERS.AddAttribute(u'(.*)', intent_filter)
-        _TYPE_TO_FILTERS.AddAttribute(u'(.*)', intent_filter)
+        _BASE_TYPE_TO_FILTERS.AddAttribute(u'(.*)', filter_id)
+        _TYPE_TO_FILTERS.AddAttribute(u'(.*)', filter_id)
   else:
-    _TYPE_TO_FILTERS.AddAttribute(None, intent_filter)
+    _TYPE_TO_FILTERS.AddAttribute(None, filter_id)
 
   if ic3_data_pb2.HOST in attributes:
     for host in attributes[ic3_data_pb2.HOST]:
       if host == '*':
         # Possibly empty or other host (see http://stackoverflow.com/a/9569925).
-        _HOST_TO_FILTERS.AddAttribute(u'(.*)', intent_filter)
+        _HOST_TO_FILTERS.AddAttribute(u'(.*)', filter_id)
       else:
-        _HOST_TO_FILTERS.AddAttribute(host, intent_filter)
+        _HOST_TO_FILTERS.AddAttribute(host, filter_id)
+  else:
+    _HOST_TO_FILTERS.AddAttribute(None, filter_id)
+
+
+cdef void RemoveIntentFilterAttributes(IntentFilter intent_filter):
+  """Removes the attributes of an Intent Filter from the Filter data.
+
+  The attributes are recovered from the Intent Filter fields, which hold the
+  values that AddIntentFilterAttributes was called with.
+
+  Args:
+    intent_filter: An Intent Filter.
+  """
+
+  cdef long filter_id = _FILTER_IDS[intent_filter]
+  _RemoveIntentFilterAttribute(ACTION, intent_filter.actions,
+                               _ACTION_TO_FILTERS, filter_id)
+  _RemoveIntentFilterAttribute(CATEGORY, intent_filter.categories,
+                               _CATEGORY_TO_FILTERS, filter_id)
+  _RemoveIntentFilterAttribute(SCHEME, intent_filter.schemes,
+                               _SCHEME_TO_FILTERS, filter_id)
+  _RemoveIntentFilterAttribute(HOST, intent_filter.hosts, _HOST_TO_FILTERS,
+                               filter_id)
+  _RemoveIntentFilterAttribute(PORT, intent_filter.ports, _PORT_TO_FILTERS,
+                               filter_id)
+  _RemoveIntentFilterAttribute(PATH, intent_filter.paths, _PATH_TO_FILTERS,
+                               filter_id)
+  _NO_DATA_FILTERS.discard(filter_id)
+  _FILTER_SET_BITMAPS.clear()
+
+  if intent_filter.types is not None:
+    for mime_type in intent_filter.types:
+      _COUNTERS[TYPE][mime_type] -= 1
+    _BASE_TYPE_TO_FILTERS.RemoveEndPoint(
+        filter_id,
+        [mime_type.split('/', 1)[0] if '/' in mime_type else u'(.*)'
+         for mime_type in intent_filter.types])
+    _TYPE_TO_FILTERS.RemoveEndPoint(
+        filter_id,
+        [mime_type if '/' in mime_type else u'(.*)'
+         for mime_type in intent_filter.types])
   else:
-    _HOST_TO_FILTERS.AddAttribute(None, intent_filter)
+    _TYPE_TO_FILTERS.RemoveEndPoint(filter_id, (None,))
+
+  # Hosts were also added as (.*) for '*' hosts, or as None.
+  _HOST_TO_FILTERS.RemoveEndPoint(filter_id, (None, u'(.*)'))
+
+
+cdef void _RemoveIntentFilterAttribute(int kind, object values,
+                                       AttributeMap attribute_map,
+                                       long filter_id):
+  """Removes a single Intent Filter attribute from the Filter data.
+
+  Args:
+    kind: The type of attribute.
+    values: The attribute values, or None if the Intent Filter does not have
+    the attribute.
+    attribute_map: An AttributeMap object for the kind of attribute being
+    considered.
+    filter_id: The id of an Intent Filter.
+  """
+
+  if values is not None:
+    for attribute_value in _COUNTER_STRATEGIES[kind](values):
+      if not attribute_value:
+        _COUNTERS[kind][None] -= 1
+      else:
+        _COUNTERS[kind][attribute_value] -= 1
+    attribute_map.RemoveEndPoint(filter_id, values)
+  else:
+    _COUNTERS[kind][None] -= 1
+    attribute_map.RemoveEndPoint(filter_id, (None,))
 
 
 cdef void _AddIntentFilterAttribute(int kind, dict attributes,
                                     AttributeMap attribute_map,
-                                    IntentFilter intent_filter):
+                                    long filter_id):
   """Adds a single Intent Filter attribute to the Filter data.
 
   Args:
@@ -324,27 +552,30 @@ cdef void _AddIntentFilterAttribute(int kind, dict attributes,
     attributes: A map between Intent Filter attribute names and values.
     attribute_map: An AttributeMap object for the kind of attribute being
     considered.
-    intent_filter: An Intent Filter.
+    filter_id: The id of an Intent Filter.
   """
 
   if kind in attributes:
     for attribute_value in _COUNTER_STRATEGIES[kind](attributes[kind]):
       if not attribute_value:
-        # The empty set is part of the powerset.
+        # Empty values are counted as missing values.
         _COUNTERS[kind][None] += 1
       else:
         _COUNTERS[kind][attribute_value] += 1
     for value in attributes[kind]:
-      attribute_map.AddAttribute(value, intent_filter)
+      attribute_map.AddAttribute(value, filter_id)
   else:
     _COUNTERS[kind][None] += 1
-    attribute_map.AddAttribute(None, intent_filter)
+    attribute_map.AddAttribute(None, filter_id)
 
 
-cdef set GetFiltersWithKind(int kind, set search_space):
+cdef object GetFiltersWithKind(int kind, object search_space):
   """Returns all the Intent Filters protecting a given type of component."""
 
-  return GetTargetsWithKind(kind, search_space, _KIND_TO_FILTERS)
+  result = _GetFilterSetBitmap(_KIND_TO_FILTERS[kind])
+  if kind == RECEIVER:
+    result = result | _GetFilterSetBitmap(_KIND_TO_FILTERS[DYNAMIC_RECEIVER])
+  return result & search_space
 
 
 cdef set GetComponentsWithKind(int kind, set search_space):
@@ -372,32 +603,68 @@ cdef set GetTargetsWithKind(int kind, set search_space, tuple attribute_map):
     return result
 
 
-cdef set GetFiltersWithUsedPermission(unicode used_permission,
-                                      set search_space):
+cdef object GetFilterBitmap(set intent_filters):
+  """Returns the bitmap of a set of Intent Filters.
+
+  Args:
+    intent_filters: A set of Intent Filters.
+
+  Returns: A bitmap that can be used as a search space for Intent Filter
+  queries.
+  """
+
+  return MakeBitmap([_FILTER_IDS[intent_filter]
+                     for intent_filter in intent_filters])
+
+
+cdef list GetFiltersFromBitmap(object bitmap):
+  """Returns the Intent Filters in a bitmap, sorted by id.
+
+  Args:
+    bitmap: The result of an Intent Filter query.
+  """
+
+  return [_FILTERS_BY_ID[filter_id]
+          for filter_id in BitmapToIds(bitmap).tolist()]
+
+
+cdef object _GetFilterSetBitmap(set filter_ids):
+  """Returns the bitmap of one of the global sets of Intent Filter ids."""
+
+  try:
+    return _FILTER_SET_BITMAPS[id(filter_ids)]
+  except KeyError:
+    bitmap = MakeBitmap(filter_ids)
+    _FILTER_SET_BITMAPS[id(filter_ids)] = bitmap
+    return bitmap
+
+
+cdef object GetFiltersWithUsedPermission(unicode used_permission,
+                                         object search_space):
   """Returns all Intent Filters from applications declaring given used
   permissions."""
 
-  return _USED_PERMISSION_TO_FILTERS.GetEndPointsForAttribute(
+  return _USED_PERMISSION_TO_FILTERS.GetBitmapForAttribute(
       used_permission, search_space)
 
 
-cdef set GetFiltersWithAction(unicode action, set search_space):
+cdef object GetFiltersWithAction(unicode action, object search_space):
   """Returns all Intent Filters with a given action."""
 
-  return _ACTION_TO_FILTERS.GetEndPointsForAttribute(action, search_space)
+  return _ACTION_TO_FILTERS.GetBitmapForAttribute(action, search_space)
 
 
-cdef set GetFiltersWithAnyAction(set search_space):
+cdef object GetFiltersWithAnyAction(object search_space):
   """Returns all Intent Filters that declare any action."""
 
-  return _ACTION_TO_FILTERS.GetEndPointsWithoutEmptySet(search_space)
+  return _ACTION_TO_FILTERS.GetBitmapWithoutEmptySet(search_space)
 
 
-cdef set GetFiltersWithCategories(tuple categories, set search_space):
+cdef object GetFiltersWithCategories(tuple categories, object search_space):
   """Returns all Intent Filters with given categories."""
 
-  return _CATEGORY_TO_FILTERS.GetEndPointsForAttributeSet(categories,
-                                                          search_space)
+  return _CATEGORY_TO_FILTERS.GetBitmapForAttributeSet(categories,
+                                                       search_space)
 
 
 def GetFiltersWithExtraFromSet(extras, search_space):
@@ -406,10 +673,10 @@ def GetFiltersWithExtraFromSet(extras, search_space):
 
   Args:
     extras: A set of extras.
-    search_space: The search space.
+    search_space: The bitmap of the search space.
   """
 
-  return _EXTRA_TO_FILTERS.GetEndPointsForAttributeSet(
+  return _EXTRA_TO_FILTERS.GetBitmapForAttributeSet(
       extras, search_space, False)
 
 
@@ -426,88 +693,88 @@ def GetComponentsWithExtraFromSet(extras, search_space):
       extras, search_space, False)
 
 
-cdef set GetFiltersWithScheme(unicode scheme, set search_space):
+cdef object GetFiltersWithScheme(unicode scheme, object search_space):
   """Returns all Intent Filters with a given scheme."""
 
-  return _SCHEME_TO_FILTERS.GetEndPointsForAttribute(scheme, search_space)
+  return _SCHEME_TO_FILTERS.GetBitmapForAttribute(scheme, search_space)
 
 
-cdef set GetFiltersWithHost(unicode host, set search_space):
+cdef object GetFiltersWithHost(unicode host, object search_space):
   """Returns all Intent Filters with a given host."""
 
-  return _HOST_TO_FILTERS.GetEndPointsForAttribute(host, search_space)
+  return _HOST_TO_FILTERS.GetBitmapForAttribute(host, search_space)
 
 
-cdef set GetFiltersWithPort(unicode port, set search_space):
+cdef object GetFiltersWithPort(unicode port, object search_space):
   """Returns all Intent Filters with a given port."""
 
-  return _PORT_TO_FILTERS.GetEndPointsForAttribute(port, search_space)
+  return _PORT_TO_FILTERS.GetBitmapForAttribute(port, search_space)
 
 
-cdef set GetFiltersWithPath(unicode path, set search_space):
+cdef object GetFiltersWithPath(unicode path, object search_space):
   """Returns all Intent Filters with a given path."""
 
-  return _PATH_TO_FILTERS.GetEndPointsForAttribute(path, search_space)
+  return _PATH_TO_FILTERS.GetBitmapForAttribute(path, search_space)
 
 
-cdef set GetExportedFilters(set search_space):
+cdef object GetExportedFilters(object search_space):
   """Returns the exported Intent Filters from a set of Filters.
 
   Args:
-    search_space: The search space.
+    search_space: The bitmap of the search space.
   """
 
-  return search_space & _EXPORTED_FILTERS
+  return search_space & _GetFilterSetBitmap(_EXPORTED_FILTERS)
 
 
-cdef set GetFiltersOfApp(unicode app, set search_space):
+cdef object GetFiltersOfApp(unicode app, object search_space):
   """Returns all Intent Filters of a given application from a set of Filters."""
 
-  return _APP_TO_FILTERS.GetEndPointsForAttribute(app, search_space)
+  return _APP_TO_FILTERS.GetBitmapForAttribute(app, search_space)
 
 
-cdef set GetFiltersWithBaseTypes(list base_types, search_space):
+cdef object GetFiltersWithBaseTypes(list base_types, object search_space):
   """Returns all Intent Filters declaring a base type from a set of
   possibilities.
 
   Args:
     base_types: A set of base MIME types.
-    search_space: The search space.
+    search_space: The bitmap of the search space.
   """
 
-  return _BASE_TYPE_TO_FILTERS.GetEndPointsForAttributeSet(
+  return _BASE_TYPE_TO_FILTERS.GetBitmapForAttributeSet(
       base_types, search_space, False)
 
 
-cdef set GetFiltersWithTypes(list mime_types, set search_space):
+cdef object GetFiltersWithTypes(list mime_types, object search_space):
   """Returns all Intent Filters with a MIME type from a set of possibilities."""
 
-  return _TYPE_TO_FILTERS.GetEndPointsForAttributeSet(
+  return _TYPE_TO_FILTERS.GetBitmapForAttributeSet(
       mime_types, search_space, False)
 
 
-cdef set GetNoDataFilters(set search_space):
+cdef object GetNoDataFilters(object search_space):
   """Returns all Intent Filters that do not declare data fields."""
 
-  return search_space & _NO_DATA_FILTERS
+  return search_space & _GetFilterSetBitmap(_NO_DATA_FILTERS)
 
 
 def GetFiltersWithData(search_space):
   """Selects all Intent Filters that declare a data field."""
 
-  return search_space - _NO_DATA_FILTERS
+  return search_space & ~_GetFilterSetBitmap(_NO_DATA_FILTERS)
 
 
-cdef set GetFiltersWithoutType(set search_space):
+cdef object GetFiltersWithoutType(object search_space):
   """Selects all Intent Filters that do not declare a type."""
 
-  return _TYPE_TO_FILTERS.GetEndPointsForEmptySet(search_space)
+  return _TYPE_TO_FILTERS.GetBitmapForEmptySet(search_space)
 
 
-cdef set GetFiltersWithType(set search_space):
+cdef object GetFiltersWithType(object search_space):
   """Selects all Intent Filters that declare a type."""
 
-  return _TYPE_TO_FILTERS.GetEndPointsWithoutEmptySet(search_space)
+  return _TYPE_TO_FILTERS.GetBitmapWithoutEmptySet(search_space)
 
 
 cdef set GetExportedComponents(set search_space):
@@ -16,4 +16,5 @@
 # limitations under the License.
 
 cdef void PerformValidation(list intents, bint skip_empty, set components,
-                            set intent_filters, list validation_k)
+                            set intent_filters, list validation_k,
+                            int workers=?) except *
@@ -24,15 +24,22 @@ from primo.linking.components cimport GetSkippedFilterCount
 from primo.linking.intent_data cimport AddPreciseIntent
 from primo.linking.intent_data cimport AddImpreciseIntent
 from primo.linking.intent_imprecisions cimport MakeRandomImprecision
+from primo.linking.intent_imprecisions cimport ResetPartialImprecisions
 from primo.linking.intent_imprecisions cimport UpdateImpreciseDistribution
 from primo.linking.intents cimport ComponentIntent
+from primo.linking.link_table cimport LinkTable
 
+import itertools
 import logging
+import multiprocessing
 import numpy as np
+import random
+import StringIO
 
 import gflags
 
 from primo.linking import intent_data
+from primo.linking import link_table
 import primo.linking.find_links
 
 
@@ -40,28 +47,48 @@ FLAGS = gflags.FLAGS
 
 gflags.DEFINE_string('debugvalidation', None,
                      'Write information about disagreeing pairs to debug file.')
+gflags.DEFINE_integer('validation_seed', None,
+                      'Random seed for cross-validation folds.')
+gflags.DEFINE_float('validation_step', 1,
+                    'Width of the probability intervals in contingency tables.')
+gflags.DEFINE_integer('bootstrap_samples', 1000,
+                      ('Number of bootstrap samples for confidence intervals '
+                       'of gamma (0 to disable).'))
 
 _STEP = 1
+_CONFIDENCE = 0.95
 
 LOGGER = logging.getLogger(__name__)
 
+# The folds and linking data shared with worker processes. It is set before
+# workers are forked.
+cdef tuple _SHARED_STATE = None
+
 
 cdef void PerformValidation(list intents, bint skip_empty, set components,
-                            set intent_filters, list validation_k):
+                            set intent_filters, list validation_k,
+                            int workers=1) except *:
   """Performs k-fold cross validation.
 
+  Each fold uses its own random seed, which is derived from the validation seed,
+  k and the fold number. Results do not depend on the number of workers.
+
   Args:
     intents: The set of Intents to be used for validation.
     skip_empty: If True, empty Intents will be skipped.
     components: The set of potential target components.
     intent_filters: The set of potential target Intent Filters.
     validation_k: The list of k values for k-fold cross validation.
+    workers: If greater than 1, the number of worker processes in which folds
+    are performed. Each fold is performed in a newly forked process.
   """
 
+  global _SHARED_STATE
+
   # Isolate precise Intents and extract the distribution of imprecisions.
   cdef precise = set()
   cdef ComponentIntent intent
-  cdef dict ground_truth
+  cdef LinkTable ground_truth
   for intent in intents:
     if skip_empty and intent.IsEmpty():
       continue
@@ -73,88 +100,182 @@ cdef void PerformValidation(list intents, bint skip_empty, set components,
   # The ground truth contains all links with "full confidence" (priority = 100).
   # Any link not in this set has priority 0.
   ground_truth, _, _, _, _, _, _ = primo.linking.find_links.FindLinksForIntents(
-      precise, set(), skip_empty, components, intent_filters, False, False)
+      precise, set(), skip_empty, components, intent_filters, False, False,
+      workers=workers)
 
-  # Store the ground truth targets into a set for efficient lookup.
-  for intent, targets in ground_truth.iteritems():
-    ground_truth[intent] = set(targets)
+  cdef long seed = (FLAGS.validation_seed if FLAGS.validation_seed is not None
+                    else random.getrandbits(31))
+  LOGGER.info('Validation seed: %d.', seed)
 
-  cdef list averages = []
+  # Intents are sorted so that folds only depend on the seed.
+  cdef list sorted_precise = sorted(precise, key=lambda intent: intent.id)
+  cdef list folds = []
   cdef str k_string
   cdef int k
-  cdef list gammas
   cdef int iteration
+  for k_string in validation_k:
+    k = int(k_string)
+    for iteration, (training, validation) in enumerate(KFoldCrossValidation(
+        sorted_precise, k, True, _FoldSeed(seed, k, k))):
+      folds.append((k, iteration, training, validation,
+                    _FoldSeed(seed, k, iteration)))
+
+  cdef list averages = []
+  cdef dict gammas = dict([(int(k_string), []) for k_string in validation_k])
+  cdef object output
+
+  _SHARED_STATE = (folds, ground_truth, skip_empty, components, intent_filters,
+                   FLAGS.debugvalidation is not None)
+  pool = None
+  try:
+    if workers > 1:
+      LOGGER.info('Performing %d folds with %d workers.', len(folds), workers)
+      pool = multiprocessing.Pool(workers, maxtasksperchild=1)
+      results = pool.imap(PerformFold, xrange(len(folds)), 1)
+    else:
+      results = itertools.imap(PerformFold, xrange(len(folds)))
+
+    with open('k_%s.txt' % '-'.join(validation_k), 'w') as output:
+      if FLAGS.debugvalidation is not None:
+        debug_file = open(FLAGS.debugvalidation, 'a')
+      else:
+        debug_file = None
+      output.write('Seed: %d.\n' % seed)
+      last_k = None
+      for (k, iteration, _, _, _), (iteration_data, debug_output) in \
+          itertools.izip(folds, results):
+        if k != last_k:
+          if last_k is not None:
+            averages.append(WriteAverages(output, last_k, gammas[last_k],
+                                          seed))
+          output.write('Performing validation with k = %s.\n' % k)
+          last_k = k
+        output.write('Iteration: %s.\n' % iteration)
+        gammas[k].append(iteration_data)
+        if debug_file is not None:
+          debug_file.write(debug_output)
+      if last_k is not None:
+        averages.append(WriteAverages(output, last_k, gammas[last_k], seed))
+      if debug_file:
+        debug_file.close()
+      output.write('\n\nK  Average Gamma\n')
+      output.write('\n'.join(['%2d %s' % it for it in averages]))
+      output.write('\n')
+  finally:
+    _SHARED_STATE = None
+    if pool is not None:
+      pool.close()
+      pool.join()
+
+
+cdef long _FoldSeed(long seed, int k, int iteration):
+  """Derives the random seed of a fold from the validation seed.
+
+  Args:
+    seed: The validation seed.
+    k: The k in k-fold cross-validation.
+    iteration: The fold number, or k for the seed of the fold partition.
+  """
+
+  return (seed * 1009 + k) * 1009 + iteration
+
+
+def PerformFold(int index):
+  """Performs a fold of the cross-validation.
 
+  This can be called in a worker process, since it only relies on the state
+  set by PerformValidation.
+
+  Args:
+    index: The index of the fold.
+
+  Returns: A tuple with the iteration data and the debugging output or None.
+  """
+
+  folds, ground_truth, skip_empty, components, intent_filters, debug = \
+      _SHARED_STATE
   cdef list training
   cdef list validation
+  k, iteration, training, validation, seed = folds[index]
+  random.seed(seed)
+  ResetPartialImprecisions()
 
-  cdef list new_validation
-  cdef int still_precise
+  Reset()
+  cdef ComponentIntent intent
+  for intent in training:
+    AddPreciseIntent(intent)
 
+  # This new list will contain imprecise versions of the Intents.
+  cdef list new_validation = []
+  cdef int still_precise = 0
   cdef ComponentIntent intent_copy
-  cdef object output
-
-  cdef np.ndarray[np.uint64_t, ndim=2] contingency_table
+  for intent in validation:
+    intent_copy = intent.Copy()
+    is_intent_precise = True
+    while is_intent_precise:
+      MakeRandomImprecision(intent_copy.intent)
+      intent_copy.intent.UpdateImpreciseFields()
+      is_intent_precise = intent_copy.intent.IsPrecise()
+    AddImpreciseIntent(intent_copy)
+    new_validation.append(intent_copy)
+    if intent_copy.intent.IsPrecise():
+      still_precise += 1
+
+  validation = new_validation
+  intent_links, _, _, _, _, _, _ = primo.linking.find_links.FindLinksForIntents(
+      training, validation, skip_empty, components, intent_filters, True,
+      True)
+
+  debug_file = None
+  cdef dict intents = None
+  cdef dict targets = None
+  if debug:
+    debug_file = StringIO.StringIO()
+    intents = dict([(intent.id, intent) for intent in validation])
+    targets = dict([(link_table.TargetKey(target), target)
+                    for target in itertools.chain(components, intent_filters)])
+  cdef np.ndarray[np.uint64_t, ndim=2] contingency_table = (
+      BuildContingencyTable(ground_truth, intent_links,
+                            FLAGS.validation_step, debug_file, intents,
+                            targets))
+  agreeing, disagreeing, gamma = CalculateGamma(contingency_table)
+  interval = BootstrapGammaInterval(
+      contingency_table, FLAGS.bootstrap_samples,
+      random_state=np.random.RandomState(seed & 0xffffffff))
+  return ((iteration + 1, agreeing, disagreeing, gamma, len(training),
+           len(validation), still_precise, GetSkippedFilterCount(),
+           contingency_table, interval),
+          debug_file.getvalue() if debug else None)
+
+
+cdef tuple WriteAverages(object output, int k, list gammas, long seed):
+  """Writes the results of the folds for a value of k.
+
+  Contingency tables of all folds are also added up and a pooled gamma is
+  computed from the sum, along with its bootstrap confidence interval.
 
-  cdef np.uint64_t agreeing
-  cdef np.uint64_t disagreeing
-  cdef float gamma
+  Args:
+    output: The report file object.
+    k: The k in k-fold cross-validation.
+    gammas: The iteration data of the folds.
+    seed: The validation seed.
 
-  cdef int skipped_filter_count = GetSkippedFilterCount()
+  Returns: A tuple with k and the average gamma.
+  """
 
-  with open('k_%s.txt' % '-'.join(validation_k), 'w') as output:
-    if FLAGS.debugvalidation is not None:
-      debug_file = open(FLAGS.debugvalidation, 'a')
-    else:
-      debug_file = None
-    for k_string in validation_k:
-      output.write('Performing validation with k = %s.\n' % k_string)
-      k = int(k_string)
-      gammas = []
-      iteration = 0
-      for training, validation in KFoldCrossValidation(precise, k, True):
-        output.write('Iteration: %s.\n' % iteration)
-        iteration += 1
-        Reset()
-        for intent in training:
-          AddPreciseIntent(intent)
-
-        # This new set will contain imprecise versions of the Intents.
-        new_validation = []
-        still_precise = 0
-        for intent in validation:
-          intent_copy = intent.Copy()
-          is_intent_precise = True
-          while is_intent_precise:
-            MakeRandomImprecision(intent_copy.intent)
-            intent_copy.intent.UpdateImpreciseFields()
-            is_intent_precise = intent_copy.intent.IsPrecise()
-          AddImpreciseIntent(intent_copy)
-          new_validation.append(intent_copy)
-          if intent_copy.intent.IsPrecise():
-            still_precise += 1
-
-        validation = new_validation
-        intent_links, _, _, _, _, _, _ = primo.linking.find_links.FindLinksForIntents(
-            training, validation, skip_empty, components, intent_filters, True,
-            True)
-
-        contingency_table = BuildContingencyTable(ground_truth, intent_links,
-                                                  debug_file=debug_file)
-        agreeing, disagreeing, gamma = CalculateGamma(contingency_table)
-        gammas.append((iteration, agreeing, disagreeing, gamma, len(training),
-                       len(validation), still_precise, skipped_filter_count,
-                       contingency_table))
-      output.write('Gammas: ' + '********************\n'.join(
-          [IterationString(iteration_data) for iteration_data in gammas]))
-      average = np.mean([it[3] for it in gammas])
-      output.write('Average gamma: %s.' % str(average))
-      averages.append((k, average))
-    if debug_file:
-      debug_file.close()
-    output.write('\n\nK  Average Gamma\n')
-    output.write('\n'.join(['%2d %s' % it for it in averages]))
-    output.write('\n')
+  output.write('Gammas: ' + '********************\n'.join(
+      [IterationString(iteration_data) for iteration_data in gammas]))
+  average = np.mean([it[3] for it in gammas])
+  output.write('Average gamma: %s.' % str(average))
+  pooled_table = np.sum([it[8] for it in gammas], axis=0, dtype=np.uint64)
+  _, _, pooled_gamma = CalculateGamma(pooled_table)
+  pooled_interval = BootstrapGammaInterval(
+      pooled_table, FLAGS.bootstrap_samples,
+      random_state=np.random.RandomState(_FoldSeed(seed, k, k) & 0xffffffff))
+  output.write('\nPooled contingency table: %s\nPooled gamma: %s.\n'
+               'Pooled gamma confidence interval: %s.\n'
+               % (pooled_table, pooled_gamma, pooled_interval))
+  return k, average
 
 
 cdef str IterationString(tuple iteration_data):
@@ -170,114 +291,204 @@ cdef str IterationString(tuple iteration_data):
           'Training size: %s\nValidation size: %s\n'
           'Precise Intents in validation set: %s\n'
           'Skipped imprecise Intent Filters: %s\nContingency table: %s\n'
-          % iteration_data)
+          'Gamma confidence interval: %s\n' % iteration_data)
 
 
-@cython.cdivision(True)
-@cython.boundscheck(False)
 cpdef np.ndarray[np.uint64_t, ndim=2] BuildContingencyTable(
-      dict ground_truth, dict intent_links, float step=_STEP,
-      object debug_file=None):
+      LinkTable ground_truth, LinkTable intent_links, float step=_STEP,
+      object debug_file=None, dict intents=None, dict targets=None):
   """Builds a contingency table from link results and the ground truth.
 
+  Links are encoded as 64-bit integers, with the id of the Intent in the high
+  bits and the key of the target in the low bits. Candidate links are looked
+  up in the ground truth with a sorted search and the table is filled with a
+  single bincount.
+
   Args:
     ground_truth: The link ground truth.
     intent_links: The found links.
     step: The step size for the discretized probability interval.
     debug_file: If other than None, a file object where debugging output should
     be written.
+    intents: A map between Intent ids and ComponentIntents, used for debugging
+    output.
+    targets: A map between target keys and targets, used for debugging output.
 
   Returns: The resulting contingency table.
   """
 
   cdef Py_ssize_t columns = int(100 / step)
-  cdef np.ndarray[np.uint64_t, ndim=2] contingency_table = np.zeros(
-      shape=(2, columns), dtype=np.uint64)
-  cdef ComponentIntent intent
-  cdef tuple targets_and_attributes
-  cdef set ground_truth_targets
-  cdef list candidate_targets
-  cdef np.ndarray[np.int8_t] candidate_attributes
-  cdef int i
-  cdef np.int8_t probability
-  cdef Py_ssize_t row
-  cdef Py_ssize_t column
-
-  for intent, targets_and_attributes in intent_links.iteritems():
-    try:
-      candidate_targets = targets_and_attributes[0]
-      candidate_attributes = targets_and_attributes[1]
-      ground_truth_targets = ground_truth[intent]
-      for i in xrange(len(candidate_targets)):
-        row = 1 if candidate_targets[i] in ground_truth_targets else 0
-        column = IndexForProbability(candidate_attributes[i], columns, step)
-        contingency_table[row, column] += 1
-        if (debug_file is not None and
-            ((row == 0 and column == 99) or (row == 1 and column == 0))):
-          debug_file.write(str(row) + ', ' + str(column) + '\n')
-          debug_file.write((u'%r\n%r\n%r\n%r\n%r\n\n' %
-                            (intent.component.application.name, intent.id,
-                             intent.intent, candidate_targets[i],
-                             candidate_targets[i].id)).encode('utf-8'))
-    except KeyError:
-      # This occurs when an Intent does not have any targets in the ground
-      # truth.
-      for i in xrange(candidate_attributes.size):
-        probability = candidate_attributes[i]
-        column = IndexForProbability(probability, columns, step)
-        contingency_table[0, column] += 1
-        if debug_file is not None and column == 99:
-          debug_file.write('0, 99\n')
-          debug_file.write((u'%r\n%r\n%r\n%r\n%r\n%r\n\n' %
-                            (intent.component.application.name, intent.id,
-                             candidate_attributes.size,
-                             len(intent.component.application.components),
-                             intent.intent,
-                             candidate_targets[i])).encode('utf-8'))
+  if not intent_links.size:
+    return np.zeros(shape=(2, columns), dtype=np.uint64)
+
+  cdef np.ndarray rows = np.in1d(
+      intent_links.LinkKeys(), ground_truth.LinkKeys()).astype(np.intp)
+  cdef np.ndarray column_indices = IndicesForProbabilities(
+      intent_links.Probabilities().astype(np.float64), columns, step)
+  cdef np.ndarray[np.uint64_t, ndim=2] contingency_table = np.bincount(
+      rows * columns + column_indices, minlength=2 * columns).astype(
+          np.uint64).reshape(2, columns)
+
+  if debug_file is not None:
+    WriteDebugPairs(debug_file, rows, column_indices, columns, ground_truth,
+                    intent_links, intents, targets)
 
   return contingency_table
 
 
-cpdef Py_ssize_t IndexForProbability(np.int8_t probability, int columns,
+cdef void WriteDebugPairs(object debug_file, np.ndarray rows,
+                          np.ndarray column_indices, Py_ssize_t columns,
+                          LinkTable ground_truth, LinkTable intent_links,
+                          dict intents, dict targets):
+  """Writes information about the most disagreeing pairs to a debug file.
+
+  These are the links with the highest probability that are not in the ground
+  truth and the links with the lowest probability that are.
+
+  Args:
+    debug_file: A file object.
+    rows: The contingency table row of each candidate link.
+    column_indices: The contingency table column of each candidate link.
+    columns: The number of contingency table columns.
+    ground_truth: The link ground truth.
+    intent_links: The found links.
+    intents: A map between Intent ids and ComponentIntents.
+    targets: A map between target keys and targets.
+  """
+
+  cdef np.ndarray link_intents = np.repeat(np.arange(intent_links.intent_count),
+                                           intent_links.Sizes())
+  # Intents without targets in the ground truth only have negative links.
+  cdef np.ndarray has_truth = np.in1d(intent_links.IntentIds(),
+                                      ground_truth.IntentIds())
+  cdef np.ndarray sizes = intent_links.Sizes()
+  cdef np.ndarray intent_ids = intent_links.IntentIds()
+  cdef np.ndarray target_keys = intent_links.TargetKeys()
+  cdef np.ndarray flagged = np.flatnonzero(
+      ((rows == 0) & (column_indices == columns - 1))
+      | ((rows == 1) & (column_indices == 0)))
+  cdef ComponentIntent intent
+  for position in flagged.tolist():
+    intent_index = link_intents[position]
+    intent = intents[intent_ids[intent_index]]
+    target = targets[target_keys[position]]
+    if has_truth[intent_index]:
+      debug_file.write('%s, %s\n' % (rows[position], column_indices[position]))
+      debug_file.write((u'%r\n%r\n%r\n%r\n%r\n\n' %
+                        (intent.component.application.name, intent.id,
+                         intent.intent, target, target.id)).encode('utf-8'))
+    else:
+      debug_file.write('0, %s\n' % (columns - 1))
+      debug_file.write((u'%r\n%r\n%r\n%r\n%r\n%r\n\n' %
+                        (intent.component.application.name, intent.id,
+                         sizes[intent_index],
+                         len(intent.component.application.components),
+                         intent.intent, target)).encode('utf-8'))
+
+
+cpdef Py_ssize_t IndexForProbability(double probability, int columns,
                                      float step):
-  return probability if probability != columns else probability - 1
+  index = int(np.floor(probability / step))
+  return index if index != columns else index - 1
+
 
-# def IndexForProbability(probability, columns, step):
-#   index = int(np.floor(probability / step))
-#   return index if index != columns else index -1
+cpdef np.ndarray IndicesForProbabilities(np.ndarray probabilities, int columns,
+                                         float step):
+  """Returns the contingency table columns of an array of probabilities.
 
+  Probabilities outside of [0, 100] are counted in the first or last column.
+  Explicit link probabilities can be negative.
+  """
+
+  return np.clip(np.floor(probabilities / step).astype(np.intp), 0,
+                 columns - 1)
 
-cpdef tuple CalculateGamma(np.ndarray[np.uint64_t, ndim=2] contingency_table):
+
+cpdef tuple CalculateGamma(np.ndarray contingency_table):
   """Calculates gamma from a contingency table.
 
   Args:
-    contingency_table: The contingency table for the problem.
+    contingency_table: The contingency table for the problem, with any integer
+    type.
 
   Returns: A tuple with the number of agreeing pairs, the number of disagreeing
   pairs and the gamma value.
   """
 
+  agreeing, disagreeing, gammas = CalculateGammas(
+      np.asarray(contingency_table, dtype=np.uint64)[np.newaxis])
+  return agreeing[0], disagreeing[0], float(gammas[0])
+
+
+cpdef tuple CalculateGammas(np.ndarray contingency_tables):
+  """Calculates gamma for a stack of contingency tables.
+
+  For each column of the first row, the number of agreeing pairs is the number
+  of links in later columns of the second row, and the number of disagreeing
+  pairs is the number of links in earlier columns. Both are computed with
+  cumulative sums.
+
+  Args:
+    contingency_tables: An array of contingency tables, with shape
+    (table count, 2, column count).
+
+  Returns: A tuple with arrays of the numbers of agreeing pairs, of the numbers
+  of disagreeing pairs and of gamma values. Gamma is NaN for tables without
+  agreeing or disagreeing pairs.
+  """
+
+  negatives = contingency_tables[:, 0, :].astype(np.uint64)
+  positives = contingency_tables[:, 1, :].astype(np.uint64)
+  before = np.cumsum(positives, axis=1) - positives
+  after = positives.sum(axis=1)[:, np.newaxis] - before - positives
+  agreeing = (negatives * after).sum(axis=1)
+  disagreeing = (negatives * before).sum(axis=1)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    gammas = ((agreeing.astype(np.float64) - disagreeing)
+              / (agreeing + disagreeing))
+  return agreeing, disagreeing, gammas
+
+
+cpdef tuple BootstrapGammaInterval(
+    np.ndarray contingency_table, int samples, double confidence=_CONFIDENCE,
+    object random_state=None):
+  """Estimates a confidence interval of gamma by bootstrapping.
+
+  Resampling links with replacement amounts to drawing contingency tables from
+  a multinomial distribution with the cell frequencies of the observed table,
+  so all resampled tables are drawn and evaluated at once.
+
+  Args:
+    contingency_table: The observed contingency table, with any integer type.
+    samples: The number of bootstrap samples.
+    confidence: The confidence level of the interval.
+    random_state: The numpy.random.RandomState used for resampling, or None to
+    use the global one.
+
+  Returns: A tuple with the bounds of the percentile interval, which are NaN if
+  no resampled table has a defined gamma.
+  """
+
+  contingency_table = np.asarray(contingency_table, dtype=np.uint64)
+  cdef np.uint64_t total = contingency_table.sum()
+  if samples <= 0 or total == 0:
+    return float('nan'), float('nan')
+  if random_state is None:
+    random_state = np.random
+
   cdef Py_ssize_t columns = contingency_table.shape[1]
-  cdef np.uint64_t agreeing = 0
-  cdef int i, j
-  for i in xrange(columns - 1):
-    factor = contingency_table[0, i]
-    for j in xrange(i + 1, columns):
-      agreeing += factor * contingency_table[1, j]
-
-  cdef np.uint64_t disagreeing = 0
-  for i in xrange(1, columns):
-    factor = contingency_table[0, i]
-    for j in xrange(i):
-      disagreeing += factor * contingency_table[1, j]
-
-  print agreeing
-  print disagreeing
-  return (agreeing, disagreeing,
-          float(agreeing - disagreeing) / (agreeing + disagreeing))
-
-
-def KFoldCrossValidation(data, k_value, randomize=False):
+  tables = random_state.multinomial(
+      total, contingency_table.ravel() / float(total), size=samples)
+  _, _, gammas = CalculateGammas(tables.reshape(samples, 2, columns))
+  gammas = gammas[~np.isnan(gammas)]
+  if not gammas.size:
+    return float('nan'), float('nan')
+  tail = 50.0 * (1 - confidence)
+  lower, upper = np.percentile(gammas, [tail, 100 - tail])
+  return float(lower), float(upper)
+
+
+def KFoldCrossValidation(data, k_value, randomize=False, seed=None):
   """Generates k (training, validation) pairs from the items in the data set.
 
   Each pair is a partition of the data, where validation is an iterable
@@ -289,14 +500,14 @@ def KFoldCrossValidation(data, k_value, randomize=False):
     k_value: The k in k-fold cross-validation.
     randomize: If True, the a copy of the data set will be randomly shuffled
     before generating the training and validation sets.
+    seed: If not None, the random seed used for shuffling.
 
   Yields: A (training set, validation set) pair.
   """
 
   if randomize:
-    from random import shuffle
     data = list(data)
-    shuffle(data)
+    random.Random(seed).shuffle(data)
   for k in xrange(k_value):
     training = [x for i, x in enumerate(data) if i % k_value != k]
     validation = [x for i, x in enumerate(data) if i % k_value == k]
@@ -27,7 +27,8 @@ import unittest
 sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
                              '..'))
 
-import linking.validation as validation
+from primo.linking import validation
+from primo.linking.link_table import MakeLinkTable
 
 
 class MockAttribute(object):
@@ -43,43 +44,70 @@ class ValidationTest(unittest.TestCase):
   def testIndexForProbabilityWithIndexEqualToColumnCount(self):
     self.assertEqual(validation.IndexForProbability(1, 10, 0.1), 9)
 
+  def _MakeIntentLinks(self):
+    return MakeLinkTable([1, 2], numpy.zeros((2, 4)), [0, 2, 4], [1, 2, 3, 4],
+                         numpy.zeros(4), [20, 30, 60, 80])
+
   def testBuildContingencyTableWithKeyError(self):
-    intent_links = {'Intent 1': (['Filter 1', 'Filter 2'],
-                                 (20, 30)),
-                    'Intent 2': (['Filter 3', 'Filter 4'],
-                                 (60, 80))}
-    ground_truth = {'Intent 2': ['Filter 3', 'Filter 4']}
+    intent_links = self._MakeIntentLinks()
+    ground_truth = MakeLinkTable([2], numpy.zeros((1, 4)), [0, 2], [3, 4],
+                                 numpy.zeros(2), numpy.zeros(2))
     wanted_table = numpy.array([[1, 1, 0, 0], [0, 0, 1, 1]])
     numpy.testing.assert_array_equal(
         validation.BuildContingencyTable(ground_truth, intent_links, 25),
         wanted_table)
 
   def testBuildContingencyTableWithoutKeyError(self):
-    intent_links = {'Intent 1': (['Filter 1', 'Filter 2'],
-                                 (20, 30)),
-                    'Intent 2': (['Filter 3', 'Filter 4'],
-                                 (60, 80))}
-    ground_truth = {'Intent 1': ['Filter 1'],
-                    'Intent 2': ['Filter 4']}
+    intent_links = self._MakeIntentLinks()
+    ground_truth = MakeLinkTable([1, 2], numpy.zeros((2, 4)), [0, 1, 2],
+                                 [1, 4], numpy.zeros(2), numpy.zeros(2))
     wanted_table = numpy.array([[0, 1, 1, 0], [1, 0, 0, 1]])
     numpy.testing.assert_array_equal(
         validation.BuildContingencyTable(ground_truth, intent_links, 25),
         wanted_table)
 
+  def testBuildContingencyTableWithNegativeProbabilities(self):
+    intent_links = MakeLinkTable([1, 2], numpy.zeros((2, 4)), [0, 2, 4],
+                                 [1, 2, 3, 4], numpy.zeros(4),
+                                 [-50, 30, -10, 100])
+    ground_truth = MakeLinkTable([1, 2], numpy.zeros((2, 4)), [0, 1, 2],
+                                 [1, 4], numpy.zeros(2), numpy.zeros(2))
+    wanted_table = numpy.array([[1, 1, 0, 0], [1, 0, 0, 1]])
+    numpy.testing.assert_array_equal(
+        validation.BuildContingencyTable(ground_truth, intent_links, 25),
+        wanted_table)
+
   def testCalculateGamma(self):
     self.assertEqual(validation.CalculateGamma(numpy.array([[1, 1, 0, 0],
                                                             [0, 0, 1, 1]])),
-                     1)
+                     (4, 0, 1))
     self.assertEqual(validation.CalculateGamma(numpy.array([[0, 0, 1, 1],
-                                                            [1, 1, 0, 0]])),
+                                                            [1, 1, 0, 0]]))[2],
                      -1)
     self.assertEqual(validation.CalculateGamma(numpy.array([[0, 1, 1, 0],
-                                                            [1, 0, 0, 1]])),
+                                                            [1, 0, 0, 1]]))[2],
                      0)
     self.assertEqual(validation.CalculateGamma(numpy.array([[1, 1, 0, 1],
-                                                            [0, 0, 1, 0]])),
+                                                            [0, 0, 1, 0]]))[2],
                      1.0 / 3)
 
+  def testCalculateGammas(self):
+    tables = numpy.array([[[1, 1, 0, 0], [0, 0, 1, 1]],
+                          [[1, 1, 0, 1], [0, 0, 1, 0]],
+                          [[0, 0, 0, 0], [1, 1, 1, 1]]], dtype=numpy.uint64)
+    agreeing, disagreeing, gammas = validation.CalculateGammas(tables)
+    numpy.testing.assert_array_equal(agreeing, [4, 2, 0])
+    numpy.testing.assert_array_equal(disagreeing, [0, 1, 0])
+    numpy.testing.assert_array_equal(gammas, [1, 1.0 / 3, numpy.nan])
+
+  def testBootstrapGammaInterval(self):
+    table = numpy.array([[50, 30, 10, 5], [5, 10, 30, 50]], dtype=numpy.uint64)
+    lower, upper = validation.BootstrapGammaInterval(
+        table, 500, random_state=numpy.random.RandomState(0))
+    gamma = validation.CalculateGamma(table)[2]
+    self.assertTrue(lower < gamma < upper)
+    self.assertTrue(upper <= 1)
+
 
 if __name__ == '__main__':
   unittest.main()
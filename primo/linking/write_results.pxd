@@ -17,6 +17,9 @@
 
 cimport numpy as np
 
+from primo.linking.intents cimport ComponentIntent
+from primo.linking.link_table cimport LinkTable
+
 cdef packed struct Row:
   np.int32_t intent     # 0
   np.int8_t explicit    # 1
@@ -28,4 +31,29 @@ cdef packed struct Row:
   np.int8_t probability # 7
   np.int8_t intra_app   # 8
 
-cpdef np.ndarray[Row] MakeResultsArray(dict intent_links, int size)
+cpdef np.ndarray[Row] MakeResultsArray(LinkTable intent_links)
+
+cdef class LinkWriter:
+  cdef object _destination_file
+  cdef object _sink
+  cdef object _blosc_args
+  cdef np.ndarray _chunk
+  # Holds the links of the Intent being written.
+  cdef LinkTable _buffer
+  cdef Py_ssize_t _chunk_rows
+  cdef long _chunk_count
+  cdef long _link_count
+
+  cpdef WriteLinks(self, ComponentIntent component_intent, list targets,
+                   object probabilities)
+  cpdef WriteTable(self, LinkTable intent_links)
+  cdef void _WriteRows(self, np.ndarray rows)
+  cpdef long Close(self)
+  cdef void _Open(self, str destination)
+  cdef void _Finish(self)
+  cdef void _FlushChunk(self)
+  cdef object _WriteHeader(self, long chunk_count, long last_chunk_size)
+
+cdef class ColumnLinkWriter(LinkWriter):
+  cdef str _destination
+  cdef dict _column_files
@@ -14,16 +14,31 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-"""Module to write Intent links to a compressed file."""
+"""Module to write Intent links to a compressed file.
+
+Links can also be written as a directory of columns. Each field of DTYPE is
+stored in an uncompressed .npy file, so that readers can memory-map the columns
+they need. A manifest lists the columns and the number of links.
+"""
 
-cimport cython
 cimport numpy as np
 
+import json
+import os
+import struct
+
+import blosc
 import bloscpack
+from bloscpack.exceptions import ChecksumMismatch
+from bloscpack.file_io import CompressedFPSink
+from bloscpack.file_io import CompressedFPSource
+from bloscpack.headers import BloscpackHeader
 import numpy as np
 
 from primo.linking.intents cimport ComponentIntent
-from primo.linking.intents cimport Intent
+from primo.linking.link_table cimport INTRA_APP_FLAG
+from primo.linking.link_table cimport LinkTable
+from primo.linking.link_table cimport PERMISSION_FLAG
 
 
 DTYPE = [('intent', 'int32'),
@@ -40,79 +55,359 @@ DTYPE = [('intent', 'int32'),
 # This is about one MB.
 # The chunk size should be a multiple of 15, since a single row takes 15 bytes.
 CHUNK_SIZE = 15 * 70000
+# Space reserved for the metadata of streamed link files, which is rewritten
+# when the final number of links is known.
+_MAX_METADATA_SIZE = 1024
+
+# Formats of link files.
+BLOSCPACK = 'bloscpack'
+COLUMNS = 'columns'
+LINK_FORMATS = [BLOSCPACK, COLUMNS]
 
+# The name of the manifest of column directories.
+MANIFEST = 'manifest.json'
+_MANIFEST_VERSION = 1
+# The size of the headers of column files. It is fixed so that headers can be
+# overwritten, and it keeps the data aligned on 64 bytes.
+_NPY_HEADER_SIZE = 128
 
-@cython.boundscheck(False)
-def WriteResults(dict intent_links, int size, str destination):
+
+def WriteResults(LinkTable intent_links, str destination,
+                 str link_format=BLOSCPACK):
   """Writes Intent links and probabilities to file.
 
   Args:
-    intent_links: A map between ComponentIntent objects and targets and
-    probability values.
-    destination: The path to the destination file.
+    intent_links: A LinkTable with the Intent links.
+    destination: The path to the destination file, or to the destination
+    directory for the columns format.
+    link_format: The format of the links, from LINK_FORMATS.
+  """
+
+  cdef np.ndarray[Row] results = MakeResultsArray(intent_links)
+  if link_format == COLUMNS:
+    column_files = _OpenColumnFiles(destination)
+    for name, column_file in column_files.iteritems():
+      np.ascontiguousarray(results[name]).tofile(column_file)
+    _CloseColumnFiles(column_files, destination, intent_links.size)
+  else:
+    with open(destination, 'wb') as destination_file:
+      bloscpack.pack_ndarray_file(results, destination, chunk_size=CHUNK_SIZE)
+
+
+def LoadLinkColumns(str source, list names=None):
+  """Loads columns of Intent links from a file written by WriteResults.
+
+  Columns of a column directory are memory-mapped, and only the requested ones
+  are opened. A bloscpack file has to be fully decompressed.
+
+  Args:
+    source: The path to a link file or to a column directory.
+    names: The names of the columns to load, or None to load all of them.
+
+  Returns: A map between column names and arrays.
+  """
+
+  names = names or [name for name, _ in DTYPE]
+  if not os.path.isdir(source):
+    links = bloscpack.unpack_ndarray_file(source)
+    return dict([(name, links[name]) for name in names])
+
+  with open(os.path.join(source, MANIFEST)) as manifest_file:
+    manifest = json.load(manifest_file)
+  if manifest['version'] != _MANIFEST_VERSION:
+    raise ValueError('Unsupported link column version %s in %s.'
+                     % (manifest['version'], source))
+  cdef dict columns = {}
+  for name in names:
+    column = np.load(os.path.join(source, manifest['columns'][name]),
+                     mmap_mode='r')
+    if column.size != manifest['size']:
+      raise ValueError('Column %s in %s has %d links instead of %d.'
+                       % (name, source, column.size, manifest['size']))
+    columns[name] = column
+  return columns
+
+
+def IterLinkChunks(str source, list names=None):
+  """Yields columns of Intent links one chunk at a time.
+
+  Chunks of a bloscpack file are decompressed one at a time and their checksums
+  are verified, so only one chunk is held in memory. Columns of a column
+  directory are memory-mapped and read in slices of the same number of links.
+
+  Args:
+    source: The path to a link file or to a column directory.
+    names: The names of the columns to load, or None to load all of them.
+
+  Returns: An iterator over maps between column names and arrays.
+  """
+
+  names = names or [name for name, _ in DTYPE]
+  cdef long rows = CHUNK_SIZE // np.dtype(DTYPE).itemsize
+  if os.path.isdir(source):
+    columns = LoadLinkColumns(source, names)
+    size = columns[names[0]].size
+    for start in xrange(0, size, rows):
+      yield dict([(name, np.asarray(column[start:start + rows]))
+                  for name, column in columns.iteritems()])
+    return
+
+  with open(source, 'rb') as source_file:
+    compressed_source = CompressedFPSource(source_file)
+    # Bloscpack chunk sizes are multiples of the row size.
+    for compressed, digest in compressed_source:
+      if digest and compressed_source.checksum_impl(compressed) != digest:
+        raise ChecksumMismatch('Checksum mismatch in a chunk of %s.' % source)
+      links = np.frombuffer(blosc.decompress(compressed), dtype=DTYPE)
+      yield dict([(name, links[name]) for name in names])
+
+
+cdef dict _OpenColumnFiles(str destination):
+  """Creates a column directory and opens its column files for writing.
+
+  Column files start with a placeholder header, which is written again by
+  _CloseColumnFiles.
+
+  Args:
+    destination: The path to the column directory.
+
+  Returns: A map between column names and file objects.
+  """
+
+  if not os.path.isdir(destination):
+    os.makedirs(destination)
+  cdef dict column_files = {}
+  for name, column_type in DTYPE:
+    column_file = open(os.path.join(destination, name + '.npy'), 'wb')
+    _WriteNpyHeader(column_file, column_type, 0)
+    column_files[name] = column_file
+  return column_files
+
+
+cdef void _CloseColumnFiles(dict column_files, str destination, long size):
+  """Writes the final headers of column files and the manifest.
+
+  Args:
+    column_files: A map between column names and file objects.
+    destination: The path to the column directory.
+    size: The number of links.
+  """
+
+  for name, column_type in DTYPE:
+    column_file = column_files[name]
+    column_file.seek(0)
+    _WriteNpyHeader(column_file, column_type, size)
+    column_file.close()
+  with open(os.path.join(destination, MANIFEST), 'w') as manifest_file:
+    json.dump({'version': _MANIFEST_VERSION,
+               'size': size,
+               'columns': dict([(name, name + '.npy') for name, _ in DTYPE])},
+              manifest_file, indent=2, sort_keys=True)
+
+
+cdef void _WriteNpyHeader(object column_file, str column_type, long size):
+  """Writes a version 1.0 .npy header of _NPY_HEADER_SIZE bytes.
+
+  Args:
+    column_file: A file object.
+    column_type: The type of the column.
+    size: The number of values in the column.
   """
 
-  cdef np.ndarray[Row] results = MakeResultsArray(intent_links, size)
-  with open(destination, 'wb') as destination_file:
-    bloscpack.pack_ndarray_file(results, destination, chunk_size=CHUNK_SIZE)
+  header = ("{'descr': %r, 'fortran_order': False, 'shape': (%d,), }"
+            % (np.lib.format.dtype_to_descr(np.dtype(column_type)), size))
+  column_file.write(np.lib.format.magic(1, 0))
+  column_file.write(struct.pack('<H', _NPY_HEADER_SIZE - 10))
+  column_file.write(header.ljust(_NPY_HEADER_SIZE - 11) + '\n')
+
 
+cpdef np.ndarray[Row] MakeResultsArray(LinkTable intent_links):
+  """Generates a Numpy array from a table of Intent links.
 
-@cython.boundscheck(False)
-cpdef np.ndarray[Row] MakeResultsArray(dict intent_links, int size):
-  """Generates a Numpy array from a map of Intent links.
+  Each column is filled in one assignment. Intent fields are repeated for each
+  of the links of an Intent.
 
   Args:
-    intent_links: A map between ComponentIntent objects and targets and
-    probability values.
-    size: The total number of links.
+    intent_links: A LinkTable with the Intent links.
 
   Returns: The Numpy array of Intent links with attributes.
   """
 
-  cdef np.ndarray[Row] result = np.empty(size, dtype=DTYPE)
-  cdef ComponentIntent component_intent
-  cdef Intent intent
-  cdef tuple targets_and_attributes
-  cdef Py_ssize_t index = 0
-  cdef list targets
-  cdef Py_ssize_t targets_size
-  cdef Py_ssize_t new_index
-  cdef np.int8_t data
-  cdef Py_ssize_t i, j
-  for component_intent, targets_and_attributes in intent_links.iteritems():
-    intent = component_intent.intent
-    targets = targets_and_attributes[0]
-    targets_size = len(targets)
-    new_index = index + targets_size
-
-    # Using broadcasting throughout.
-    result[index:new_index]['intent'] = component_intent.id
-
-    result[index:new_index]['explicit'] = 1 if intent.IsExplicit() else 0
-
-    if not intent.HasData():
-      data = 0
-    elif intent.HasImpreciseData():
-      data = 1
-    else:
-      data = 2
-    result[index:new_index]['data'] = data
-
-    result[index:new_index]['library'] = \
-        1 if component_intent.library_exit_point else 0
-
-    result[index:new_index]['extras'] = 0 if intent.extra is None else 1
-
-    result[index:new_index]['probability'] = targets_and_attributes[1]
-
-    for i in xrange(targets_size):
-      target = targets[i]
-      j = i + index
-      result[j].target = target.id
-      result[j].permission = 1 if target.permission is not None else 0
-      result[j].intra_app = \
-          1 if intent.application.name == target.application_id else 0
-
-    index = new_index
+  cdef np.ndarray[Row] result = np.empty(intent_links.size, dtype=DTYPE)
+  if not intent_links.size:
+    return result
 
+  sizes = intent_links.Sizes()
+  result['intent'] = np.repeat(intent_links.IntentIds(), sizes)
+  link_fields = np.repeat(intent_links.IntentFields(), sizes, axis=0)
+  result['explicit'] = link_fields[:, 0]
+  result['data'] = link_fields[:, 1]
+  result['library'] = link_fields[:, 2]
+  result['extras'] = link_fields[:, 3]
+  result['target'] = intent_links.Targets()
+  target_flags = intent_links.TargetFlags()
+  result['permission'] = (target_flags & PERMISSION_FLAG) != 0
+  result['intra_app'] = (target_flags & INTRA_APP_FLAG) != 0
+  result['probability'] = intent_links.Probabilities()
   return result
+
+
+cdef class LinkWriter:
+  """Writes Intent links to a compressed file as they are found.
+
+  Rows are buffered in a single chunk of CHUNK_SIZE bytes, which is compressed
+  and appended to the file when it is full. The bloscpack header and metadata
+  hold the number of chunks and the shape of the array, so they are written
+  again with their final values when the writer is closed. The resulting file
+  can be read with bloscpack.unpack_ndarray_file, like those written by
+  WriteResults.
+  """
+
+  def __init__(self, str destination):
+    """Constructor.
+
+    Args:
+      destination: The path to the destination file.
+    """
+
+    self._chunk = np.empty(CHUNK_SIZE // np.dtype(DTYPE).itemsize,
+                           dtype=DTYPE)
+    self._buffer = LinkTable()
+    self._chunk_rows = 0
+    self._chunk_count = 0
+    self._link_count = 0
+    self._Open(destination)
+
+  cpdef WriteLinks(self, ComponentIntent component_intent, list targets,
+                   object probabilities):
+    """Appends the links of an Intent to the file.
+
+    Args:
+      component_intent: A ComponentIntent object.
+      targets: The targets of the Intent.
+      probabilities: The link probabilities.
+    """
+
+    self._buffer.Append(component_intent, targets, probabilities)
+    self._WriteRows(MakeResultsArray(self._buffer))
+    self._buffer.Clear()
+
+  cpdef WriteTable(self, LinkTable intent_links):
+    """Appends the links of a table to the file.
+
+    Args:
+      intent_links: A LinkTable with Intent links.
+    """
+
+    self._WriteRows(MakeResultsArray(intent_links))
+
+  cdef void _WriteRows(self, np.ndarray rows):
+    """Copies rows into the current chunk, flushing it when it is full."""
+
+    cdef Py_ssize_t rows_size = rows.shape[0]
+    cdef Py_ssize_t capacity = self._chunk.size
+    cdef Py_ssize_t start = 0
+    cdef Py_ssize_t count
+    while start < rows_size:
+      count = min(rows_size - start, capacity - self._chunk_rows)
+      self._chunk[self._chunk_rows:self._chunk_rows + count] = \
+          rows[start:start + count]
+      self._chunk_rows += count
+      start += count
+      if self._chunk_rows == capacity:
+        self._FlushChunk()
+    self._link_count += rows_size
+
+  cpdef long Close(self):
+    """Writes the last chunk and the final header, and closes the file.
+
+    Returns: The number of links written.
+    """
+
+    if self._chunk_rows or not self._chunk_count:
+      self._FlushChunk()
+    self._Finish()
+    return self._link_count
+
+  cdef void _Open(self, str destination):
+    """Opens the destination file and writes a placeholder header."""
+
+    self._destination_file = open(destination, 'wb')
+    self._blosc_args = bloscpack.BloscArgs(typesize=self._chunk.itemsize)
+    self._sink = self._WriteHeader(-1, -1)
+
+  cdef void _Finish(self):
+    """Writes the final header and closes the destination file."""
+
+    self._destination_file.seek(0)
+    self._WriteHeader(self._chunk_count,
+                      (self._link_count - (self._chunk_count - 1)
+                       * self._chunk.size) * self._chunk.itemsize)
+    self._destination_file.close()
+
+  cdef void _FlushChunk(self):
+    """Compresses the rows of the current chunk and appends them to the file."""
+
+    compressed = blosc.compress_ptr(
+        self._chunk.__array_interface__['data'][0], self._chunk_rows,
+        **self._blosc_args)
+    self._sink.put(self._chunk_count, compressed)
+    self._chunk_count += 1
+    self._chunk_rows = 0
+
+  cdef object _WriteHeader(self, long chunk_count, long last_chunk_size):
+    """Writes the bloscpack header and metadata at the current position.
+
+    The metadata section always has the same size, so that it can be
+    overwritten.
+
+    Args:
+      chunk_count: The number of chunks, or -1 if unknown.
+      last_chunk_size: The size of the last chunk in bytes, or -1 if unknown.
+
+    Returns: The bloscpack sink used for writing chunks.
+    """
+
+    bloscpack_args = bloscpack.BloscpackArgs(offsets=False)
+    sink = CompressedFPSink(self._destination_file)
+    sink.configure(self._blosc_args, BloscpackHeader(
+        offsets=False, metadata=True, checksum=bloscpack_args.checksum,
+        typesize=self._chunk.itemsize, chunk_size=CHUNK_SIZE,
+        last_chunk=last_chunk_size, nchunks=chunk_count, max_app_chunks=0))
+    sink.write_bloscpack_header()
+    sink.write_metadata({'dtype': repr(self._chunk.dtype.descr),
+                         'shape': (self._link_count,),
+                         'order': 'C',
+                         'container': 'numpy'},
+                        bloscpack.MetadataArgs(
+                            max_meta_size=_MAX_METADATA_SIZE))
+    sink.init_offsets()
+    return sink
+
+
+cdef class ColumnLinkWriter(LinkWriter):
+  """Writes Intent links to a column directory as they are found.
+
+  Each column of a full chunk is appended to its column file. Column headers
+  and the manifest are written when the writer is closed.
+  """
+
+  cdef void _Open(self, str destination):
+    """Opens the column files of the destination directory."""
+
+    self._destination = destination
+    self._column_files = _OpenColumnFiles(destination)
+
+  cdef void _Finish(self):
+    """Writes the final column headers and the manifest."""
+
+    _CloseColumnFiles(self._column_files, self._destination, self._link_count)
+
+  cdef void _FlushChunk(self):
+    """Appends the columns of the current chunk to the column files."""
+
+    for name, column_file in self._column_files.iteritems():
+      np.ascontiguousarray(self._chunk[name][:self._chunk_rows]).tofile(
+          column_file)
+    self._chunk_count += 1
+    self._chunk_rows = 0
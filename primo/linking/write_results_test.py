@@ -19,10 +19,12 @@
 
 """Tests for result generation module."""
 
-from collections import OrderedDict
+import bloscpack
 import numpy as np
 import os.path
+import shutil
 import sys
+import tempfile
 import unittest
 
 sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
@@ -32,6 +34,7 @@ from primo.linking import write_results
 from primo.linking.applications import Application
 from primo.linking.intents import ComponentIntent
 from primo.linking.intents import Intent
+from primo.linking.link_table import LinkTable
 
 
 class MockTarget(object):
@@ -60,9 +63,9 @@ class WriteResultsTest(unittest.TestCase):
     probabilities1 = np.array([4, 7])
     probabilities2 = np.array([0, 100])
 
-    intent_links = OrderedDict()
-    intent_links[component_intent1] = ([target1, target2], probabilities1)
-    intent_links[component_intent2] = ([target3, target4], probabilities2)
+    intent_links = LinkTable()
+    intent_links.Append(component_intent1, [target1, target2], probabilities1)
+    intent_links.Append(component_intent2, [target3, target4], probabilities2)
 
     expected = np.empty(4, dtype=write_results.DTYPE)
 
@@ -106,9 +109,77 @@ class WriteResultsTest(unittest.TestCase):
     expected[3][7] = 100
     expected[3][8] = 0
 
-    np.testing.assert_array_equal(write_results.MakeResultsArray(intent_links, 4),
+    np.testing.assert_array_equal(write_results.MakeResultsArray(intent_links),
                                   expected)
 
+  def testLinkWriter(self):
+    application1 = Application(u'app1', None, 1, None)
+    application2 = Application(u'app2', None, 1, None)
+    intent = Intent(None, None, u'action', None, None, None, None, None, None,
+                    None, 0, None, None, application1)
+    component_intent = ComponentIntent(intent, None, None, None, 0, (1,),
+                                       False, 1)
+    rows_per_chunk = write_results.CHUNK_SIZE // 15
+    targets = [MockTarget(index, None, application2)
+               for index in xrange(rows_per_chunk + 10)]
+    probabilities = np.arange(len(targets)) % 101
+    destination = tempfile.NamedTemporaryFile(suffix='.blp')
+
+    writer = write_results.LinkWriter(destination.name)
+    writer.WriteLinks(component_intent, targets, probabilities)
+    writer.WriteLinks(component_intent, [], np.array([]))
+    self.assertEqual(writer.Close(), len(targets))
+
+    intent_links = LinkTable()
+    intent_links.Append(component_intent, targets, probabilities)
+    expected = write_results.MakeResultsArray(intent_links)
+    np.testing.assert_array_equal(
+        bloscpack.unpack_ndarray_file(destination.name), expected)
+
+  def testColumnLinkWriter(self):
+    application = Application(u'app1', None, 1, None)
+    intent = Intent(None, None, u'action', None, None, None, None, None, None,
+                    None, 0, None, None, application)
+    component_intent = ComponentIntent(intent, None, None, None, 0, (1,),
+                                       False, 1)
+    targets = [MockTarget(index, u'permission', application)
+               for index in xrange(write_results.CHUNK_SIZE // 15 + 10)]
+    probabilities = np.arange(len(targets)) % 101
+    destination = tempfile.mkdtemp()
+
+    try:
+      writer = write_results.ColumnLinkWriter(destination)
+      writer.WriteLinks(component_intent, targets, probabilities)
+      self.assertEqual(writer.Close(), len(targets))
+
+      intent_links = LinkTable()
+      intent_links.Append(component_intent, targets, probabilities)
+      expected = write_results.MakeResultsArray(intent_links)
+      columns = write_results.LoadLinkColumns(destination,
+                                              ['target', 'probability'])
+      self.assertEqual(sorted(columns.keys()), ['probability', 'target'])
+      np.testing.assert_array_equal(columns['target'], expected['target'])
+      np.testing.assert_array_equal(columns['probability'],
+                                    expected['probability'])
+    finally:
+      shutil.rmtree(destination)
+
+  def testIterLinkChunks(self):
+    links = np.zeros(write_results.CHUNK_SIZE // 15 * 2 + 10,
+                     dtype=write_results.DTYPE)
+    links['intent'] = np.arange(links.size) // 7
+    links['probability'] = np.arange(links.size) % 101
+    destination = tempfile.NamedTemporaryFile(suffix='.blp')
+    bloscpack.pack_ndarray_file(links, destination.name,
+                                chunk_size=write_results.CHUNK_SIZE)
+
+    chunks = list(write_results.IterLinkChunks(destination.name,
+                                               ['intent', 'probability']))
+    self.assertEqual(len(chunks), 3)
+    self.assertEqual(sorted(chunks[0].keys()), ['intent', 'probability'])
+    for name in ('intent', 'probability'):
+      np.testing.assert_array_equal(
+          np.concatenate([chunk[name] for chunk in chunks]), links[name])
 
 if __name__ == '__main__':
   unittest.main()
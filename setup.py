@@ -37,7 +37,8 @@ REQUIRES = ['numpy', 'scipy', 'protobuf', 'python-gflags', 'bloscpack']
 
 PACKAGES = ['primo', 'primo.linking']
 SCRIPTS = ['bin/primo', 'bin/make_plots_and_stats',
-      'bin/performance_experiments']
+      'bin/performance_experiments', 'bin/query_links', 'bin/generate_corpus',
+      'bin/run_benchmarks', 'bin/link_server']
 CMD_CLASS = {}
 OPTIONS = {}
 